@@ -0,0 +1,193 @@
+# api/cache.py
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import date, datetime
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+# -----------------------------
+# Settings
+# -----------------------------
+CACHE_TTL = float(os.getenv("API_CACHE_TTL", "600"))
+CACHE_MAXSIZE = int(os.getenv("API_CACHE_MAXSIZE", "1024"))
+VERSION_CHECK_INTERVAL = float(os.getenv("API_CACHE_VERSION_CHECK", "30"))
+
+# Written by the dbt on-run-end hook (macros/warehouse_version.sql)
+VERSION_SQL = text("SELECT build_id FROM analytics.warehouse_version LIMIT 1")
+
+
+def normalise_params(params):
+    """Stable cache key part: ``None`` dropped, strings case-folded, dates ISO formatted."""
+    items = []
+    for name, value in sorted(params.items()):
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip().lower()
+        elif isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        items.append((name, value))
+    return tuple(items)
+
+
+class CacheEntry:
+    __slots__ = ("payload", "etag", "expires_at")
+
+    def __init__(self, payload, etag, expires_at):
+        self.payload = payload
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """TTL + LRU cache for endpoint payloads, invalidated by the warehouse version.
+
+    Concurrent misses for the same key share one in-flight computation, so a
+    burst of identical dashboard requests runs a single query. Every entry is
+    dropped as soon as the warehouse version changes, which the cache polls
+    at most once per ``version_check_interval`` seconds.
+    """
+
+    def __init__(self, maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL,
+                 version_check_interval=VERSION_CHECK_INTERVAL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._version = None
+        self._version_checked_at = None
+        self._version_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def clear(self):
+        self._entries.clear()
+
+    async def check_version(self, fetch_version):
+        """Refresh the warehouse version if it is due; clear everything when it moved."""
+        now = self._clock()
+        if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+            return self._version
+        async with self._version_lock:
+            if self._version_checked_at is not None and self._clock() - self._version_checked_at < self.version_check_interval:
+                return self._version
+            version = await fetch_version()
+            if version != self._version:
+                self.clear()
+                self._version = version
+            self._version_checked_at = self._clock()
+        return self._version
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, payload):
+        body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":")).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        entry = CacheEntry(payload, etag, self._clock() + self.ttl)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    async def get_or_compute(self, key, compute):
+        """Return the cached ``CacheEntry`` for ``key``, running ``compute()`` once on a miss.
+
+        Concurrent misses share one task, so ``compute`` must not hold anything
+        scoped to the request that happened to start it.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            version = self._version
+
+            async def fill():
+                try:
+                    payload = await compute()
+                    # Don't cache a result computed against a warehouse version that was replaced meanwhile
+                    if self._version == version:
+                        return self._store(key, payload)
+                    return CacheEntry(payload, None, 0.0)
+                finally:
+                    self._inflight.pop(key, None)
+
+            task = asyncio.ensure_future(fill())
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # shield: one cancelled client must not cancel the query other waiters share
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "warehouse_version": self._version,
+        }
+
+
+response_cache = ResponseCache()
+
+
+async def fetch_warehouse_version():
+    from api.database import read_engine
+    try:
+        async with read_engine.connect() as conn:
+            return (await conn.execute(VERSION_SQL)).scalar()
+    except Exception:
+        # No marker yet (dbt has not run with the hook): rely on the TTL alone
+        return None
+
+
+async def cached_response(request: Request, response: Response, endpoint, params, compute):
+    """Serve ``compute(db)`` through the response cache with ETag / Cache-Control headers.
+
+    ``compute`` gets a read session of its own rather than the request's:
+    coalesced requests all wait on it, and the first client disconnecting
+    would otherwise close the session under them.
+
+    Returns the payload for FastAPI to serialise, or a bare 304 response when
+    the client's ``If-None-Match`` already matches.
+    """
+    from api.database import ReadSessionLocal
+
+    async def run():
+        async with ReadSessionLocal() as db:
+            return await compute(db)
+
+    await response_cache.check_version(fetch_warehouse_version)
+    entry = await response_cache.get_or_compute((endpoint, normalise_params(params)), run)
+    headers = {"Cache-Control": f"public, max-age={int(response_cache.ttl)}"}
+    if entry.etag is None:
+        # Computed against a replaced warehouse version: not stored, so no ETag either
+        response.headers.update(headers)
+        return entry.payload
+    headers["ETag"] = entry.etag
+    if entry.etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return entry.payload
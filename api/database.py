@@ -1,7 +1,12 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import event
 from dotenv import load_dotenv
 import os
+import time
+
+from api.metrics import metrics, current_endpoint
 
 load_dotenv()
 
@@ -11,7 +16,45 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL not found in .env")
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+# -----------------------------
+# Pool settings
+# -----------------------------
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 disables
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# asyncpg prepared statements kept per connection. The analytic SQL is a small
+# fixed set of strings, so each one is parsed and planned once per connection.
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("db_pool_checkout_wait_seconds", time.perf_counter() - start)
+
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    future=True,
+    poolclass=TimedQueuePool,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+    pool_recycle=POOL_RECYCLE,
+    pool_pre_ping=POOL_PRE_PING,
+    connect_args={"prepared_statement_cache_size": STATEMENT_CACHE_SIZE},
+)
+
+# Analytic reads: no BEGIN/COMMIT round trips around each SELECT
+read_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -19,6 +62,51 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+ReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
+
+# -----------------------------
+# Pool and query instrumentation
+# -----------------------------
+@event.listens_for(engine.sync_engine.pool, "checkout")
+def _on_checkout(dbapi_conn, record, proxy):
+    metrics.inc("db_pool_checkouts_total")
+
+
+@event.listens_for(engine.sync_engine.pool, "connect")
+def _on_connect(dbapi_conn, record):
+    metrics.inc("db_pool_connections_opened_total")
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    # A single slot, not a stack: statements on one connection never overlap, and a
+    # failed statement (no after_cursor_execute) is simply overwritten by the next one
+    conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("query_start", None)
+    if start is None:
+        return
+    metrics.observe("db_query_seconds", time.perf_counter() - start, endpoint=current_endpoint.get())
+
+
+def pool_status():
+    pool = engine.sync_engine.pool
+    return {
+        "db_pool_size": pool.size(),
+        "db_pool_checked_in": pool.checkedin(),
+        "db_pool_checked_out": pool.checkedout(),
+        "db_pool_overflow": pool.overflow(),
+    }
+
+
 # This is the function main.py imports
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -27,4 +115,10 @@ async def get_db():
             await session.commit()
         except Exception:
             await session.rollback()
-            raise
\ No newline at end of file
+            raise
+
+
+async def get_read_db():
+    """Session for read-only analytic queries: autocommit, nothing to commit or roll back."""
+    async with ReadSessionLocal() as session:
+        yield session
@@ -0,0 +1,194 @@
+# api/export.py
+import io
+import os
+import csv
+import json
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from api.database import DATABASE_URL, STATEMENT_CACHE_SIZE
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: only needed for format=arrow
+    pa = None
+
+router = APIRouter(prefix="/api/export", tags=["Export"])
+
+# -----------------------------
+# Settings
+# -----------------------------
+EXPORT_BATCH_ROWS = int(os.getenv("API_EXPORT_BATCH_ROWS", "5000"))
+EXPORT_POOL_SIZE = int(os.getenv("API_EXPORT_POOL_SIZE", "2"))
+
+# Long-running extracts get their own small pool so they never starve the
+# report endpoints of connections
+export_engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=EXPORT_POOL_SIZE,
+    max_overflow=0,
+    pool_pre_ping=True,
+    connect_args={"prepared_statement_cache_size": STATEMENT_CACHE_SIZE},
+).execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+
+SCHEMA = "analytics"
+
+# Exportable tables: relation, output columns and their Arrow types. Both
+# facts are unique on (channel_key, message_id), which is the keyset order.
+EXPORTS = {
+    "messages": {
+        "relation": "fct_messages",
+        "columns": [
+            ("message_id", "int64"), ("channel_key", "int64"), ("channel_name", "string"),
+            ("date_key", "int32"), ("message_text", "string"), ("message_length", "int32"),
+            ("view_count", "int64"), ("forward_count", "int64"), ("has_image", "int32"),
+        ],
+    },
+    "image-detections": {
+        "relation": "fct_image_detections",
+        "columns": [
+            ("message_id", "int64"), ("channel_key", "int64"), ("channel_name", "string"),
+            ("date_key", "int32"), ("image_category", "string"), ("confidence_score", "float64"),
+            ("view_count", "int64"),
+        ],
+    },
+}
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def parse_after(after):
+    """``after`` is ``<channel_key>:<message_id>`` of the last row already received."""
+    try:
+        channel_key, message_id = after.split(":")
+        return int(channel_key), int(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="after must look like '<channel_key>:<message_id>'")
+
+
+def build_query(spec, channel, start_date, end_date, after, limit):
+    params = {}
+    filters = []
+    if channel is not None:
+        filters.append(
+            f"t.channel_key IN (SELECT channel_key FROM {SCHEMA}.dim_channels "
+            f"WHERE channel_name_normalized = lower(:channel))"
+        )
+        params["channel"] = channel
+    if start_date is not None:
+        filters.append("t.date_key >= :start_key")
+        params["start_key"] = int(start_date.strftime("%Y%m%d"))
+    if end_date is not None:
+        filters.append("t.date_key <= :end_key")
+        params["end_key"] = int(end_date.strftime("%Y%m%d"))
+    if after is not None:
+        filters.append("(t.channel_key, t.message_id) > (:after_channel, :after_id)")
+        params["after_channel"], params["after_id"] = parse_after(after)
+
+    columns = ", ".join("dc.channel_name" if name == "channel_name" else f"t.{name}" for name, _ in spec["columns"])
+    sql = f"""
+        SELECT {columns}
+        FROM {SCHEMA}.{spec["relation"]} t
+        JOIN {SCHEMA}.dim_channels dc ON t.channel_key = dc.channel_key
+        WHERE {" AND ".join(filters) or "TRUE"}
+        ORDER BY t.channel_key, t.message_id
+    """
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return text(sql), params
+
+
+# -----------------------------
+# Encoders: one chunk of bytes per batch of rows
+# -----------------------------
+def encode_ndjson(names, rows):
+    return "".join(json.dumps(dict(zip(names, row)), ensure_ascii=False, default=str) + "\n" for row in rows).encode()
+
+
+def encode_csv(names, rows, header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(names)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+class ArrowStreamEncoder:
+    """Arrow IPC stream: the schema message first, then one record batch per chunk."""
+
+    def __init__(self, columns):
+        self.schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+        self.sink = io.BytesIO()
+        self.writer = pa.ipc.new_stream(self.sink, self.schema)
+
+    def _drain(self):
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return data
+
+    def encode(self, rows):
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        return self._drain()
+
+    def close(self):
+        self.writer.close()
+        return self._drain()
+
+
+async def stream_rows(query, params, names, fmt, columns):
+    """Yield encoded chunks from a server-side cursor; memory is bounded by the batch size."""
+    arrow = ArrowStreamEncoder(columns) if fmt == "arrow" else None
+    first = True
+    async with export_engine.connect() as conn:
+        result = await conn.stream(query, params)
+        async for rows in result.partitions(EXPORT_BATCH_ROWS):
+            rows = [tuple(row) for row in rows]
+            if fmt == "ndjson":
+                yield encode_ndjson(names, rows)
+            elif fmt == "csv":
+                yield encode_csv(names, rows, header=first)
+            else:
+                yield arrow.encode(rows)
+            first = False
+    if fmt == "csv" and first:
+        yield encode_csv(names, [], header=True)
+    if arrow is not None:
+        yield arrow.close()
+
+
+@router.get("/{table}")
+async def export_table(
+    table: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$"),
+    channel: Optional[str] = Query(None, description="Only export this channel"),
+    start_date: Optional[date] = Query(None, description="First day to include"),
+    end_date: Optional[date] = Query(None, description="Last day to include"),
+    after: Optional[str] = Query(None, description="Resume after '<channel_key>:<message_id>' of the last row received"),
+    limit: Optional[int] = Query(None, ge=1, description="Stop after this many rows"),
+):
+    spec = EXPORTS.get(table)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{table}' (expected one of {sorted(EXPORTS)})")
+    if format == "arrow" and pa is None:
+        raise HTTPException(status_code=501, detail="format=arrow needs the 'pyarrow' package on the API server")
+
+    query, params = build_query(spec, channel, start_date, end_date, after, limit)
+    names = [name for name, _ in spec["columns"]]
+    return StreamingResponse(
+        stream_rows(query, params, names, format, spec["columns"]),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
@@ -1,133 +1,534 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+import json
+import base64
+import time
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from sqlalchemy.exc import ProgrammingError
-from api.database import get_db
+from api.database import get_read_db, pool_status
+from api.metrics import metrics, current_endpoint
+from api.cache import cached_response, response_cache
+from api.export import router as export_router
 from api.schemas import (
     TopProduct, ChannelActivityItem,
-    MessageSearchResult, VisualContentStat
+    MessageSearchResult, VisualContentStat, ImageDuplicate,
+    ProductMentionStat, ProductMention
 )
-from typing import List
+from typing import List, Optional
+from datetime import date
+
+def route_path(request: Request):
+    """Path template of the route that matched ``request``, or "other" if none did."""
+    return getattr(request.scope.get("route"), "path", "other")
+
+
+async def tag_endpoint(request: Request):
+    # Runs once routing has matched; tags the DB query timings recorded in api/database.py
+    current_endpoint.set(route_path(request))
+
 
 app = FastAPI(
     title="Medical Telegram Analytics API",
     description="Analytical API exposing dbt data warehouse insights",
-    version="1.0.0"
+    version="1.0.0",
+    dependencies=[Depends(tag_endpoint)]
 )
+app.include_router(export_router)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Routing fills scope["route"] during call_next; included routers are not flat
+    # routes with a .path on every FastAPI version, so don't match them here
+    endpoint = route_path(request)
+    metrics.observe("api_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+    metrics.inc("api_requests_total", endpoint=endpoint, status=response.status_code)
+    return response
 
 @app.get("/")
 async def health_check():
     return {"status": "API running", "tip": "Go to /docs for interactive testing"}
 
-# Endpoint 1: Top Products - with error handling + simpler fallback
+# Endpoint 1: Top Products - served from the precomputed term-count marts
 @app.get("/api/reports/top-products", response_model=List[TopProduct])
 async def top_products(
+    request: Request,
+    response: Response,
     limit: int = Query(10, ge=1, le=50),
-    db: AsyncSession = Depends(get_db)
+    channel: Optional[str] = Query(None, description="Only count terms from this channel"),
+    start_date: Optional[date] = Query(None, description="First day to include"),
+    end_date: Optional[date] = Query(None, description="Last day to include")
 ):
     # CHANGE 'analytics' to your actual schema if different (e.g. public)
     schema = "analytics"  # <-- FIX THIS if \dt shows different
 
-    query = text(f"""
-        WITH words AS (
-            SELECT unnest(regexp_split_to_array(lower(message_text), '\\s+')) AS word
-            FROM {schema}.fct_messages
-            WHERE message_text IS NOT NULL AND message_text != ''
-        )
-        SELECT word, COUNT(*) AS count
-FROM words
-WHERE length(word) > 2
-GROUP BY word
-ORDER BY count DESC
-LIMIT :limit
-    """)
+    params = {"limit": limit}
+    if channel is None and start_date is None and end_date is None:
+        # All-time totals: a top-K index scan on agg_term_totals
+        query = text(f"""
+            SELECT term AS word, term_count AS count
+            FROM {schema}.agg_term_totals
+            ORDER BY term_count DESC, term
+            LIMIT :limit
+        """)
+    else:
+        filters = []
+        if channel is not None:
+            filters.append(
+                f"t.channel_key IN (SELECT channel_key FROM {schema}.dim_channels "
+                f"WHERE channel_name_normalized = lower(:channel))"
+            )
+            params["channel"] = channel
+        if start_date is not None:
+            filters.append("t.date_key >= :start_key")
+            params["start_key"] = int(start_date.strftime("%Y%m%d"))
+        if end_date is not None:
+            filters.append("t.date_key <= :end_key")
+            params["end_key"] = int(end_date.strftime("%Y%m%d"))
+        query = text(f"""
+            SELECT t.term AS word, SUM(t.term_count) AS count
+            FROM {schema}.agg_term_daily t
+            WHERE {" AND ".join(filters)}
+            GROUP BY t.term
+            ORDER BY count DESC, t.term
+            LIMIT :limit
+        """)
 
-    try:
-        result = await db.execute(query, {"limit": limit})
-        rows = result.fetchall()
-        return [{"product": row.word, "count": row.count} for row in rows]
-    except ProgrammingError as e:
-        raise HTTPException(status_code=500, detail=f"DB Error (check schema/table): {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
+    async def fetch(db):
+        try:
+            result = await db.execute(query, params)
+            rows = result.fetchall()
+            return [{"product": row.word, "count": row.count} for row in rows]
+        except ProgrammingError as e:
+            raise HTTPException(status_code=500, detail=f"DB Error (check schema/table): {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
-# Endpoint 2: Channel Activity
+    return await cached_response(request, response, "top_products", params, fetch)
+
+# Endpoint 2: Channel Activity - rolled up from the agg_channel_daily mart
 @app.get("/api/channels/{channel_name}/activity", response_model=List[ChannelActivityItem])
-async def channel_activity(channel_name: str, db: AsyncSession = Depends(get_db)):
+async def channel_activity(
+    channel_name: str,
+    request: Request,
+    response: Response,
+    start: Optional[date] = Query(None, description="First day to include"),
+    end: Optional[date] = Query(None, description="Last day to include"),
+    granularity: str = Query("day", pattern="^(day|week|month)$")
+):
     schema = "analytics"  # <-- FIX if needed
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+
+    params = {"channel_name": channel_name, "granularity": granularity}
+    filters = []
+    if start is not None:
+        filters.append("a.date_key >= :start_key")
+        params["start_key"] = int(start.strftime("%Y%m%d"))
+    if end is not None:
+        filters.append("a.date_key <= :end_key")
+        params["end_key"] = int(end.strftime("%Y%m%d"))
+    # Without a range, keep the old behaviour: the 30 most recent active periods
+    limit = "" if filters else "LIMIT 30"
+
     query = text(f"""
-        SELECT 
-            dd.full_date::date,
-            COUNT(fm.message_id),
-            AVG(fm.view_count)::float
-        FROM {schema}.fct_messages fm
-        JOIN {schema}.dim_channels dc ON fm.channel_key = dc.channel_key
-        JOIN {schema}.dim_dates dd ON fm.date_key = dd.date_key
-        WHERE lower(dc.channel_name) = lower(:channel_name)
-        GROUP BY dd.full_date
-        ORDER BY dd.full_date DESC
-        LIMIT 30
+        SELECT
+            date_trunc(:granularity, a.full_date::timestamp)::date AS period,
+            SUM(a.post_count) AS post_count,
+            SUM(a.total_views)::float / NULLIF(SUM(a.viewed_post_count), 0) AS avg_views
+        FROM {schema}.agg_channel_daily a
+        WHERE a.channel_key IN (
+            SELECT channel_key FROM {schema}.dim_channels
+            WHERE channel_name_normalized = lower(:channel_name)
+        )
+        {"".join(" AND " + f for f in filters)}
+        GROUP BY period
+        ORDER BY period DESC
+        {limit}
     """)
+
+    async def fetch(db):
+        try:
+            result = await db.execute(query, params)
+            rows = result.fetchall()
+            if not rows:
+                return []  # empty list if no data
+            return [{"post_date": r[0], "post_count": r[1], "avg_views": r[2]} for r in rows]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
+
+    return await cached_response(request, response, "channel_activity", params, fetch)
+
+# Endpoint 3: Message Search - full-text + trigram index on fct_messages, keyset paginated
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, *types):
+    """Values of a cursor made by ``encode_cursor``; 400 unless they have ``types`` (float also takes int)."""
     try:
-        result = await db.execute(query, {"channel_name": channel_name})
-        rows = result.fetchall()
-        if not rows:
-            return []  # empty list if no data
-        return [{"post_date": r[0], "post_count": r[1], "avg_views": r[2]} for r in rows]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    for value, kind in zip(values, types):
+        allowed = (int, float) if kind is float else kind
+        # bool is an int to isinstance; bigint columns can't take anything wider
+        if isinstance(value, bool) or not isinstance(value, allowed) \
+                or (isinstance(value, int) and not -2**63 <= value < 2**63):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def like_pattern(term):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
 
-# Endpoint 3: Message Search
 @app.get("/api/search/messages", response_model=List[MessageSearchResult])
 async def search_messages(
+    response: Response,
     query: str = Query(..., min_length=2),
     limit: int = Query(20, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
+    channel: Optional[str] = Query(None, description="Only search this channel"),
+    start_date: Optional[date] = Query(None, description="First day to include"),
+    end_date: Optional[date] = Query(None, description="Last day to include"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header from the previous page"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     schema = "analytics"  # <-- FIX if needed
+
+    # Whole words go through the tsvector index and are ranked; substrings
+    # (e.g. "amoxi") still match through the trigram index with rank 0.
+    params = {"query": query, "pattern": like_pattern(query), "limit": limit + 1}
+    filters = []
+    if channel is not None:
+        filters.append(
+            f"fm.channel_key IN (SELECT channel_key FROM {schema}.dim_channels "
+            f"WHERE channel_name_normalized = lower(:channel))"
+        )
+        params["channel"] = channel
+    if start_date is not None:
+        filters.append("fm.date_key >= :start_key")
+        params["start_key"] = int(start_date.strftime("%Y%m%d"))
+    if end_date is not None:
+        filters.append("fm.date_key <= :end_key")
+        params["end_key"] = int(end_date.strftime("%Y%m%d"))
+
+    after = "TRUE"
+    if cursor is not None:
+        params["after_rank"], params["after_channel"], params["after_id"] = decode_cursor(cursor, float, int, int)
+        after = """(hits.rank < CAST(:after_rank AS real)
+            OR (hits.rank = CAST(:after_rank AS real)
+                AND (hits.channel_key, hits.message_id) > (:after_channel, :after_id)))"""
+
     sql = text(f"""
-        SELECT fm.message_id, dc.channel_name, dd.full_date::date, fm.message_text, fm.view_count
-        FROM {schema}.fct_messages fm
-        JOIN {schema}.dim_channels dc ON fm.channel_key = dc.channel_key
-        JOIN {schema}.dim_dates dd ON fm.date_key = dd.date_key
-        WHERE fm.message_text ILIKE :search_term
-        ORDER BY fm.view_count DESC NULLS LAST
+        WITH q AS (SELECT websearch_to_tsquery('simple', :query) AS tsq)
+        SELECT hits.*, dc.channel_name, dd.full_date::date AS message_date
+        FROM (
+            SELECT fm.message_id, fm.channel_key, fm.date_key, fm.message_text, fm.view_count,
+                   ts_rank_cd(fm.search_vector, q.tsq) AS rank
+            FROM {schema}.fct_messages fm CROSS JOIN q
+            WHERE (fm.search_vector @@ q.tsq OR fm.message_text ILIKE :pattern)
+            {"".join(" AND " + f for f in filters)}
+        ) hits
+        JOIN {schema}.dim_channels dc ON hits.channel_key = dc.channel_key
+        JOIN {schema}.dim_dates dd ON hits.date_key = dd.date_key
+        WHERE {after}
+        ORDER BY hits.rank DESC, hits.channel_key, hits.message_id
         LIMIT :limit
     """)
     try:
-        result = await db.execute(sql, {"search_term": f"%{query}%", "limit": limit})
+        result = await db.execute(sql, params)
         rows = result.fetchall()
-        return [
-            {"message_id": r[0], "channel_name": r[1], "message_date": r[2],
-             "message_text": r[3], "views": r[4]} for r in rows
-        ]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
 
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.rank, last.channel_key, last.message_id)
+    return [
+        {"message_id": r.message_id, "channel_name": r.channel_name, "message_date": r.message_date,
+         "message_text": r.message_text, "views": r.view_count, "rank": r.rank} for r in rows
+    ]
+
 # Endpoint 4: Visual Content Stats
 @app.get("/api/reports/visual-content", response_model=List[VisualContentStat])
-async def visual_content_stats(db: AsyncSession = Depends(get_db)):
+async def visual_content_stats(
+    request: Request,
+    response: Response,
+    channel: Optional[str] = Query(None, description="Only report this channel"),
+    start_date: Optional[date] = Query(None, description="First day to include"),
+    end_date: Optional[date] = Query(None, description="Last day to include")
+):
     schema = "analytics"  # <-- FIX if needed
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    # agg_visual_content_daily has one row per channel, day and category, so
+    # the cost depends on the days requested, not on the number of messages
+    params = {}
+    filters = []
+    if channel is not None:
+        filters.append(
+            f"a.channel_key IN (SELECT channel_key FROM {schema}.dim_channels "
+            f"WHERE channel_name_normalized = lower(:channel))"
+        )
+        params["channel"] = channel
+    if start_date is not None:
+        filters.append("a.date_key >= :start_key")
+        params["start_key"] = int(start_date.strftime("%Y%m%d"))
+    if end_date is not None:
+        filters.append("a.date_key <= :end_key")
+        params["end_key"] = int(end_date.strftime("%Y%m%d"))
+
     query = text(f"""
-    SELECT 
-        dc.channel_name,
-        COUNT(*) AS total_messages,
-        COALESCE(SUM(CASE WHEN fm.has_image = 1 THEN 1 ELSE 0 END), 0) AS messages_with_images,
-        ROUND(
-            100.0 * COALESCE(SUM(CASE WHEN fm.has_image = 1 THEN 1 ELSE 0 END), 0) / NULLIF(COUNT(*), 0),
-            2
-        ) AS percentage_with_images
-    FROM {schema}.fct_messages fm
-    JOIN {schema}.dim_channels dc ON fm.channel_key = dc.channel_key
-    GROUP BY dc.channel_name
-    ORDER BY percentage_with_images DESC
-""")
-    try:
-        result = await db.execute(query)
-        rows = result.fetchall()
+        SELECT
+            dc.channel_name,
+            a.image_category,
+            SUM(a.message_count) AS message_count,
+            SUM(a.image_message_count) AS image_message_count,
+            SUM(a.detection_count) AS detection_count,
+            SUM(a.confidence_sum) AS confidence_sum,
+            SUM(a.viewed_message_count) AS viewed_message_count,
+            SUM(a.total_views) AS total_views
+        FROM {schema}.agg_visual_content_daily a
+        JOIN {schema}.dim_channels dc ON a.channel_key = dc.channel_key
+        WHERE {" AND ".join(filters) or "TRUE"}
+        GROUP BY dc.channel_name, a.image_category
+    """)
+
+    def ratio(numerator, denominator, digits=2):
+        return round(float(numerator) / denominator, digits) if denominator else None
+
+    async def fetch(db):
+        try:
+            result = await db.execute(query, params)
+            rows = result.fetchall()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
+
+        channels = {}
+        for name, category, messages, images, detections, confidence, viewed, views in rows:
+            stat = channels.setdefault(name, {
+                "channel_name": name, "total_messages": 0, "messages_with_images": 0,
+                "detected_images": 0, "confidence_sum": 0.0, "viewed": 0, "views": 0, "categories": [],
+            })
+            stat["total_messages"] += messages
+            stat["messages_with_images"] += images
+            stat["viewed"] += viewed
+            stat["views"] += views
+            if detections:
+                stat["detected_images"] += detections
+                stat["confidence_sum"] += float(confidence)
+                stat["categories"].append({
+                    "image_category": category,
+                    "image_count": detections,
+                    "avg_confidence": ratio(confidence, detections, 4),
+                    "avg_views": ratio(views, viewed),
+                })
+
+        report = []
+        for stat in channels.values():
+            for category in stat["categories"]:
+                category["percentage_of_images"] = ratio(100 * category["image_count"], stat["detected_images"]) or 0
+            stat["categories"].sort(key=lambda c: c["image_count"], reverse=True)
+            report.append({
+                "channel_name": stat["channel_name"],
+                "total_messages": stat["total_messages"],
+                "messages_with_images": stat["messages_with_images"],
+                "percentage_with_images": ratio(100 * stat["messages_with_images"], stat["total_messages"]) or 0,
+                "detected_images": stat["detected_images"],
+                "avg_confidence": ratio(stat["confidence_sum"], stat["detected_images"], 4),
+                "avg_views": ratio(stat["views"], stat["viewed"]),
+                "categories": stat["categories"],
+            })
+        report.sort(key=lambda r: r["percentage_with_images"], reverse=True)
+        return report
+
+    return await cached_response(request, response, "visual_content_stats", params, fetch)
+
+# Endpoint 5: Near-duplicate images (perceptual-hash clusters)
+@app.get("/api/images/{channel_name}/{message_id}/duplicates", response_model=List[ImageDuplicate])
+async def image_duplicates(
+    channel_name: str,
+    message_id: int,
+    request: Request,
+    response: Response
+):
+    schema = "analytics"  # <-- FIX if needed
+    query = text(f"""
+        WITH target AS (
+            SELECT d.canonical_channel_key, d.canonical_message_id
+            FROM {schema}.fct_image_duplicates d
+            JOIN {schema}.dim_channels dc ON d.channel_key = dc.channel_key
+            WHERE dc.channel_name_normalized = lower(:channel_name)
+              AND d.message_id = :message_id
+        )
+        SELECT dc.channel_name, d.message_id, d.hamming_distance, d.is_canonical
+        FROM {schema}.fct_image_duplicates d
+        JOIN target t
+          ON d.canonical_channel_key = t.canonical_channel_key
+         AND d.canonical_message_id = t.canonical_message_id
+        JOIN {schema}.dim_channels dc ON d.channel_key = dc.channel_key
+        ORDER BY d.is_canonical DESC, d.hamming_distance, dc.channel_name, d.message_id
+    """)
+    params = {"channel_name": channel_name, "message_id": message_id}
+
+    async def fetch(db):
+        try:
+            result = await db.execute(query, params)
+            return [
+                {"channel_name": r[0], "message_id": r[1], "hamming_distance": r[2], "is_canonical": r[3]}
+                for r in result.fetchall()
+            ]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
+
+    return await cached_response(request, response, "image_duplicates", params, fetch)
+
+# Endpoint 6: Product mentions - dictionary matches from fct_product_mentions
+def product_filters(schema, params, channel, start_date, end_date, alias="p"):
+    filters = []
+    if channel is not None:
+        filters.append(
+            f"{alias}.channel_key IN (SELECT channel_key FROM {schema}.dim_channels "
+            f"WHERE channel_name_normalized = lower(:channel))"
+        )
+        params["channel"] = channel
+    if start_date is not None:
+        filters.append(f"{alias}.date_key >= :start_key")
+        params["start_key"] = int(start_date.strftime("%Y%m%d"))
+    if end_date is not None:
+        filters.append(f"{alias}.date_key <= :end_key")
+        params["end_key"] = int(end_date.strftime("%Y%m%d"))
+    return filters
+
+@app.get("/api/reports/product-mentions", response_model=List[ProductMentionStat])
+async def product_mention_stats(
+    request: Request,
+    response: Response,
+    limit: int = Query(20, ge=1, le=200),
+    category: Optional[str] = Query(None, description="medicine, supplement, cosmetic or device"),
+    channel: Optional[str] = Query(None, description="Only count mentions in this channel"),
+    start_date: Optional[date] = Query(None, description="First day to include"),
+    end_date: Optional[date] = Query(None, description="Last day to include")
+):
+    schema = "analytics"  # <-- FIX if needed
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    params = {"limit": limit}
+    filters = product_filters(schema, params, channel, start_date, end_date)
+    if category is not None:
+        filters.append("p.category = lower(:category)")
+        params["category"] = category
+    query = text(f"""
+        SELECT
+            p.product_name,
+            MIN(p.category) AS category,
+            COUNT(*) AS mention_count,
+            COUNT(DISTINCT (p.channel_key, p.message_id)) AS message_count,
+            COUNT(DISTINCT p.channel_key) AS channel_count,
+            COUNT(p.price_birr) AS priced_mentions,
+            MIN(p.price_birr) AS min_price,
+            AVG(p.price_birr) AS avg_price,
+            MAX(p.price_birr) AS max_price
+        FROM {schema}.fct_product_mentions p
+        WHERE {" AND ".join(filters) or "TRUE"}
+        GROUP BY p.product_name
+        ORDER BY mention_count DESC, p.product_name
+        LIMIT :limit
+    """)
+
+    def price(value):
+        return round(float(value), 2) if value is not None else None
+
+    async def fetch(db):
+        try:
+            result = await db.execute(query, params)
+            rows = result.fetchall()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
         return [
-            {"channel_name": r[0], "total_messages": r[1], "messages_with_images": r[2],
-             "percentage_with_images": r[3] or 0} for r in rows
+            {"product_name": r.product_name, "category": r.category, "mention_count": r.mention_count,
+             "message_count": r.message_count, "channel_count": r.channel_count,
+             "priced_mentions": r.priced_mentions, "min_price_birr": price(r.min_price),
+             "avg_price_birr": price(r.avg_price), "max_price_birr": price(r.max_price)}
+            for r in rows
         ]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
\ No newline at end of file
+
+    return await cached_response(request, response, "product_mention_stats", params, fetch)
+
+@app.get("/api/products/{product_name}/mentions", response_model=List[ProductMention])
+async def product_mentions(
+    product_name: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    channel: Optional[str] = Query(None, description="Only mentions in this channel"),
+    start_date: Optional[date] = Query(None, description="First day to include"),
+    end_date: Optional[date] = Query(None, description="Last day to include"),
+    priced: bool = Query(False, description="Only mentions that quote a price")
+):
+    schema = "analytics"  # <-- FIX if needed
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    params = {"product": product_name, "limit": limit, "priced": priced}
+    filters = product_filters(schema, params, channel, start_date, end_date)
+    if priced:
+        filters.append("p.price_birr IS NOT NULL")
+    # Newest first; the message text comes from the fct_messages partition of the same day
+    query = text(f"""
+        SELECT dc.channel_name, p.message_id, dd.full_date::date AS message_date, p.matched_alias,
+               p.price_birr, fm.message_text, fm.view_count
+        FROM {schema}.fct_product_mentions p
+        JOIN {schema}.dim_channels dc ON p.channel_key = dc.channel_key
+        JOIN {schema}.dim_dates dd ON p.date_key = dd.date_key
+        LEFT JOIN {schema}.fct_messages fm
+          ON fm.channel_key = p.channel_key
+         AND fm.message_id = p.message_id
+         AND fm.date_key = p.date_key
+        WHERE p.product_name_normalized IN (
+            -- a brand or alias ("panadol") finds its product ("Paracetamol")
+            SELECT lower(:product)
+            UNION
+            SELECT lower(product_name) FROM {schema}.product_dictionary WHERE alias = lower(:product)
+        )
+        {"".join(" AND " + f for f in filters)}
+        ORDER BY p.date_key DESC, p.message_id DESC, p.mention_index
+        LIMIT :limit
+    """)
+
+    async def fetch(db):
+        try:
+            result = await db.execute(query, params)
+            rows = result.fetchall()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"DB Error: {str(e)}")
+        return [
+            {"channel_name": r.channel_name, "message_id": r.message_id, "message_date": r.message_date,
+             "matched_alias": r.matched_alias,
+             "price_birr": float(r.price_birr) if r.price_birr is not None else None,
+             "message_text": r.message_text, "views": r.view_count}
+            for r in rows
+        ]
+
+    return await cached_response(request, response, "product_mentions", params, fetch)
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return response_cache.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics(format: str = Query("prometheus", pattern="^(prometheus|json)$")):
+    gauges = {**pool_status(), **{f"api_cache_{k}": v for k, v in response_cache.stats().items()
+                                  if isinstance(v, int)}}
+    if format == "json":
+        return metrics.as_dict(gauges)
+    return PlainTextResponse(metrics.render_prometheus(gauges), media_type="text/plain; version=0.0.4")
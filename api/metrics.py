@@ -0,0 +1,17 @@
+# api/metrics.py
+import os
+import sys
+from contextvars import ContextVar
+
+# Counters and histograms are shared with the scraper, loaders and YOLO (src/instrumentation.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from instrumentation import metrics  # noqa: E402,F401
+
+# Route template of the request being served, used to tag DB query timings
+current_endpoint = ContextVar("current_endpoint", default="other")
+
+metrics.describe("api_request_seconds", "API request latency by route template")
+metrics.describe("api_requests_total", "API requests by route template and status code")
+metrics.describe("db_query_seconds", "Warehouse query latency by route template")
+metrics.describe("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection")
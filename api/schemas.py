@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import date
 
 class TopProduct(BaseModel):
@@ -17,9 +17,47 @@ class MessageSearchResult(BaseModel):
     message_date: date
     message_text: str
     views: Optional[int] = None
+    rank: Optional[float] = None
+
+class ImageCategoryStat(BaseModel):
+    image_category: str
+    image_count: int
+    percentage_of_images: float
+    avg_confidence: Optional[float] = None
+    avg_views: Optional[float] = None
 
 class VisualContentStat(BaseModel):
     channel_name: str
     total_messages: int
     messages_with_images: int
-    percentage_with_images: float
\ No newline at end of file
+    percentage_with_images: float
+    detected_images: int = 0
+    avg_confidence: Optional[float] = None
+    avg_views: Optional[float] = None
+    categories: List[ImageCategoryStat] = []
+
+class ProductMentionStat(BaseModel):
+    product_name: str
+    category: Optional[str] = None
+    mention_count: int
+    message_count: int
+    channel_count: int
+    priced_mentions: int = 0
+    min_price_birr: Optional[float] = None
+    avg_price_birr: Optional[float] = None
+    max_price_birr: Optional[float] = None
+
+class ProductMention(BaseModel):
+    channel_name: str
+    message_id: int
+    message_date: date
+    matched_alias: str
+    price_birr: Optional[float] = None
+    message_text: Optional[str] = None
+    views: Optional[int] = None
+
+class ImageDuplicate(BaseModel):
+    channel_name: str
+    message_id: int
+    hamming_distance: int
+    is_canonical: bool
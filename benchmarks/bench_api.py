@@ -0,0 +1,141 @@
+# benchmarks/bench_api.py
+"""Latency of every API endpoint against a seeded warehouse.
+
+Seeds raw.telegram_messages with N synthetic messages and builds the marts
+(same as bench_search.py), then calls each endpoint in-process through the
+ASGI app. "cold" clears the response cache before every call so the query
+itself is timed; "warm" is served from the cache. The bulk export is timed
+end to end as rows/sec.
+
+Needs DATABASE_URL (for the API) and POSTGRES_* (for seeding) pointing at
+the same scratch database.
+
+    python benchmarks/bench_api.py --messages 1000000 --repeat 20
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import date, timedelta
+
+import httpx
+
+from bench_dbt_incremental import REPO_ROOT, copy_records, reset, dbt_run, extract_products
+from bench_search import percentiles
+from synthetic import synthetic_messages
+
+sys.path.insert(0, REPO_ROOT)  # for the api package
+
+SYNTHETIC_START = date(2024, 1, 1)  # first message date used by synthetic_messages
+
+
+def endpoints(days):
+    """``(label, path, params)`` for every report endpoint, unfiltered and filtered."""
+    end = SYNTHETIC_START + timedelta(days=max(days - 1, 0))
+    window = {"start_date": str(end - timedelta(days=29)), "end_date": str(end)}
+    return [
+        ("top-products", "/api/reports/top-products", {"limit": 10}),
+        ("top-products channel+range", "/api/reports/top-products", {"limit": 10, "channel": "channel_0", **window}),
+        ("channel activity", "/api/channels/channel_0/activity", {}),
+        ("channel activity range weekly", "/api/channels/channel_0/activity",
+         {"start": str(SYNTHETIC_START), "end": str(end), "granularity": "week"}),
+        ("search", "/api/search/messages", {"query": "paracetamol", "limit": 20}),
+        ("search channel+range", "/api/search/messages", {"query": "vitamin", "limit": 20, "channel": "channel_1", **window}),
+        ("visual content", "/api/reports/visual-content", {}),
+        ("visual content channel+range", "/api/reports/visual-content", {"channel": "channel_2", **window}),
+        ("product mentions", "/api/reports/product-mentions", {"limit": 20}),
+        ("product mentions category+range", "/api/reports/product-mentions",
+         {"limit": 20, "category": "medicine", **window}),
+        ("mentions of one product", "/api/products/paracetamol/mentions", {"limit": 50}),
+        ("metrics", "/metrics", {}),
+    ]
+
+
+async def timed_get(client, path, params):
+    start = time.perf_counter()
+    response = await client.get(path, params=params)
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {path} {params} -> {response.status_code}: {response.text[:200]}")
+    return elapsed, response
+
+
+async def bench(days, repeat, concurrency, export_limit):
+    from api.main import app
+    from api.cache import response_cache
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        targets = endpoints(days)
+        for label, path, params in targets:
+            cold, warm = [], []
+            for _ in range(repeat):
+                response_cache.clear()
+                cold.append((await timed_get(client, path, params))[0])
+            for _ in range(repeat):
+                warm.append((await timed_get(client, path, params))[0])
+            results.append({"mode": f"{label} (cold)", **percentiles(cold)})
+            results.append({"mode": f"{label} (warm)", **percentiles(warm)})
+
+        # Mixed load: every endpoint at once, cache cleared so each burst hits the database
+        response_cache.clear()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            await asyncio.gather(*[
+                timed_get(client, path, params)
+                for _ in range(concurrency) for _, path, params in targets
+            ])
+            response_cache.clear()
+        elapsed = time.perf_counter() - start
+        requests = repeat * concurrency * len(targets)
+        results.append({"mode": f"mixed x{concurrency} concurrent", "requests": requests,
+                        "seconds": round(elapsed, 3), "requests_per_sec": round(requests / elapsed, 1)})
+
+        start = time.perf_counter()
+        rows = 0
+        params = {"format": "ndjson"} if export_limit is None else {"format": "ndjson", "limit": export_limit}
+        async with client.stream("GET", "/api/export/messages", params=params) as response:
+            async for chunk in response.aiter_bytes():
+                rows += chunk.count(b"\n")
+        elapsed = time.perf_counter() - start
+        results.append({"mode": "export messages ndjson", "rows": rows, "seconds": round(elapsed, 3),
+                        "rows_per_sec": round(rows / elapsed, 1) if elapsed else None})
+    return results
+
+
+def run(messages=200_000, channels=4, days=365, repeat=10, concurrency=4, export_limit=None, seed=True,
+        text_length=120, image_ratio=0.4):
+    if seed:
+        reset()
+        copy_records(synthetic_messages(messages, channels=channels, days=days,
+                                        text_length=text_length, image_ratio=image_ratio))
+        extract_products()
+        dbt_run("--full-refresh")
+
+    return {
+        "stage": "api",
+        "params": {"messages": messages, "channels": channels, "days": days, "repeat": repeat,
+                   "concurrency": concurrency, "export_limit": export_limit},
+        "results": asyncio.run(bench(days, repeat, concurrency, export_limit)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--export-limit", type=int, default=None)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the marts from a previous run")
+    args = parser.parse_args()
+    print(json.dumps(run(args.messages, args.channels, args.days, args.repeat,
+                         args.concurrency, args.export_limit, not args.no_seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/bench_dbt_incremental.py
+"""Time a full-refresh dbt run against an incremental one.
+
+Seeds raw.telegram_messages with N synthetic messages (COPY through the raw
+loader), runs ``dbt run --full-refresh``, then adds a day's worth of new
+messages plus view-count updates on existing ones and runs ``dbt run``.
+
+Point POSTGRES_* and medical_warehouse/profiles.yml at a scratch database:
+the benchmark drops raw.telegram_messages.
+
+    python benchmarks/bench_dbt_incremental.py --messages 1000000 --delta 5000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+import load_raw_to_postgres as raw_loader  # noqa: E402
+import load_yolo_results as yolo_loader  # noqa: E402
+import load_image_clusters as cluster_loader  # noqa: E402
+import product_extraction  # noqa: E402
+from synthetic import synthetic_messages  # noqa: E402
+
+DBT_PROJECT = os.path.join(REPO_ROOT, "medical_warehouse")
+
+
+def copy_records(records, chunk_size=50000):
+    """Load records straight into raw.telegram_messages with COPY + upsert."""
+    conn = raw_loader.engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        raw_loader.ensure_schema(cur)
+        raw_loader.create_stage(cur)
+        raw_loader.upsert_records(cur, records, chunk_size)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def reset():
+    with raw_loader.engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS raw.telegram_messages")
+        conn.exec_driver_sql("DROP TABLE IF EXISTS raw.product_mentions, raw.extraction_state")
+        # The partitioned facts ignore --full-refresh, so start them from scratch too
+        conn.exec_driver_sql("DROP TABLE IF EXISTS analytics.fct_image_detections, analytics.fct_messages CASCADE")
+    conn = raw_loader.engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        yolo_loader.ensure_schema(cur)  # fct_image_detections reads this table
+        cur.execute(cluster_loader.SCHEMA_SQL)  # and fct_image_duplicates this one
+        cur.execute(product_extraction.SCHEMA_SQL)  # and fct_product_mentions this one
+        conn.commit()
+    finally:
+        conn.close()
+    dbt("seed")  # the term marts filter on the stopwords seed
+
+
+def dbt(command, *args):
+    start = time.perf_counter()
+    result = subprocess.run(
+        ["dbt", command, "--project-dir", DBT_PROJECT, "--profiles-dir", DBT_PROJECT, *args],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"dbt failed:\n{result.stdout}\n{result.stderr}")
+    return round(time.perf_counter() - start, 3)
+
+
+def dbt_run(*args):
+    return dbt("run", *args)
+
+
+def extract_products():
+    """Run the product-mention extractor; returns its wall time."""
+    start = time.perf_counter()
+    product_extraction.extract_incremental()
+    return round(time.perf_counter() - start, 3)
+
+
+def run(messages=200_000, delta=2_000, channels=4, days=365, text_length=120, image_ratio=0.4):
+    shape = {"channels": channels, "text_length": text_length, "image_ratio": image_ratio}
+    reset()
+    start = time.perf_counter()
+    copy_records(synthetic_messages(messages, days=days, **shape))
+    seed_seconds = round(time.perf_counter() - start, 3)
+
+    full_extract = extract_products()
+    full = dbt_run("--full-refresh")
+    noop = dbt_run()
+
+    # A day of new posts on every channel, plus fresh view counts on old ones
+    per_channel = messages // channels
+    new = [
+        dict(r, message_id=r["message_id"] + per_channel)
+        for r in synthetic_messages(delta, days=1, seed=7, **shape)
+    ]
+    updated = [
+        dict(r, views=r["views"] + 100)
+        for r in synthetic_messages(delta, days=days, **shape)
+    ]
+    copy_records(new + updated)
+    incremental_extract = extract_products()
+    incremental = dbt_run()
+
+    return {
+        "stage": "dbt_run",
+        "params": {"messages": messages, "delta": delta, "days": days, **shape},
+        "results": [
+            {"mode": "seed raw.telegram_messages", "seconds": seed_seconds},
+            {"mode": "extract product mentions (all)", "seconds": full_extract},
+            {"mode": "dbt run --full-refresh", "seconds": full},
+            {"mode": "dbt run (no new data)", "seconds": noop},
+            {"mode": f"extract product mentions (+{delta} new, {delta} updated)", "seconds": incremental_extract},
+            {"mode": f"dbt run (+{delta} new, {delta} updated)", "seconds": incremental},
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--delta", type=int, default=2_000)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    print(json.dumps(run(args.messages, args.delta, args.channels, args.days), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_image_hash.py
+"""Time Hamming-radius lookups in the image-hash index against a linear scan.
+
+Builds a MultiIndexHash over N random 64-bit hashes (the worst case for
+bucket pruning; real dHashes cluster) and queries it with near-duplicates
+of indexed hashes.
+
+    python benchmarks/bench_image_hash.py --hashes 500000 --queries 2000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from image_hash import MultiIndexHash, hamming  # noqa: E402
+
+
+def flip_bits(rng, value, count):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def run(hashes=200_000, queries=1_000, radius=6, linear_queries=50, seed=42):
+    rng = random.Random(seed)
+    values = [rng.getrandbits(64) for _ in range(hashes)]
+    probes = [flip_bits(rng, rng.choice(values), rng.randint(0, radius)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    index = MultiIndexHash(radius)
+    for i, value in enumerate(values):
+        index.add(value, i)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = sum(1 for probe in probes if index.search(probe))
+    index_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for probe in probes[:linear_queries]:
+        [i for i, value in enumerate(values) if hamming(probe, value) <= radius]
+    linear_seconds = time.perf_counter() - start
+
+    return {
+        "stage": "image_hash_index",
+        "params": {"hashes": hashes, "queries": queries, "radius": radius},
+        "results": [
+            {"mode": "build multi-index", "seconds": round(build_seconds, 3)},
+            {"mode": "multi-index lookup", "ms_per_query": round(index_seconds / queries * 1000, 3),
+             "queries_matched": found},
+            {"mode": "linear scan", "ms_per_query": round(linear_seconds / linear_queries * 1000, 3)},
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hashes", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--radius", type=int, default=6)
+    args = parser.parse_args()
+    print(json.dumps(run(args.hashes, args.queries, args.radius), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_raw_loader.py
+"""Compare the pandas ``to_sql`` replace loader with the COPY + upsert loader.
+
+Each loader runs in a fresh process so its peak RSS is measured on its own.
+The COPY loader runs twice: the second run shows the cost of a day with no
+new raw files.
+
+Point POSTGRES_* at a scratch database: both loaders rewrite raw.telegram_messages.
+
+    python benchmarks/bench_raw_loader.py --rows 200000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from synthetic import write_raw_messages  # noqa: E402
+
+
+def _child(mode, root, chunk_size, queue):
+    import load_raw_to_postgres as loader
+
+    start = time.perf_counter()
+    if mode == "replace":
+        rows = loader.load_json_to_postgres(root, chunk_size)
+    else:
+        rows = loader.load_incremental(root, chunk_size)["rows_copied"]
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({"rows": rows, "seconds": elapsed, "peak_rss_mb": round(peak_kb / 1024, 1)})
+
+
+def _measure(label, mode, root, chunk_size):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(mode, root, chunk_size, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    result["mode"] = label
+    result["rows_per_sec"] = round(result["rows"] / result["seconds"], 1) if result["seconds"] else None
+    result["seconds"] = round(result["seconds"], 3)
+    return result
+
+
+def reset_tables():
+    import load_raw_to_postgres as loader
+
+    with loader.engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS raw.telegram_messages")
+        conn.exec_driver_sql("DROP TABLE IF EXISTS raw.ingested_files")
+
+
+def run(rows=200000, chunk_size=10000, compression="gzip", channels=4, days=30,
+        text_length=120, image_ratio=0.4):
+    with tempfile.TemporaryDirectory() as root:
+        write_raw_messages(root, rows, compression=compression, channels=channels, days=days,
+                           text_length=text_length, image_ratio=image_ratio)
+
+        reset_tables()
+        replace = _measure("replace (pandas to_sql)", "replace", root, chunk_size)
+
+        reset_tables()
+        copy_first = _measure("copy (first load)", "copy", root, chunk_size)
+        copy_rerun = _measure("copy (no new files)", "copy", root, chunk_size)
+
+    return {
+        "stage": "load_raw_to_postgres",
+        "params": {"rows": rows, "chunk_size": chunk_size, "compression": compression,
+                   "channels": channels, "days": days, "text_length": text_length,
+                   "image_ratio": image_ratio},
+        "results": [replace, copy_first, copy_rerun],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--compression", choices=["none", "gzip", "zstd"], default="gzip")
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.chunk_size, args.compression, args.channels, args.days), indent=2))
+
+
+if __name__ == "__main__":
+    main()
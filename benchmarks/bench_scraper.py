@@ -0,0 +1,139 @@
+# benchmarks/bench_scraper.py
+"""Compare the sequential scraper loop with the concurrent scrape mode.
+
+Both variants run against ``FakeTelegramClient`` inside a temporary working
+directory, so no Telegram credentials or network access are needed.
+
+    python benchmarks/bench_scraper.py --messages 200 --legacy-delay 0.05
+
+The defaults scale production timings down 20x on both sides (1.0s per-message
+sleep vs 10 requests/sec) so a run finishes in under a minute.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from telethon.errors import FloodWaitError  # noqa: E402
+
+import scraper  # noqa: E402
+from fake_telegram import FakeTelegramClient  # noqa: E402
+
+CHANNELS = {f"channel_{i}": f"https://t.me/fake_{i}" for i in range(4)}
+
+
+def legacy_save_json(channel_name, messages):
+    """The original writer: one pretty-printed JSON array per channel and day."""
+    path = os.path.join("data", "raw", "telegram_messages", "legacy")
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, f"{channel_name}.json"), "w", encoding="utf-8") as f:
+        json.dump(messages, f, ensure_ascii=False, indent=2)
+
+
+def raw_bytes(root=os.path.join("data", "raw", "telegram_messages")):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+
+
+async def legacy_scrape_channel(client, channel_name, channel_link, limit, delay):
+    """The pre-concurrency loop: fixed sleep and an inline download per message."""
+    messages_data = []
+    try:
+        async for message in client.iter_messages(channel_link, limit=limit):
+            await asyncio.sleep(delay)
+            image_path = await scraper.download_media(client, message, channel_name)
+            messages_data.append(scraper.build_record(message, channel_name, image_path))
+    except FloodWaitError as e:
+        await asyncio.sleep(e.seconds)
+    legacy_save_json(channel_name, messages_data)
+    return len(messages_data)
+
+
+async def run_legacy(client, limit, delay):
+    counts = {}
+    for name, link in CHANNELS.items():
+        counts[name] = await legacy_scrape_channel(client, name, link, limit, delay)
+    return counts
+
+
+def _timed(label, make_client, coro_factory):
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            client = make_client()
+            start = time.perf_counter()
+            counts = asyncio.run(coro_factory(client))
+            elapsed = time.perf_counter() - start
+            stored = raw_bytes()
+        finally:
+            os.chdir(cwd)
+    total = sum(counts.values())
+    return {
+        "mode": label,
+        "messages": total,
+        "wall_seconds": round(elapsed, 3),
+        "messages_per_sec": round(total / elapsed, 1) if elapsed else None,
+        "raw_bytes": stored,
+        "api_calls": client.api_calls,
+        "flood_waits": client.flood_waits,
+    }
+
+
+def run(messages=200, photo_ratio=0.5, page_latency=0.05, download_latency=0.02,
+        flood_every=0, flood_seconds=1, legacy_delay=0.05, concurrency=4,
+        download_workers=8, rate=200.0):
+    def make_client():
+        return FakeTelegramClient(messages, photo_ratio, page_latency, download_latency,
+                                  flood_every, flood_seconds)
+
+    legacy = _timed("sequential", make_client,
+                    lambda client: run_legacy(client, messages, legacy_delay))
+    concurrent = _timed("concurrent", make_client,
+                        lambda client: scraper.scrape_channels(
+                            client, CHANNELS, messages, concurrency=concurrency,
+                            download_workers=download_workers, rate=rate))
+    return {
+        "stage": "scraper",
+        "params": {
+            "channels": len(CHANNELS), "messages_per_channel": messages,
+            "photo_ratio": photo_ratio, "page_latency": page_latency,
+            "download_latency": download_latency, "flood_every": flood_every,
+            "legacy_delay": legacy_delay, "concurrency": concurrency,
+            "download_workers": download_workers, "rate": rate,
+        },
+        "results": [legacy, concurrent],
+        "speedup": round(legacy["wall_seconds"] / concurrent["wall_seconds"], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200, help="messages per channel")
+    parser.add_argument("--photo-ratio", type=float, default=0.5)
+    parser.add_argument("--page-latency", type=float, default=0.05)
+    parser.add_argument("--download-latency", type=float, default=0.02)
+    parser.add_argument("--flood-every", type=int, default=0,
+                        help="raise FloodWaitError on every Nth API page (0 disables)")
+    parser.add_argument("--flood-seconds", type=int, default=1)
+    parser.add_argument("--legacy-delay", type=float, default=0.05,
+                        help="per-message sleep of the sequential loop (production: 1.0)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=200.0,
+                        help="shared request budget of the concurrent mode (production: 10)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.messages, args.photo_ratio, args.page_latency,
+                         args.download_latency, args.flood_every, args.flood_seconds,
+                         args.legacy_delay, args.concurrency, args.download_workers,
+                         args.rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
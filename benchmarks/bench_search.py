@@ -0,0 +1,136 @@
+# benchmarks/bench_search.py
+"""Compare /api/search/messages query latency: legacy ILIKE vs the FTS index.
+
+Seeds raw.telegram_messages with N synthetic messages, builds the marts with
+``dbt run --full-refresh`` (which creates the tsvector and trigram indexes on
+fct_messages), then runs a mix of whole-word and substring queries with both
+SQL variants and reports p50/p99 latency. Keyset pages 2..N are timed
+separately, since deep OFFSET-style paging is where the old query hurt most.
+
+Uses the same scratch database as bench_dbt_incremental.py.
+
+    python benchmarks/bench_search.py --messages 1000000 --repeat 20
+"""
+
+import json
+import time
+import argparse
+import statistics
+
+from bench_dbt_incremental import raw_loader, copy_records, reset, dbt_run
+from synthetic import WORDS, synthetic_messages
+
+SCHEMA = "analytics"
+
+# The query api/main.py ran before the search index existed
+ILIKE_SQL = f"""
+    SELECT fm.message_id, dc.channel_name, dd.full_date::date, fm.message_text, fm.view_count
+    FROM {SCHEMA}.fct_messages fm
+    JOIN {SCHEMA}.dim_channels dc ON fm.channel_key = dc.channel_key
+    JOIN {SCHEMA}.dim_dates dd ON fm.date_key = dd.date_key
+    WHERE fm.message_text ILIKE %(pattern)s
+    ORDER BY fm.view_count DESC NULLS LAST
+    LIMIT %(limit)s
+"""
+
+# Mirrors search_messages in api/main.py
+SEARCH_SQL = f"""
+    WITH q AS (SELECT websearch_to_tsquery('simple', %(query)s) AS tsq)
+    SELECT hits.*, dc.channel_name, dd.full_date::date AS message_date
+    FROM (
+        SELECT fm.message_id, fm.channel_key, fm.date_key, fm.message_text, fm.view_count,
+               ts_rank_cd(fm.search_vector, q.tsq) AS rank
+        FROM {SCHEMA}.fct_messages fm CROSS JOIN q
+        WHERE (fm.search_vector @@ q.tsq OR fm.message_text ILIKE %(pattern)s)
+    ) hits
+    JOIN {SCHEMA}.dim_channels dc ON hits.channel_key = dc.channel_key
+    JOIN {SCHEMA}.dim_dates dd ON hits.date_key = dd.date_key
+    WHERE {{after}}
+    ORDER BY hits.rank DESC, hits.channel_key, hits.message_id
+    LIMIT %(limit)s
+"""
+AFTER_SQL = """(hits.rank < CAST(%(after_rank)s AS real)
+    OR (hits.rank = CAST(%(after_rank)s AS real)
+        AND (hits.channel_key, hits.message_id) > (%(after_channel)s, %(after_id)s)))"""
+
+
+def search_terms():
+    """Whole words (tsvector path) plus 5-character prefixes (trigram path)."""
+    words = [w for w in WORDS if len(w) >= 5]
+    return words + [w[:5] for w in words if len(w) > 5]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 2),
+        "queries": len(samples),
+    }
+
+
+def timed(cur, sql, params):
+    start = time.perf_counter()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    return time.perf_counter() - start, rows
+
+
+def run(messages=200_000, channels=4, days=365, limit=20, pages=3, repeat=10, seed=True,
+        text_length=120, image_ratio=0.4):
+    if seed:
+        reset()
+        copy_records(synthetic_messages(messages, channels=channels, days=days,
+                                        text_length=text_length, image_ratio=image_ratio))
+        dbt_run("--full-refresh")
+
+    legacy, first_page, next_pages = [], [], []
+    conn = raw_loader.engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        for _ in range(repeat):
+            for term in search_terms():
+                params = {"query": term, "pattern": f"%{term}%", "limit": limit + 1}
+                legacy.append(timed(cur, ILIKE_SQL, params)[0])
+
+                seconds, rows = timed(cur, SEARCH_SQL.format(after="TRUE"), params)
+                first_page.append(seconds)
+                for _ in range(pages - 1):
+                    if len(rows) <= limit:
+                        break
+                    last = rows[limit - 1]
+                    cursor_params = dict(params, after_rank=last[5], after_channel=last[1], after_id=last[0])
+                    seconds, rows = timed(cur, SEARCH_SQL.format(after=AFTER_SQL), cursor_params)
+                    next_pages.append(seconds)
+        conn.rollback()
+    finally:
+        conn.close()
+
+    return {
+        "stage": "api_search",
+        "params": {"messages": messages, "channels": channels, "days": days,
+                   "limit": limit, "pages": pages, "repeat": repeat},
+        "results": [
+            {"mode": "ILIKE + ORDER BY view_count", **percentiles(legacy)},
+            {"mode": "tsvector/trigram, first page", **percentiles(first_page)},
+            {"mode": "tsvector/trigram, keyset next page", **percentiles(next_pages or [0.0])},
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the marts from a previous run")
+    args = parser.parse_args()
+    print(json.dumps(run(args.messages, args.channels, args.days, args.limit,
+                         args.pages, args.repeat, not args.no_seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
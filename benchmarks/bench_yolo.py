@@ -0,0 +1,84 @@
+# benchmarks/bench_yolo.py
+"""CPU-only images/sec benchmark of the YOLO detection engine.
+
+Runs the original one-``model(path)``-per-image loop, then the batched engine
+at each requested batch size, over the same synthetic image set.
+
+    python benchmarks/bench_yolo.py --images 200 --batch-sizes 1 8 16
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import yolo_detect  # noqa: E402
+from synthetic import write_synthetic_images  # noqa: E402
+
+
+def serial_baseline(model, items, device):
+    start = time.perf_counter()
+    for _, _, path in items:
+        model(path, device=device, verbose=False)
+    return time.perf_counter() - start
+
+
+def run(images=200, batch_sizes=(1, 8, 16), workers=yolo_detect.DECODE_WORKERS,
+        model_name=yolo_detect.MODEL_NAME, device="cpu"):
+    model = yolo_detect.load_model(model_name)
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        write_synthetic_images(os.path.join(root, "images"), images)
+        items = list(yolo_detect.iter_images(os.path.join(root, "images")))
+        # Keep the box stores and the image index out of data/raw
+        scratch = {"detections_root": os.path.join(root, "detections"), "image_index_path": None}
+
+        # Warm up so the first variant doesn't pay for lazy initialisation
+        list(yolo_detect.detect_images(model, items[:2], 2, workers, device=device))
+
+        elapsed = serial_baseline(model, items, device)
+        results.append({"mode": "serial model(path)", "seconds": round(elapsed, 3),
+                        "images_per_sec": round(len(items) / elapsed, 2)})
+
+        for batch_size in batch_sizes:
+            stats = yolo_detect.run_detection(
+                os.path.join(root, "images"), os.path.join(root, f"out_{batch_size}.csv"),
+                model, batch_size, workers, device=device, cache_path=None, **scratch
+            )
+            results.append({"mode": f"engine batch={batch_size}", "seconds": stats["duration_s"],
+                             "images_per_sec": stats["images_per_sec"]})
+
+        # Same images twice through the content-hash cache: cold, then warm
+        cache_path = os.path.join(root, "cache.sqlite")
+        for label in ("cold cache", "warm cache"):
+            stats = yolo_detect.run_detection(
+                os.path.join(root, "images"), os.path.join(root, "out_cache.csv"),
+                model, max(batch_sizes), workers, device=device, cache_path=cache_path, **scratch
+            )
+            results.append({"mode": f"engine {label}", "seconds": stats["duration_s"],
+                            "images_per_sec": stats["images_per_sec"],
+                            "cache_hits": stats["cache_hits"], "cache_misses": stats["cache_misses"]})
+
+    return {
+        "stage": "yolo_detect",
+        "params": {"images": images, "workers": workers, "model": model_name, "device": device},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 16])
+    parser.add_argument("--workers", type=int, default=yolo_detect.DECODE_WORKERS)
+    parser.add_argument("--model", default=yolo_detect.MODEL_NAME)
+    args = parser.parse_args()
+    print(json.dumps(run(args.images, args.batch_sizes, args.workers, args.model), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/bench_yolo_loader.py
+"""Compare the old one-INSERT-per-row YOLO loader with the COPY + merge loader.
+
+The row-by-row loader is timed on ``--legacy-rows`` rows (it would take far
+too long on the full file) and its rate is extrapolated; the COPY loader
+loads the full file twice to show the second run is an idempotent no-op.
+
+Point POSTGRES_HOST / POSTGRES_DB / POSTGRES_USER / POSTGRES_PASSWORD at a
+scratch database: the benchmark drops and recreates raw.yolo_detections, and
+refuses to run without ``--yes-drop``.
+
+    POSTGRES_DB=scratch python benchmarks/bench_yolo_loader.py --rows 1000000 --yes-drop
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import pandas as pd  # noqa: E402
+import psycopg2  # noqa: E402
+
+import load_yolo_results as loader  # noqa: E402
+from synthetic import write_detections_csv  # noqa: E402
+
+
+def legacy_load(conn, csv_path, rows):
+    """The original loader: iterrows() and one INSERT per row."""
+    cur = conn.cursor()
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS raw.yolo_detections (
+        message_id TEXT,
+        channel_name TEXT,
+        image_category TEXT,
+        confidence_score FLOAT
+    );
+    """)
+    df = pd.read_csv(csv_path, nrows=rows)
+    for _, row in df.iterrows():
+        cur.execute("""
+            INSERT INTO raw.yolo_detections
+            VALUES (%s, %s, %s, %s)
+        """, tuple(row))
+    conn.commit()
+    cur.close()
+    return len(df)
+
+
+def reset(conn):
+    with conn.cursor() as cur:
+        cur.execute("CREATE SCHEMA IF NOT EXISTS raw")
+        cur.execute("DROP TABLE IF EXISTS raw.yolo_detections")
+    conn.commit()
+
+
+def count_rows(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM raw.yolo_detections")
+        return cur.fetchone()[0]
+
+
+def run(rows=1_000_000, legacy_rows=20_000, chunk_size=loader.CHUNK_SIZE, yes_drop=False):
+    if not yes_drop:
+        raise RuntimeError(
+            f"refusing to drop raw.yolo_detections in {loader.DB_CONFIG['dbname']} on "
+            f"{loader.DB_CONFIG['host']}: point POSTGRES_DB at a scratch database and pass --yes-drop"
+        )
+    conn = psycopg2.connect(**loader.DB_CONFIG)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = write_detections_csv(os.path.join(tmp, "yolo_detections.csv"), rows)
+
+        reset(conn)
+        start = time.perf_counter()
+        loaded = legacy_load(conn, csv_path, legacy_rows)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "mode": "row-by-row INSERT",
+            "rows": loaded,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(loaded / elapsed, 1),
+            "extrapolated_seconds_full_file": round(rows * elapsed / loaded, 1),
+        })
+
+        reset(conn)
+        for label in ("COPY + merge (first load)", "COPY + merge (re-run)"):
+            stats = loader.load_yolo_results(csv_path, chunk_size, conn=conn)
+            results.append({
+                "mode": label,
+                "rows": stats["rows_copied"],
+                "rows_changed": stats["rows_upserted"],
+                "table_rows": count_rows(conn),
+                "seconds": stats["duration_s"],
+                "rows_per_sec": round(stats["rows_copied"] / stats["duration_s"], 1),
+            })
+    conn.close()
+    return {
+        "stage": "load_yolo_results",
+        "params": {"rows": rows, "legacy_rows": legacy_rows, "chunk_size": chunk_size},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=20_000)
+    parser.add_argument("--chunk-size", type=int, default=loader.CHUNK_SIZE)
+    parser.add_argument("--yes-drop", action="store_true",
+                        help="confirm the target database is a scratch one (raw.yolo_detections is dropped)")
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.legacy_rows, args.chunk_size, args.yes_drop), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/fake_telegram.py
+"""In-memory stand-in for ``telethon.TelegramClient`` used by the benchmarks.
+
+It serves synthetic messages in pages of 100 (like Telethon does), sleeps to
+simulate network latency and raises ``FloodWaitError`` at a fixed cadence.
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from telethon.errors import FloodWaitError
+
+PAGE_SIZE = 100
+
+
+class FakeTelegramClient:
+    def __init__(self, messages_per_channel=300, photo_ratio=0.5, page_latency=0.05,
+                 download_latency=0.02, flood_every=0, flood_seconds=1, seed=42):
+        self.messages_per_channel = messages_per_channel
+        self.photo_ratio = photo_ratio
+        self.page_latency = page_latency
+        self.download_latency = download_latency
+        self.flood_every = flood_every
+        self.flood_seconds = flood_seconds
+        self.seed = seed
+        self.api_calls = 0
+        self.flood_waits = 0
+        self._served = {}
+        self._messages = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def _channel_messages(self, entity):
+        if entity not in self._messages:
+            rng = random.Random(f"{self.seed}-{entity}")
+            start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+            self._messages[entity] = [
+                SimpleNamespace(
+                    id=i,
+                    date=start + timedelta(minutes=7 * i),
+                    message=f"message {i} from {entity} paracetamol 500mg {rng.randint(50, 900)} birr",
+                    media=True if rng.random() < self.photo_ratio else None,
+                    views=rng.randint(0, 5000),
+                    forwards=rng.randint(0, 50),
+                )
+                for i in range(1, self.messages_per_channel + 1)
+            ]
+            for m in self._messages[entity]:
+                m.photo = m.media
+        return self._messages[entity]
+
+    async def _call(self, entity):
+        self.api_calls += 1
+        served = self._served.get(entity, 0) + 1
+        self._served[entity] = served
+        if self.flood_every and served % self.flood_every == 0:
+            self.flood_waits += 1
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+
+    async def iter_messages(self, entity, limit=None, offset_id=0, min_id=0, max_id=0,
+                            reverse=False, offset_date=None):
+        messages = self._channel_messages(entity)
+        if reverse:
+            selected = [m for m in messages if m.id > max(min_id, offset_id)]
+        else:
+            selected = [m for m in reversed(messages)
+                        if (not offset_id or m.id < offset_id) and m.id > min_id]
+        if max_id:
+            selected = [m for m in selected if m.id < max_id]
+        if offset_date is not None:
+            if reverse:
+                selected = [m for m in selected if m.date >= offset_date]
+            else:
+                selected = [m for m in selected if m.date < offset_date]
+        if limit is not None:
+            selected = selected[:limit]
+
+        for start in range(0, len(selected), PAGE_SIZE):
+            await self._call(entity)
+            await asyncio.sleep(self.page_latency)
+            for message in selected[start:start + PAGE_SIZE]:
+                yield message
+
+    async def get_messages(self, entity, limit=1, **kwargs):
+        return [m async for m in self.iter_messages(entity, limit=limit, **kwargs)]
+
+    async def download_media(self, message, file_path):
+        self.api_calls += 1
+        await asyncio.sleep(self.download_latency)
+        with open(file_path, "wb") as f:
+            f.write(b"\xff\xd8\xff" + bytes(1024) + b"\xff\xd9")
+        return file_path
@@ -0,0 +1,264 @@
+# benchmarks/run_all.py
+"""Run every stage benchmark at one data scale and write the results as JSON.
+
+Stages, in pipeline order: scraper (fake Telegram client), raw loader
+(``load_json_to_postgres`` vs the COPY loader), dbt run, search, API
+endpoints, YOLO detection, ``load_yolo_results`` and the image-hash index.
+Every stage sizes its synthetic data from ``--scale`` (1k .. 10m messages),
+so one command reproduces a run on any machine.
+
+The output file records the git commit, host and parameters next to each
+stage's timings. Pass ``--baseline`` with an earlier result file to flag
+timings that got slower (or throughputs that dropped) by more than
+``--tolerance``; the exit status is 1 when anything regressed.
+
+Database stages need POSTGRES_* and DATABASE_URL pointing at a scratch
+database: they drop and rebuild the raw tables. The yolo_loader stage only
+runs with ``--yes-drop``.
+
+    python benchmarks/run_all.py --scale 100k --yes-drop
+    python benchmarks/run_all.py --scale 1m --stages raw_loader dbt api --baseline benchmarks/results/v1.json
+    python benchmarks/run_all.py --diff benchmarks/results/old.json benchmarks/results/new.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import importlib
+import subprocess
+import traceback
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from instrumentation import metrics  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+SCALES = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+# stage name -> benchmark module (each exposes run(**params) -> dict)
+STAGES = {
+    "scraper": "bench_scraper",
+    "raw_loader": "bench_raw_loader",
+    "dbt": "bench_dbt_incremental",
+    "search": "bench_search",
+    "api": "bench_api",
+    "yolo": "bench_yolo",
+    "yolo_loader": "bench_yolo_loader",
+    "image_hash": "bench_image_hash",
+}
+
+# Stages that reuse the warehouse built by the dbt stage instead of seeding their own
+REUSES_WAREHOUSE = ("search", "api")
+
+# Scraping and inference are latency- or CPU-bound per item, not volume-bound,
+# so their inputs are capped rather than grown with the scale
+SCRAPER_MAX_PER_CHANNEL = 500
+YOLO_MAX_IMAGES = 500
+IMAGE_HASH_MAX = 2_000_000
+
+
+def stage_params(stage, messages, channels, days, text_length, image_ratio):
+    images = int(messages * image_ratio)
+    shape = {"text_length": text_length, "image_ratio": image_ratio}
+    if stage == "scraper":
+        return {"messages": min(max(messages // 4, 1), SCRAPER_MAX_PER_CHANNEL), "photo_ratio": image_ratio}
+    if stage == "raw_loader":
+        return {"rows": messages, "channels": channels, "days": days, **shape}
+    if stage == "dbt":
+        return {"messages": messages, "delta": max(100, messages // 100), "channels": channels, "days": days, **shape}
+    if stage == "search":
+        return {"messages": messages, "channels": channels, "days": days, "repeat": 5, **shape}
+    if stage == "api":
+        return {"messages": messages, "channels": channels, "days": days, "repeat": 5,
+                "export_limit": min(messages, 1_000_000), **shape}
+    if stage == "yolo":
+        return {"images": min(max(images // 100, 20), YOLO_MAX_IMAGES), "batch_sizes": (8, 16)}
+    if stage == "yolo_loader":
+        return {"rows": max(images, 1), "legacy_rows": min(max(images, 1), 20_000)}
+    if stage == "image_hash":
+        return {"hashes": min(max(images, 1_000), IMAGE_HASH_MAX)}
+    raise ValueError(f"Unknown stage {stage}")
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+        except OSError:
+            return ""
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain"))}
+
+
+def host_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_stage(stage, params):
+    """Run one benchmark; a failing stage is recorded, not fatal, so the others still report."""
+    module = importlib.import_module(STAGES[stage])
+    scope = metrics.scope()
+    start = time.perf_counter()
+    try:
+        result = module.run(**params)
+    except Exception as e:
+        return {"stage": stage, "params": params, "error": f"{type(e).__name__}: {e}",
+                "traceback": traceback.format_exc(), "wall_seconds": round(time.perf_counter() - start, 3)}
+    result["stage"] = stage  # the suite's name, so results compare across runs
+    result["wall_seconds"] = round(time.perf_counter() - start, 3)
+    result["instrumentation"] = scope.metadata()
+    return result
+
+
+def run_suite(scale="10k", stages=tuple(STAGES), channels=4, days=365, text_length=120, image_ratio=0.4,
+              yes_drop=False):
+    messages = SCALES[scale]
+    started = datetime.now(timezone.utc)
+    results = []
+    warehouse_ready = False
+    for stage in stages:
+        params = stage_params(stage, messages, channels, days, text_length, image_ratio)
+        if stage in REUSES_WAREHOUSE and warehouse_ready:
+            params["seed"] = False
+        if stage == "yolo_loader":
+            params["yes_drop"] = yes_drop
+        print(f"[{stage}] {params}", file=sys.stderr)
+        result = run_stage(stage, params)
+        if stage == "dbt" or stage in REUSES_WAREHOUSE:
+            warehouse_ready = "error" not in result
+        print(f"[{stage}] {'failed: ' + result['error'] if 'error' in result else 'done'} "
+              f"in {result['wall_seconds']}s", file=sys.stderr)
+        results.append(result)
+    return {
+        "suite": "medical-telegram-warehouse",
+        "started_at": started.isoformat(),
+        "scale": {"name": scale, "messages": messages, "channels": channels, "days": days,
+                  "text_length": text_length, "image_ratio": image_ratio},
+        "git": git_info(),
+        "host": host_info(),
+        "stages": results,
+        "total_seconds": round((datetime.now(timezone.utc) - started).total_seconds(), 3),
+    }
+
+
+# -----------------------------
+# Regression check
+# -----------------------------
+def direction(metric):
+    """+1 when bigger is better, -1 when smaller is better, 0 for counts and sizes."""
+    if "per_sec" in metric or metric == "speedup":
+        return 1
+    if "seconds" in metric or "rss" in metric or metric.endswith("_ms") or metric.startswith("ms_") or metric.endswith("_s"):
+        return -1
+    return 0
+
+
+def flatten(report):
+    """``{(stage, mode, metric): value}`` for every comparable number in a result file."""
+    values = {}
+    for stage in report.get("stages", []):
+        for result in stage.get("results", []):
+            for metric, value in result.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and direction(metric):
+                    values[(stage["stage"], result.get("mode", ""), metric)] = value
+    return values
+
+
+def compare(baseline, current, tolerance=0.2):
+    """Rows where ``current`` is worse than ``baseline`` by more than ``tolerance`` (a fraction)."""
+    before, after = flatten(baseline), flatten(current)
+    regressions = []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        if not old:
+            continue
+        change = (new - old) / old
+        if -direction(key[2]) * change > tolerance:
+            stage, mode, metric = key
+            regressions.append({"stage": stage, "mode": mode, "metric": metric,
+                                "baseline": old, "current": new, "change_pct": round(change * 100, 1)})
+    if baseline.get("scale", {}).get("messages") != current.get("scale", {}).get("messages"):
+        print("warning: baseline was recorded at a different scale", file=sys.stderr)
+    return regressions
+
+
+def print_regressions(regressions, tolerance):
+    if not regressions:
+        print(f"No regressions beyond {tolerance:.0%}.", file=sys.stderr)
+        return
+    print(f"{len(regressions)} regression(s) beyond {tolerance:.0%}:", file=sys.stderr)
+    for r in regressions:
+        print(f"  {r['stage']} / {r['mode']} / {r['metric']}: {r['baseline']} -> {r['current']} "
+              f"({r['change_pct']:+}%)", file=sys.stderr)
+
+
+def default_output(report):
+    stamp = report["started_at"][:19].replace(":", "").replace("-", "")
+    commit = (report["git"]["commit"] or "nogit")[:8]
+    return os.path.join(RESULTS_DIR, f"{report['scale']['name']}-{stamp}-{commit}.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=list(SCALES), default="10k")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--text-length", type=int, default=120, help="average message length in characters")
+    parser.add_argument("--image-ratio", type=float, default=0.4, help="share of messages with a photo")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<scale>-<time>-<commit>.json)")
+    parser.add_argument("--baseline", help="earlier result file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown as a fraction (0.2 = 20%%)")
+    parser.add_argument("--yes-drop", action="store_true",
+                        help="confirm POSTGRES_* points at a scratch database (needed by yolo_loader)")
+    parser.add_argument("--diff", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="only compare two result files")
+    args = parser.parse_args()
+
+    if args.diff:
+        with open(args.diff[0], encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.diff[1], encoding="utf-8") as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.tolerance)
+        print_regressions(regressions, args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+    report = run_suite(args.scale, args.stages, args.channels, args.days, args.text_length, args.image_ratio,
+                       args.yes_drop)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(json.load(f), report, args.tolerance)
+        print_regressions(report["regressions"], args.tolerance)
+
+    output = args.output or default_output(report)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(output)
+
+    failed = [s["stage"] for s in report["stages"] if "error" in s]
+    if failed:
+        print(f"Failed stages: {', '.join(failed)}", file=sys.stderr)
+    sys.exit(1 if failed or report.get("regressions") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/synthetic.py
+"""Synthetic data generators shared by the benchmarks."""
+
+import os
+import sys
+import random
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from raw_store import RawMessageWriter  # noqa: E402
+
+WORDS = [
+    "paracetamol", "amoxicillin", "vitamin", "cream", "lotion", "serum", "syrup",
+    "tablet", "capsule", "price", "birr", "available", "delivery", "pharmacy",
+    "ibuprofen", "omeprazole", "sunscreen", "shampoo", "mask", "gloves",
+    "መድሃኒት", "ዋጋ", "ብር", "አዲስ", "አበባ", "ይደውሉ", "ቅናሽ",
+]
+
+
+def synthetic_text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        if rng.random() < 0.1:
+            word = f"{rng.randint(50, 5000)}"
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def synthetic_messages(count, channels=4, days=30, text_length=120, image_ratio=0.4,
+                       start=datetime(2024, 1, 1, tzinfo=timezone.utc), seed=42):
+    """Yield ``count`` raw message records spread over ``channels`` and ``days``."""
+    rng = random.Random(seed)
+    per_channel = max(1, count // channels)
+    span = days * 86400
+    for c in range(channels):
+        channel_name = f"channel_{c}"
+        for i in range(per_channel):
+            message_id = i + 1
+            has_media = rng.random() < image_ratio
+            yield {
+                "message_id": message_id,
+                "channel_name": channel_name,
+                "message_date": (start + timedelta(seconds=span * i // per_channel)).isoformat(),
+                "message_text": synthetic_text(rng, rng.randint(text_length // 2, text_length * 2)),
+                "has_media": has_media,
+                "image_path": f"data/raw/images/{channel_name}/{message_id}.jpg" if has_media else None,
+                "views": rng.randint(0, 20000),
+                "forwards": rng.randint(0, 200),
+            }
+
+
+def write_raw_messages(root, count, compression="gzip", flush_every=1000, **kwargs):
+    """Write synthetic messages to ``root`` in the scraper's raw layout."""
+    writers = {}
+    written = 0
+    for record in synthetic_messages(count, **kwargs):
+        day = record["message_date"][:10]
+        key = (record["channel_name"], day)
+        if key not in writers:
+            writers[key] = RawMessageWriter(record["channel_name"], day, compression, root)
+        writer = writers[key]
+        writer.write(record)
+        if len(writer._buffer) >= flush_every:
+            writer.flush()
+        written += 1
+    for writer in writers.values():
+        writer.flush()
+    return written
+
+
+def write_synthetic_images(root, count, channels=4, width=1280, height=960, seed=42):
+    """Write ``count`` JPEGs under ``root/<channel>/<message_id>.jpg``.
+
+    Images are noise plus a few filled shapes, enough to exercise decoding,
+    resizing and inference at realistic sizes.
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        channel_dir = os.path.join(root, f"channel_{i % channels}")
+        os.makedirs(channel_dir, exist_ok=True)
+        image = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        for _ in range(3):
+            x, y = int(rng.integers(0, width - 200)), int(rng.integers(0, height - 200))
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.rectangle(image, (x, y), (x + 200, y + 300), color, -1)
+        path = os.path.join(channel_dir, f"{i // channels + 1}.jpg")
+        cv2.imwrite(path, image)
+        paths.append(path)
+    return paths
+
+
+def write_detections_csv(path, rows, channels=4, seed=42):
+    """Write a yolo_detections.csv-shaped file with ``rows`` synthetic detections."""
+    import csv
+
+    rng = random.Random(seed)
+    categories = ["promotional", "product_display", "lifestyle", "other"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["message_id", "channel_name", "image_category", "confidence_score"])
+        for i in range(rows):
+            writer.writerow([i // channels + 1, f"channel_{i % channels}",
+                             rng.choice(categories), round(rng.random(), 6)])
+    return path
@@ -0,0 +1,13 @@
+{#
+    Deterministic surrogate keys, computed from the natural key so the same
+    channel or day always gets the same key on every run and in every model.
+#}
+
+{% macro channel_key(channel_name) -%}
+    {#- first 60 bits of md5(channel_name): a positive bigint #}
+    ('x' || substr(md5({{ channel_name }}), 1, 15))::bit(60)::bigint
+{%- endmacro %}
+
+{% macro date_key(ts) -%}
+    to_char({{ ts }}, 'YYYYMMDD')::int
+{%- endmacro %}
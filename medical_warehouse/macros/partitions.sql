@@ -0,0 +1,91 @@
+{#
+    Physical layout for the large fact tables, applied as post-hooks.
+
+    partition_by_month: range-partitions the model by month of a YYYYMMDD
+    date key (fct_x_p202401 holds 20240101 <= date_key < 20240201), the same
+    layout src/partitions.py gives raw.telegram_messages. The first time
+    the hook runs, the plain table dbt built is rebuilt as a partitioned one.
+    Later runs insert into the partitioned parent. Rows for a month with no
+    partition yet land in fct_x_default; the hook then moves them into a new
+    monthly partition.
+    Old months can be detached and archived with `python src/partitions.py archive`.
+
+    ensure_indexes: `create index if not exists` for each entry (same shape as
+    dbt's `indexes` config). Unlike that config, it also applies to tables
+    that already exist, including partitioned ones, where each index
+    cascades to every partition.
+#}
+
+{% macro partition_by_month(date_key='date_key') -%}
+    {%- if not execute -%}
+        {{ return('') }}
+    {%- endif -%}
+
+    {%- set default_partition = this.identifier ~ '_default' -%}
+    {%- set kind_query -%}
+        select c.relkind
+        from pg_class c
+        join pg_namespace n on n.oid = c.relnamespace
+        where n.nspname = '{{ this.schema }}' and c.relname = '{{ this.identifier }}'
+    {%- endset -%}
+    {%- set kinds = run_query(kind_query).columns[0].values() -%}
+    {%- set converting = kinds | length > 0 and kinds[0] == 'r' -%}
+
+    {%- if converting -%}
+        {%- set source = this -%}
+    {%- else -%}
+        {%- set source = this.schema ~ '.' ~ default_partition -%}
+    {%- endif -%}
+    {%- set months_query -%}
+        select distinct {{ date_key }} / 100 as month
+        from {{ source }}
+        where {{ date_key }} is not null
+          and not exists (
+              select 1
+              from pg_inherits i
+              join pg_class c on c.oid = i.inhrelid
+              where i.inhparent = to_regclass('{{ this }}')
+                and c.relname = '{{ this.identifier }}_p' || ({{ date_key }} / 100)::text
+          )
+        order by 1
+    {%- endset -%}
+    {%- set months = run_query(months_query).columns[0].values() -%}
+
+    {%- if converting %}
+    alter table {{ this }} rename to {{ this.identifier }}__unpartitioned;
+    create table {{ this }} (like {{ this.schema }}.{{ this.identifier }}__unpartitioned including defaults)
+        partition by range ({{ date_key }});
+    create table {{ this.schema }}.{{ default_partition }} partition of {{ this }} default;
+    {%- endif %}
+
+    {%- for month in months %}
+        {%- set month = month | int -%}
+        {%- set low = month * 100 + 1 -%}
+        {%- set high = (month + 89) * 100 + 1 if month % 100 == 12 else (month + 1) * 100 + 1 -%}
+        {%- set partition = this.schema ~ '.' ~ this.identifier ~ '_p' ~ month %}
+    create table {{ partition }} (like {{ this }} including defaults);
+        {%- if not converting %}
+    with moved as (
+        delete from {{ this.schema }}.{{ default_partition }}
+        where {{ date_key }} >= {{ low }} and {{ date_key }} < {{ high }}
+        returning *
+    )
+    insert into {{ partition }} select * from moved;
+        {%- endif %}
+    alter table {{ this }} attach partition {{ partition }} for values from ({{ low }}) to ({{ high }});
+    {%- endfor %}
+
+    {%- if converting %}
+    insert into {{ this }} select * from {{ this.schema }}.{{ this.identifier }}__unpartitioned;
+    drop table {{ this.schema }}.{{ this.identifier }}__unpartitioned;
+    {%- endif %}
+{%- endmacro %}
+
+
+{% macro ensure_indexes(indexes) -%}
+    {%- for index in indexes %}
+    create {% if index.get('unique') %}unique {% endif -%}
+    index if not exists {{ this.identifier }}_{{ index['columns'] | join('_') }}_idx
+        on {{ this }} using {{ index.get('type', 'btree') }} ({{ index['columns'] | join(', ') }});
+    {%- endfor %}
+{%- endmacro %}
@@ -0,0 +1,26 @@
+{#
+    Pre-hook of fct_product_mentions. delete+insert only replaces messages
+    that still have a mention, so a mention the extractor deleted (an edit
+    removed it, or every mention of the message) would stay in the mart.
+    For every message reloaded since the model's watermark, drop the mart
+    rows that raw.product_mentions no longer has.
+#}
+{% macro drop_removed_mentions() -%}
+    {% if is_incremental() %}
+    delete from {{ this }} t
+    using raw.telegram_messages r
+    where r.loaded_at > (
+            select coalesce(max(loaded_at), '1900-01-01'::timestamptz)
+                - interval '{{ var("watermark_lookback", "1 hour") }}'
+            from {{ this }}
+        )
+      and t.channel_key = {{ channel_key('r.channel_name') }}
+      and t.message_id = r.message_id
+      and not exists (
+          select 1 from raw.product_mentions p
+          where p.channel_name = r.channel_name
+            and p.message_id = r.message_id
+            and p.mention_index = t.mention_index
+      )
+    {% endif %}
+{%- endmacro %}
@@ -0,0 +1,29 @@
+{#
+    Term tokenisation shared by the term-frequency marts.
+
+    Text is lower-cased and split on whitespace, ASCII punctuation and the
+    Ethiopic punctuation block (U+1361-U+1368: word space, full stop, comma...).
+    Latin terms need 3+ characters, Ethiopic ones 2+ (each fidel is a syllable),
+    and pure numbers are dropped.
+#}
+
+{% macro split_terms(text) -%}
+    regexp_split_to_table(lower({{ text }}), '[[:space:][:punct:]፡-፨«»“”‘’]+')
+{%- endmacro %}
+
+{% macro is_term(term) -%}
+    (
+        (length({{ term }}) > 2 or (length({{ term }}) = 2 and {{ term }} ~ '^[ሀ-፼]+$'))
+        and {{ term }} !~ '^[0-9.,]+$'
+    )
+{%- endmacro %}
+
+{#
+    Full-text document for message search. The 'simple' configuration only
+    lower-cases, so Amharic text and drug names are indexed verbatim instead
+    of being run through an English stemmer. api/main.py builds its tsquery
+    with the same configuration.
+#}
+{% macro search_document(text) -%}
+    to_tsvector('simple', coalesce({{ text }}, ''))
+{%- endmacro %}
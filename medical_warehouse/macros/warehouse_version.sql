@@ -0,0 +1,18 @@
+{#
+    Build marker read by the API response cache (api/cache.py).
+
+    Runs as an on-run-end hook: every dbt invocation that touched a model
+    replaces the single row with its invocation id, so API caches drop
+    results computed against the previous build.
+#}
+
+{% macro mark_warehouse_version(results) %}
+    {% if execute and results | selectattr('node.resource_type', 'equalto', 'model') | list %}
+        create table if not exists {{ target.schema }}.warehouse_version (
+            build_id text not null,
+            built_at timestamptz not null default now()
+        );
+        delete from {{ target.schema }}.warehouse_version;
+        insert into {{ target.schema }}.warehouse_version (build_id) values ('{{ invocation_id }}');
+    {% endif %}
+{% endmacro %}
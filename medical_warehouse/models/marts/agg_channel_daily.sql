@@ -0,0 +1,59 @@
+-- SQLBook: Code
+{{
+    config(
+        materialized='incremental',
+        unique_key=['channel_key', 'date_key'],
+        incremental_strategy='delete+insert',
+        indexes=[
+            {'columns': ['channel_key', 'date_key'], 'unique': True},
+            {'columns': ['date_key']}
+        ]
+    )
+}}
+
+-- Posting activity per channel and day. The activity endpoint rolls these
+-- rows up to weeks or months, so its cost depends on the number of days
+-- requested, not on the number of messages. Incremental runs recompute only
+-- the (channel, day) partitions that received new or updated messages.
+with
+
+{% if is_incremental() %}
+touched as (
+
+    select distinct channel_key, date_key
+    from {{ ref('fct_messages') }}
+    where loaded_at > (
+        select coalesce(max(source_loaded_at), '1900-01-01'::timestamptz)
+            - interval '{{ var("watermark_lookback", "1 hour") }}'
+        from {{ this }}
+    )
+
+),
+{% endif %}
+
+messages as (
+
+    select fm.*
+    from {{ ref('fct_messages') }} fm
+    {% if is_incremental() %}
+    join touched t
+      on fm.channel_key = t.channel_key
+     and fm.date_key = t.date_key
+    {% endif %}
+
+)
+
+select
+    m.channel_key,
+    m.date_key,
+    d.full_date,
+    count(*) as post_count,
+    count(m.view_count) as viewed_post_count,
+    coalesce(sum(m.view_count), 0)::bigint as total_views,
+    coalesce(sum(m.forward_count), 0)::bigint as total_forwards,
+    sum(case when m.has_image = 1 then 1 else 0 end) as image_post_count,
+    max(m.loaded_at) as source_loaded_at
+from messages m
+join {{ ref('dim_dates') }} d
+  on m.date_key = d.date_key
+group by m.channel_key, m.date_key, d.full_date
@@ -0,0 +1,65 @@
+-- SQLBook: Code
+{{
+    config(
+        materialized='incremental',
+        unique_key=['channel_key', 'date_key'],
+        incremental_strategy='delete+insert',
+        indexes=[
+            {'columns': ['channel_key', 'date_key', 'term'], 'unique': True},
+            {'columns': ['date_key']}
+        ]
+    )
+}}
+
+-- Term counts per channel and day. Incremental runs recount only the
+-- (channel, day) partitions that received new or updated messages.
+with
+
+{% if is_incremental() %}
+touched as (
+
+    select distinct channel_key, date_key
+    from {{ ref('fct_messages') }}
+    where loaded_at > (
+        select coalesce(max(source_loaded_at), '1900-01-01'::timestamptz)
+            - interval '{{ var("watermark_lookback", "1 hour") }}'
+        from {{ this }}
+    )
+
+),
+{% endif %}
+
+messages as (
+
+    select fm.channel_key, fm.date_key, fm.message_text, fm.loaded_at
+    from {{ ref('fct_messages') }} fm
+    {% if is_incremental() %}
+    join touched t
+      on fm.channel_key = t.channel_key
+     and fm.date_key = t.date_key
+    {% endif %}
+    where fm.message_text is not null and fm.message_text != ''
+
+),
+
+tokens as (
+
+    select
+        channel_key,
+        date_key,
+        loaded_at,
+        {{ split_terms('message_text') }} as term
+    from messages
+
+)
+
+select
+    channel_key,
+    date_key,
+    term,
+    count(*) as term_count,
+    max(loaded_at) as source_loaded_at
+from tokens
+where {{ is_term('term') }}
+  and term not in (select term from {{ ref('stopwords') }})
+group by channel_key, date_key, term
@@ -0,0 +1,16 @@
+-- SQLBook: Code
+{{
+    config(
+        indexes=[
+            {'columns': ['term'], 'unique': True},
+            {'columns': ['term_count desc', 'term']}
+        ]
+    )
+}}
+
+-- All-time term counts: the unfiltered top-products query is an index scan
+select
+    term,
+    sum(term_count)::bigint as term_count
+from {{ ref('agg_term_daily') }}
+group by term
@@ -0,0 +1,94 @@
+-- SQLBook: Code
+{{
+    config(
+        materialized='incremental',
+        unique_key=['channel_key', 'date_key'],
+        incremental_strategy='delete+insert',
+        indexes=[
+            {'columns': ['channel_key', 'date_key', 'image_category'], 'unique': True},
+            {'columns': ['date_key']}
+        ]
+    )
+}}
+
+-- Visual content per channel, day and image category. Every message falls in
+-- exactly one bucket: its YOLO category, 'not_detected' (has an image but no
+-- detection yet) or 'no_image', so summing a day's rows gives its message
+-- totals. Confidence and views are stored as sums and counts so any date
+-- range can be averaged exactly. The unique_key is the (channel, day) pair:
+-- a touched day is replaced as a whole, which also drops categories an image
+-- was re-scored out of.
+with
+
+{% if is_incremental() %}
+touched as (
+
+    select channel_key, date_key
+    from {{ ref('fct_messages') }}
+    where loaded_at > (
+        select coalesce(max(source_loaded_at), '1900-01-01'::timestamptz)
+            - interval '{{ var("watermark_lookback", "1 hour") }}'
+        from {{ this }}
+    )
+
+    union
+
+    select channel_key, date_key
+    from {{ ref('fct_image_detections') }}
+    where loaded_at > (
+        select coalesce(max(source_loaded_at), '1900-01-01'::timestamptz)
+            - interval '{{ var("watermark_lookback", "1 hour") }}'
+        from {{ this }}
+    )
+
+),
+{% endif %}
+
+messages as (
+
+    select fm.channel_key, fm.date_key, fm.message_id, fm.has_image, fm.view_count, fm.loaded_at
+    from {{ ref('fct_messages') }} fm
+    {% if is_incremental() %}
+    join touched t
+      on fm.channel_key = t.channel_key
+     and fm.date_key = t.date_key
+    {% endif %}
+
+),
+
+detections as (
+
+    select fid.channel_key, fid.date_key, fid.message_id, fid.image_category, fid.confidence_score, fid.loaded_at
+    from {{ ref('fct_image_detections') }} fid
+    {% if is_incremental() %}
+    join touched t
+      on fid.channel_key = t.channel_key
+     and fid.date_key = t.date_key
+    {% endif %}
+
+)
+
+select
+    m.channel_key,
+    m.date_key,
+    d.full_date,
+    case
+        when det.image_category is not null then det.image_category
+        when m.has_image = 1 then 'not_detected'
+        else 'no_image'
+    end as image_category,
+    count(*) as message_count,
+    sum(case when m.has_image = 1 then 1 else 0 end) as image_message_count,
+    count(det.message_id) as detection_count,
+    coalesce(sum(det.confidence_score), 0) as confidence_sum,
+    count(m.view_count) as viewed_message_count,
+    coalesce(sum(m.view_count), 0)::bigint as total_views,
+    greatest(max(m.loaded_at), max(det.loaded_at)) as source_loaded_at
+from messages m
+left join detections det
+  on m.channel_key = det.channel_key
+ and m.message_id = det.message_id
+ and m.date_key = det.date_key
+join {{ ref('dim_dates') }} d
+  on m.date_key = d.date_key
+group by 1, 2, 3, 4
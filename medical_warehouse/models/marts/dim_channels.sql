@@ -1,10 +1,22 @@
 -- SQLBook: Code
+{{
+    config(
+        indexes=[
+            {'columns': ['channel_key'], 'unique': True},
+            {'columns': ['channel_name'], 'unique': True},
+            {'columns': ['channel_name_normalized']}
+        ]
+    )
+}}
+
 select
-    row_number() over () as channel_key,
+    channel_key,
     channel_name,
+    -- API lookups are case-insensitive; match on this column to use its index
+    lower(channel_name) as channel_name_normalized,
     min(message_date) as first_post_date,
     max(message_date) as last_post_date,
     count(*) as total_posts,
     avg(view_count) as avg_views
 from {{ ref('stg_telegram_messages') }}
-group by channel_name
+group by channel_key, channel_name
@@ -1,11 +1,32 @@
 -- SQLBook: Code
-select distinct
-    to_char(message_date, 'YYYYMMDD')::int as date_key,
-    message_date::date as full_date,
-    extract(dow from message_date) as day_of_week,
-    extract(week from message_date) as week_of_year,
-    extract(month from message_date) as month,
-    extract(quarter from message_date) as quarter,
-    extract(year from message_date) as year,
-    case when extract(dow from message_date) in (0,6) then true else false end as is_weekend
-from {{ ref('stg_telegram_messages') }}
+{{
+    config(
+        indexes=[
+            {'columns': ['date_key'], 'unique': True},
+            {'columns': ['full_date'], 'unique': True}
+        ]
+    )
+}}
+
+-- Calendar generated from a date spine: the cost depends on the date range,
+-- not on the message volume, and days without posts are included
+with spine as (
+
+    select generate_series(
+        '{{ var("date_spine_start") }}'::date,
+        (current_date + interval '{{ var("date_spine_future") }}')::date,
+        interval '1 day'
+    )::date as full_date
+
+)
+
+select
+    {{ date_key('full_date') }} as date_key,
+    full_date,
+    extract(dow from full_date) as day_of_week,
+    extract(week from full_date) as week_of_year,
+    extract(month from full_date) as month,
+    extract(quarter from full_date) as quarter,
+    extract(year from full_date) as year,
+    case when extract(dow from full_date) in (0,6) then true else false end as is_weekend
+from spine
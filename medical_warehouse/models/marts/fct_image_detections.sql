@@ -1,11 +1,37 @@
 -- SQLBook: Code
+{#
+    Month-partitioned on date_key by the partition_by_month post-hook
+    (macros/partitions.sql). full_refresh is off because a rebuild would
+    collide with the existing partitions. Drop the table to rebuild it from raw.
+#}
+{{
+    config(
+        materialized='incremental',
+        unique_key=['channel_key', 'message_id', 'date_key'],
+        incremental_strategy='delete+insert',
+        on_schema_change='append_new_columns',
+        full_refresh=false,
+        post_hook=[
+            "{{ partition_by_month('date_key') }}",
+            "{{ ensure_indexes([
+                {'columns': ['channel_key', 'message_id', 'date_key'], 'unique': True},
+                {'columns': ['channel_key', 'date_key']},
+                {'columns': ['message_id']},
+                {'columns': ['view_count']},
+                {'columns': ['loaded_at']}
+            ]) }}"
+        ]
+    )
+}}
+
 with detections as (
 
     select
         cast(message_id as bigint) as message_id,
-        channel_name,
+        {{ channel_key('channel_name') }} as channel_key,
         image_category,
-        confidence_score
+        confidence_score,
+        loaded_at
     from raw.yolo_detections
 
 ),
@@ -16,7 +42,8 @@ messages as (
         message_id,
         channel_key,
         date_key,
-        view_count
+        view_count,
+        loaded_at
     from {{ ref('fct_messages') }}
 
 )
@@ -27,7 +54,18 @@ select
     m.date_key,
     d.image_category,
     d.confidence_score,
-    m.view_count
+    m.view_count,
+    greatest(d.loaded_at, m.loaded_at) as loaded_at
 from detections d
 join messages m
     on d.message_id = m.message_id
+   and d.channel_key = m.channel_key
+
+{% if is_incremental() %}
+-- New or re-scored detections, and detections whose message got new view counts
+where greatest(d.loaded_at, m.loaded_at) > (
+    select coalesce(max(loaded_at), '1900-01-01'::timestamptz)
+        - interval '{{ var("watermark_lookback", "1 hour") }}'
+    from {{ this }}
+)
+{% endif %}
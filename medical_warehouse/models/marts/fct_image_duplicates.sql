@@ -0,0 +1,34 @@
+-- SQLBook: Code
+{{
+    config(
+        indexes=[
+            {'columns': ['channel_key', 'message_id'], 'unique': True},
+            {'columns': ['canonical_channel_key', 'canonical_message_id']}
+        ]
+    )
+}}
+
+-- Near-duplicate image clusters from the scraper's perceptual-hash index
+-- (src/image_hash.py): every image points at the canonical copy that was
+-- kept on disk and sent through YOLO.
+with images as (
+
+    select
+        {{ channel_key('channel_name') }} as channel_key,
+        message_id,
+        {{ channel_key('canonical_channel_name') }} as canonical_channel_key,
+        canonical_message_id,
+        hamming_distance
+    from raw.image_duplicates
+
+)
+
+select
+    i.channel_key,
+    i.message_id,
+    i.canonical_channel_key,
+    i.canonical_message_id,
+    i.hamming_distance,
+    (i.channel_key, i.message_id) = (i.canonical_channel_key, i.canonical_message_id) as is_canonical,
+    count(*) over (partition by i.canonical_channel_key, i.canonical_message_id) as cluster_size
+from images i
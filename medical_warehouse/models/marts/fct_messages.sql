@@ -1,15 +1,58 @@
 -- SQLBook: Code
+{#
+    Month-partitioned on date_key by the partition_by_month post-hook
+    (macros/partitions.sql). full_refresh is off because a rebuild would
+    collide with the existing partitions. Drop the table to rebuild it from raw.
+
+    search_vector was added to an existing incremental table, where
+    append_new_columns leaves it NULL on every older row. The last two hooks
+    fill those rows in; the partial index keeps the check cheap once none are left.
+#}
+{{
+    config(
+        materialized='incremental',
+        unique_key=['channel_key', 'message_id', 'date_key'],
+        incremental_strategy='delete+insert',
+        on_schema_change='append_new_columns',
+        full_refresh=false,
+        post_hook=[
+            "{{ partition_by_month('date_key') }}",
+            "{{ ensure_indexes([
+                {'columns': ['channel_key', 'message_id', 'date_key'], 'unique': True},
+                {'columns': ['channel_key', 'date_key']},
+                {'columns': ['message_id']},
+                {'columns': ['view_count']},
+                {'columns': ['loaded_at']},
+                {'columns': ['search_vector'], 'type': 'gin'}
+            ]) }}",
+            "create index if not exists {{ this.name }}_text_trgm_idx on {{ this }} using gin (message_text gin_trgm_ops)",
+            "create index if not exists {{ this.name }}_unsearchable_idx on {{ this }} (date_key) where search_vector is null",
+            "update {{ this }} set search_vector = {{ search_document('message_text') }} where search_vector is null"
+        ]
+    )
+}}
+
 select
     m.message_id,
     c.channel_key,
     d.date_key,
     m.message_text,
+    {{ search_document('m.message_text') }} as search_vector,
     m.message_length,
     m.view_count,
     m.forward_count,
-    m.has_image
+    m.has_image,
+    m.loaded_at
 from {{ ref('stg_telegram_messages') }} m
 join {{ ref('dim_channels') }} c
-  on m.channel_name = c.channel_name
+  on m.channel_key = c.channel_key
 join {{ ref('dim_dates') }} d
-  on m.message_date::date = d.full_date
+  on m.date_key = d.date_key
+
+{% if is_incremental() %}
+where m.loaded_at > (
+    select coalesce(max(loaded_at), '1900-01-01'::timestamptz)
+        - interval '{{ var("watermark_lookback", "1 hour") }}'
+    from {{ this }}
+)
+{% endif %}
@@ -0,0 +1,67 @@
+-- SQLBook: Code
+{{
+    config(
+        materialized='incremental',
+        unique_key=['channel_key', 'message_id'],
+        incremental_strategy='delete+insert',
+        on_schema_change='append_new_columns',
+        indexes=[
+            {'columns': ['channel_key', 'message_id', 'mention_index'], 'unique': True},
+            {'columns': ['product_name_normalized', 'date_key']},
+            {'columns': ['channel_key', 'date_key']},
+            {'columns': ['category']},
+            {'columns': ['loaded_at']}
+        ],
+        pre_hook="{{ drop_removed_mentions() }}"
+    )
+}}
+
+-- One row per product mention found by src/product_extraction.py (dictionary
+-- in seeds/product_dictionary.csv), with the birr price quoted next to it.
+-- A message whose mentions changed is replaced as a whole. Mentions the
+-- extractor deleted (an edit removed them) leave no new row to replace them
+-- with; the pre-hook (macros/product_mentions.sql) drops those. After a
+-- dictionary change the extractor rescans everything; rebuild this model
+-- with --full-refresh then (the pipeline does so).
+with
+
+{% if is_incremental() %}
+changed as (
+
+    select distinct channel_name, message_id
+    from raw.product_mentions
+    where loaded_at > (
+        select coalesce(max(loaded_at), '1900-01-01'::timestamptz)
+            - interval '{{ var("watermark_lookback", "1 hour") }}'
+        from {{ this }}
+    )
+
+),
+{% endif %}
+
+mentions as (
+
+    select p.*
+    from raw.product_mentions p
+    {% if is_incremental() %}
+    join changed c
+      on p.channel_name = c.channel_name
+     and p.message_id = c.message_id
+    {% endif %}
+
+)
+
+select
+    {{ channel_key('channel_name') }} as channel_key,
+    {{ date_key('message_date::timestamp') }} as date_key,
+    message_id,
+    mention_index,
+    product_name,
+    -- API lookups are case-insensitive; match on this column to use its index
+    lower(product_name) as product_name_normalized,
+    category,
+    matched_alias,
+    char_offset,
+    price_birr,
+    loaded_at
+from mentions
@@ -1,8 +1,23 @@
 -- SQLBook: Code
+{{
+    config(
+        materialized='incremental',
+        unique_key=['channel_name', 'message_id'],
+        incremental_strategy='delete+insert',
+        on_schema_change='append_new_columns',
+        indexes=[
+            {'columns': ['channel_name', 'message_id'], 'unique': True},
+            {'columns': ['loaded_at']}
+        ]
+    )
+}}
+
 with source as (
 
     select
         message_id,
+        {{ channel_key('channel_name') }} as channel_key,
+        {{ date_key('message_date::timestamp') }} as date_key,
         channel_name,
         message_date::timestamp as message_date,
         message_text,
@@ -11,9 +26,19 @@ with source as (
         views::int as view_count,
         forwards::int as forward_count,
         length(message_text) as message_length,
-        case when has_media then 1 else 0 end as has_image
+        case when has_media then 1 else 0 end as has_image,
+        loaded_at
     from raw.telegram_messages
 
+    {% if is_incremental() %}
+    -- New messages and late view/forward updates (the loader bumps loaded_at on change)
+    where loaded_at > (
+        select coalesce(max(loaded_at), '1900-01-01'::timestamptz)
+            - interval '{{ var("watermark_lookback", "1 hour") }}'
+        from {{ this }}
+    )
+    {% endif %}
+
 )
 
 select * from source
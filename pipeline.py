@@ -1,79 +1,410 @@
-from dagster import op, graph, job, ScheduleDefinition, Definitions, sensor, RunFailureSensorContext, SkipReason
-import subprocess
+from dagster import (
+    op, graph, job, ScheduleDefinition, Definitions, sensor, RunFailureSensorContext, SkipReason,
+    multiprocess_executor, asset, AssetRecordsFilter, AutomationCondition, Config,
+    DailyPartitionsDefinition, DataVersion, MaterializeResult, MultiPartitionsDefinition,
+    StaticPartitionsDefinition, define_asset_job, build_schedule_from_partitioned_job,
+)
+from datetime import date, datetime, timedelta, timezone
+import asyncio
+import hashlib
 import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+
+import scraper  # noqa: E402
+import yolo_detect  # noqa: E402
+import load_raw_to_postgres as raw_loader  # noqa: E402
+import load_yolo_results as yolo_loader  # noqa: E402
+import load_image_clusters as cluster_loader  # noqa: E402
+import product_extraction  # noqa: E402
+from instrumentation import metrics, profile  # noqa: E402
+from channels import CHANNELS  # noqa: E402
+from raw_store import DAILY_DATA_PATH, iter_records, partition_fingerprint  # noqa: E402
+from detection_store import date_root  # noqa: E402
+
+DBT_PROJECT = os.path.join(REPO_ROOT, "medical_warehouse")
+
+# Models that read the YOLO detections or image clusters; everything else only needs the raw messages
+DETECTION_MODELS = "fct_image_detections+ fct_image_duplicates+"
+
+
+def run_dbt(context, *args):
+    """Invoke dbt in-process and return per-invocation counts and timing."""
+    from dbt.cli.main import dbtRunner
+
+    start = time.perf_counter()
+    result = dbtRunner().invoke([*args, "--project-dir", DBT_PROJECT, "--profiles-dir", DBT_PROJECT])
+    if not result.success:
+        raise Exception(f"dbt {' '.join(args)} failed: {result.exception or 'see dbt log'}")
+    statuses = [str(r.status) for r in (result.result or [])]
+    for node_result in result.result or []:
+        metrics.observe("dbt_node_seconds", node_result.execution_time, node=node_result.node.name)
+    metrics.observe("dbt_invocation_seconds", time.perf_counter() - start, command=args[0])
+    stats = {
+        "nodes": len(statuses),
+        "succeeded": sum(s in ("success", "pass") for s in statuses),
+        "duration_s": round(time.perf_counter() - start, 3),
+    }
+    context.log.info(f"dbt {' '.join(args)}: {stats}")
+    return stats
+
+
+def step_metadata(stats, scope):
+    """The step's own stats plus every metric it recorded (see instrumentation.py)."""
+    metadata = {k: v for k, v in stats.items() if isinstance(v, (int, float, str))}
+    metadata.update(scope.metadata())
+    return metadata
+
+
+def attach_metadata(context, stats, scope):
+    """Op output metadata: see ``step_metadata``."""
+    context.add_output_metadata(step_metadata(stats, scope))
 
 # -------------------------
 # OP 1: Scrape Telegram Data
 # -------------------------
 @op
-def scrape_telegram_data(context):
+def scrape_telegram_data(context) -> dict:
     context.log.info("Running Telegram scraper...")
-    result = subprocess.run(["python", "src/scraper.py"], capture_output=True, text=True)
-    if result.returncode != 0:
-        raise Exception(f"Scraper failed: {result.stderr}")
-    context.log.info("Scraper completed successfully.")
-    return "done"  # dummy output for chaining
+    scope = metrics.scope()
+    start = time.perf_counter()
+    with profile("scrape_telegram_data"):
+        counts = asyncio.run(scraper.main())
+    stats = {
+        "messages": sum(counts.values()),
+        "channels": counts,
+        "duration_s": round(time.perf_counter() - start, 3),
+    }
+    context.log.info(f"Scraper completed: {stats}")
+    attach_metadata(context, stats, scope)
+    return stats
 
 # -------------------------
 # OP 2: Load Raw Data to Postgres
 # -------------------------
 @op
-def load_raw_to_postgres(context, prev: str):
+def load_raw_to_postgres(context, scrape: dict) -> dict:
     context.log.info("Loading raw data to Postgres...")
-    result = subprocess.run(["python", "scripts/load_raw_to_postgres.py"], capture_output=True, text=True)
-    if result.returncode != 0:
-        raise Exception(f"Load failed: {result.stderr}")
-    context.log.info("Raw data load completed successfully.")
-    return "done"
+    scope = metrics.scope()
+    with profile("load_raw_to_postgres"):
+        stats = raw_loader.load_incremental()
+    attach_metadata(context, stats, scope)
+    return stats
+
+# -------------------------
+# OP 2b: Product and price mentions from the new messages
+# -------------------------
+@op
+def extract_product_mentions(context, load: dict) -> dict:
+    context.log.info("Extracting product mentions...")
+    scope = metrics.scope()
+    with profile("extract_product_mentions"):
+        stats = product_extraction.extract_incremental()
+    attach_metadata(context, stats, scope)
+    return stats
 
 # -------------------------
-# OP 3: Run DBT Transformations
+# OP 3: Message models (staging + marts that don't read detections)
 # -------------------------
 @op
-def run_dbt_transformations(context, prev: str):
+def run_dbt_transformations(context, load: dict, products: dict) -> dict:
     context.log.info("Running DBT transformations...")
-    original_dir = os.getcwd()
-    os.chdir("medical_warehouse")
-    result = subprocess.run(["dbt", "run"], capture_output=True, text=True)
-    os.chdir(original_dir)
-    if result.returncode != 0:
-        raise Exception(f"DBT failed: {result.stderr}")
-    context.log.info("DBT transformations completed successfully.")
-    return "done"
+    # Seeds (e.g. the stopword list) must exist before the models that use them
+    scope = metrics.scope()
+    seed = run_dbt(context, "seed")
+    if products.get("full_rescan"):
+        # Every mention was re-extracted (new dictionary): rebuild the mart to drop stale ones
+        run_dbt(context, "run", "--full-refresh", "--select", "fct_product_mentions")
+    models = run_dbt(context, "run", "--exclude", DETECTION_MODELS)
+    stats = {"seeds": seed["nodes"], "models": models["nodes"],
+             "duration_s": round(seed["duration_s"] + models["duration_s"], 3)}
+    attach_metadata(context, stats, scope)
+    return stats
 
 # -------------------------
-# OP 4: Run YOLO Enrichment
+# OP 4: Run YOLO Enrichment (only needs the scraped images)
 # -------------------------
 @op
-def run_yolo_enrichment(context, prev: str):
+def run_yolo_enrichment(context, scrape: dict) -> dict:
     context.log.info("Running YOLO object detection...")
-    result = subprocess.run(["python", "src/yolo_detect.py"], capture_output=True, text=True)
-    if result.returncode != 0:
-        raise Exception(f"YOLO failed: {result.stderr}")
-    context.log.info("YOLO enrichment completed successfully.")
-    return "done"
+    scope = metrics.scope()
+    with profile("run_yolo_enrichment"):
+        stats = yolo_detect.run_detection()
+    context.log.info(f"YOLO enrichment completed: {stats}")
+    attach_metadata(context, stats, scope)
+    return stats
+
+# -------------------------
+# OP 5: Load detections, then build the marts that read them
+# -------------------------
+@op
+def load_yolo_detections(context, detections: dict, models: dict) -> dict:
+    context.log.info("Loading YOLO detections to Postgres...")
+    scope = metrics.scope()
+    with profile("load_yolo_detections"):
+        stats = yolo_loader.load_yolo_results()
+    attach_metadata(context, stats, scope)
+    return stats
+
+
+@op
+def load_image_clusters(context, scrape: dict) -> dict:
+    context.log.info("Loading near-duplicate image clusters to Postgres...")
+    scope = metrics.scope()
+    stats = cluster_loader.load_image_clusters()
+    attach_metadata(context, stats, scope)
+    return stats
+
+
+@op
+def run_detection_models(context, loaded: dict, clusters: dict) -> dict:
+    context.log.info("Building image-detection marts...")
+    scope = metrics.scope()
+    stats = run_dbt(context, "run", "--select", DETECTION_MODELS)
+    attach_metadata(context, stats, scope)
+    return stats
 
 # -------------------------
 # GRAPH: Medical Telegram Pipeline
 # -------------------------
+#   scrape ─┬─ load raw ─┬─────────────────────┬─ dbt (messages) ─┬─ load detections ─┬─ dbt (detections)
+#           │            └─ extract products ──┘                  │                   │
+#           ├─ YOLO detection ────────────────────────────────────┘                   │
+#           └─ load image clusters ───────────────────────────────────────────────────┘
 @graph
 def medical_telegram_pipeline():
-    # Chaining ops sequentially
     scrape = scrape_telegram_data()
     load = load_raw_to_postgres(scrape)
-    dbt = run_dbt_transformations(load)
-    yolo = run_yolo_enrichment(dbt)
+    models = run_dbt_transformations(load, extract_product_mentions(load))
+    detections = run_yolo_enrichment(scrape)
+    clusters = load_image_clusters(scrape)
+    run_detection_models(load_yolo_detections(detections, models), clusters)
+
+# Convert graph to job. Ops run in worker processes forked from a server that
+# has already imported this module, so no step pays the import cost again.
+preloaded_executor = multiprocess_executor.configured({
+    "max_concurrent": 2,
+    "start_method": {"forkserver": {"preload_modules": ["pipeline"]}},
+})
 
-# Convert graph to job
-pipeline_job = medical_telegram_pipeline.to_job(name="medical_telegram_pipeline")
+pipeline_job = medical_telegram_pipeline.to_job(
+    name="medical_telegram_pipeline",
+    executor_def=preloaded_executor,
+)
 
 # -------------------------
-# Daily Schedule at 2 AM UTC
+# Partitioned assets: one partition per (message date, channel)
 # -------------------------
-daily_schedule = ScheduleDefinition(
-    job=pipeline_job,
-    cron_schedule="0 2 * * *",  # 2 AM UTC daily
-    name="daily_medical_pipeline"
+#   raw_message_files ─┬─ raw_telegram_messages ─┬─ warehouse_marts (unpartitioned)
+#                      └─ yolo_detections ───────┘
+#
+# Any date or channel (including one just added to src/channels.py) can be
+# (re)built on its own, and a backfill runs one partition per run, as many
+# at once as dagster_home/dagster.yaml allows. Each partition asset records
+# a fingerprint of its input and skips the work when it hasn't changed.
+PARTITION_START = os.getenv("PIPELINE_PARTITION_START", "2024-01-01")
+# Days older than this are not scraped again once they have been, unless forced
+SETTLED_DAYS = int(os.getenv("PIPELINE_SETTLED_DAYS", "3"))
+# Request budget of one partition run; several run at once under the "telegram" pool
+PARTITION_RATE = float(os.getenv("PIPELINE_PARTITION_RATE", str(scraper.REQUESTS_PER_SECOND / 4)))
+DAILY_DETECTIONS_PATH = os.path.join("data", "raw", "yolo_detections_by_date")
+
+daily_channel_partitions = MultiPartitionsDefinition({
+    "date": DailyPartitionsDefinition(start_date=PARTITION_START),
+    "channel": StaticPartitionsDefinition(sorted(CHANNELS)),
+})
+
+class RebuildConfig(Config):
+    force: bool = False  # redo the work even if the input is unchanged
+
+
+def partition_of(context):
+    """``(date, channel)`` of the partition being materialized."""
+    keys = context.partition_key.keys_by_dimension
+    return keys["date"], keys["channel"]
+
+
+def last_materialization(context, asset_key, partition_key=None):
+    """``(metadata, timestamp)`` of the latest materialization of ``asset_key``, or ``({}, None)``."""
+    records = context.instance.fetch_materializations(
+        AssetRecordsFilter(asset_key=asset_key, asset_partitions=[partition_key] if partition_key else None),
+        limit=1,
+    ).records
+    if not records:
+        return {}, None
+    metadata = records[0].asset_materialization.metadata
+    return {k: v.value for k, v in metadata.items()}, records[0].timestamp
+
+
+def input_unchanged(context, fingerprint, config):
+    previous, _ = last_materialization(context, context.asset_key, context.partition_key)
+    return not config.force and previous.get("input_fingerprint") == fingerprint
+
+
+def partition_result(stats, scope, fingerprint, input_fingerprint):
+    """Materialization whose data version is ``fingerprint``; a skipped partition keeps its old one."""
+    metadata = step_metadata(stats, scope)
+    metadata.update({"skipped": bool(stats.get("skipped")), "input_fingerprint": input_fingerprint})
+    return MaterializeResult(metadata=metadata, data_version=DataVersion(fingerprint))
+
+
+def partition_images(day, channel_name):
+    """``(channel_name, message_id, path)`` for the photos of one partition that are on disk."""
+    items = []
+    for record in iter_records(DAILY_DATA_PATH, day, channel_name):
+        path = record.get("image_path")
+        if path and os.path.exists(path):
+            items.append((channel_name, str(record["message_id"]), path))
+    return sorted(items)
+
+
+def images_fingerprint(items, model_name):
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for channel_name, message_id, path in items:
+        stat = os.stat(path)
+        digest.update(f"{channel_name}/{message_id}:{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+@asset(partitions_def=daily_channel_partitions, pool="telegram", group_name="ingest")
+def raw_message_files(context, config: RebuildConfig) -> MaterializeResult:
+    """Messages posted in the partition's channel on its date, as one raw file under data/raw/messages_by_date."""
+    day, channel_name = partition_of(context)
+    scope = metrics.scope()
+    previous, _ = last_materialization(context, context.asset_key, context.partition_key)
+    settled = date.fromisoformat(day) < datetime.now(timezone.utc).date() - timedelta(days=SETTLED_DAYS)
+    fingerprint, rows = partition_fingerprint(day, channel_name, DAILY_DATA_PATH)
+    start = time.perf_counter()
+    # Past days rarely change: keep what was scraped as long as the file is still intact
+    skipped = settled and not config.force and previous.get("input_fingerprint") == fingerprint
+    if skipped:
+        context.log.info(f"{channel_name} {day}: already scraped; skipping")
+    else:
+        with profile("raw_message_files"):
+            asyncio.run(scraper.scrape_partition(channel_name, day, PARTITION_RATE))
+        fingerprint, rows = partition_fingerprint(day, channel_name, DAILY_DATA_PATH)
+    stats = {"messages": rows, "skipped": skipped, "duration_s": round(time.perf_counter() - start, 3)}
+    return partition_result(stats, scope, fingerprint, fingerprint)
+
+
+@asset(partitions_def=daily_channel_partitions, deps=[raw_message_files], pool="postgres", group_name="ingest")
+def raw_telegram_messages(context, config: RebuildConfig) -> MaterializeResult:
+    """The partition's raw file merged into raw.telegram_messages."""
+    day, channel_name = partition_of(context)
+    scope = metrics.scope()
+    fingerprint, rows = partition_fingerprint(day, channel_name, DAILY_DATA_PATH)
+    if input_unchanged(context, fingerprint, config):
+        context.log.info(f"{channel_name} {day}: raw file unchanged since the last load; skipping")
+        stats = {"rows": rows, "skipped": True}
+    else:
+        with profile("raw_telegram_messages"):
+            stats = raw_loader.load_incremental(DAILY_DATA_PATH, force=config.force,
+                                                day=day, channel_name=channel_name)
+    return partition_result(stats, scope, fingerprint, fingerprint)
+
+
+@asset(partitions_def=daily_channel_partitions, deps=[raw_message_files], pool="yolo", group_name="ingest")
+def yolo_detections(context, config: RebuildConfig) -> MaterializeResult:
+    """YOLO detections for the partition's photos, merged into raw.yolo_detections."""
+    day, channel_name = partition_of(context)
+    scope = metrics.scope()
+    items = partition_images(day, channel_name)
+    fingerprint = images_fingerprint(items, yolo_detect.MODEL_NAME)
+    if input_unchanged(context, fingerprint, config):
+        context.log.info(f"{channel_name} {day}: photos unchanged since the last detection run; skipping")
+        stats = {"images": len(items), "skipped": True}
+    else:
+        csv_path = os.path.join(DAILY_DETECTIONS_PATH, day, f"{channel_name}.csv")
+        with profile("yolo_detections"):
+            # Every record points at a file on disk (its own, or the canonical copy if
+            # IMAGE_DEDUP_REMOVE dropped it), so no image-index pass
+            stats = yolo_detect.run_detection(
+                output_csv=csv_path, items=items, image_index_path=None,
+                detections_root=date_root(day),
+            )
+            stats["rows_upserted"] = yolo_loader.load_yolo_results(csv_path)["rows_upserted"]
+    return partition_result(stats, scope, fingerprint, fingerprint)
+
+
+def changed_since(context, asset_key, timestamp):
+    """Whether any partition of ``asset_key`` was rebuilt (not skipped) after ``timestamp``."""
+    cursor = None
+    while True:
+        result = context.instance.fetch_materializations(
+            AssetRecordsFilter(asset_key=asset_key, after_timestamp=timestamp), limit=1000, cursor=cursor,
+        )
+        for record in result.records:
+            skipped = record.asset_materialization.metadata.get("skipped")
+            if not (skipped and skipped.value):
+                return True
+        if not result.has_more:
+            return False
+        cursor = result.cursor
+
+
+@asset(deps=[raw_telegram_messages, yolo_detections], automation_condition=AutomationCondition.eager(),
+       group_name="warehouse")
+def warehouse_marts(context, config: RebuildConfig) -> MaterializeResult:
+    """Product mentions, image clusters and every dbt model, built once the partitions they read settle.
+
+    The models are incremental on load time, so one run covers however many
+    partitions changed since the last one.
+    """
+    scope = metrics.scope()
+    _, last_built = last_materialization(context, context.asset_key)
+    if last_built is not None and not config.force and not any(
+        changed_since(context, dep.key, last_built)
+        for dep in (raw_telegram_messages, yolo_detections)
+    ):
+        context.log.info("No partition changed since the last build; skipping")
+        return MaterializeResult(metadata={"skipped": True})
+
+    with profile("warehouse_marts"):
+        products = product_extraction.extract_incremental()
+        clusters = cluster_loader.load_image_clusters()
+        seed = run_dbt(context, "seed")
+        if products.get("full_rescan"):
+            run_dbt(context, "run", "--full-refresh", "--select", "fct_product_mentions")
+        models = run_dbt(context, "run")
+    stats = {"mentions": products.get("mentions", 0), "clusters": clusters.get("rows_copied", 0),
+             "seeds": seed["nodes"], "models": models["nodes"], "skipped": False}
+    return MaterializeResult(metadata=step_metadata(stats, scope))
+
+
+partitioned_ingest_job = define_asset_job(
+    "partitioned_ingest",
+    selection=[raw_message_files, raw_telegram_messages, yolo_detections],
+    partitions_def=daily_channel_partitions,
+    executor_def=preloaded_executor,
+)
+
+# An unpartitioned asset can't share the partitioned job, so the marts get their own
+warehouse_marts_job = define_asset_job(
+    "build_warehouse_marts",
+    selection=[warehouse_marts],
+)
+
+# -------------------------
+# Daily Schedule at 2 AM UTC: yesterday's partition of every channel
+# -------------------------
+daily_schedule = build_schedule_from_partitioned_job(
+    partitioned_ingest_job,
+    hour_of_day=2,
+    name="daily_medical_pipeline",
+)
+
+# The marts at MARTS_HOUR UTC, so dbt runs even where the automation sensor is off.
+# With the sensor on they are usually built already, and this run skips.
+MARTS_HOUR = int(os.getenv("PIPELINE_MARTS_HOUR", "5"))
+
+marts_schedule = ScheduleDefinition(
+    job=warehouse_marts_job,
+    cron_schedule=f"0 {MARTS_HOUR} * * *",
+    name="daily_warehouse_marts",
 )
 
 # -------------------------
@@ -88,7 +419,8 @@ def pipeline_failure_sensor(context: RunFailureSensorContext):
 # Dagster Definitions
 # -------------------------
 defs = Definitions(
-    jobs=[pipeline_job],
-    schedules=[daily_schedule],
+    assets=[raw_message_files, raw_telegram_messages, yolo_detections, warehouse_marts],
+    jobs=[pipeline_job, partitioned_ingest_job, warehouse_marts_job],
+    schedules=[daily_schedule, marts_schedule],
     sensors=[pipeline_failure_sensor]
 )
@@ -0,0 +1,79 @@
+# scripts/load_image_clusters.py
+
+import io
+import os
+import sys
+import csv
+import time
+import argparse
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from image_hash import IMAGE_INDEX_PATH, ImageHashIndex  # noqa: E402
+from instrumentation import metrics  # noqa: E402
+from load_yolo_results import DB_CONFIG  # noqa: E402
+
+COLUMNS = "channel_name, message_id, canonical_channel_name, canonical_message_id, hamming_distance"
+
+SCHEMA_SQL = """
+CREATE SCHEMA IF NOT EXISTS raw;
+
+CREATE TABLE IF NOT EXISTS raw.image_duplicates (
+    channel_name TEXT NOT NULL,
+    message_id BIGINT NOT NULL,
+    canonical_channel_name TEXT NOT NULL,
+    canonical_message_id BIGINT NOT NULL,
+    hamming_distance SMALLINT NOT NULL,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (channel_name, message_id)
+);
+"""
+
+
+def load_image_clusters(index_path=IMAGE_INDEX_PATH, conn=None):
+    """Replace raw.image_duplicates with the clusters from the perceptual-hash index.
+
+    One row per indexed image, pointing at its canonical image (itself for
+    canonical images). The table is small, so it is rewritten in a single
+    transaction with COPY rather than merged.
+    """
+    start = time.perf_counter()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows = 0
+    with ImageHashIndex(index_path, remove_duplicates=False) as index:
+        for row in index.clusters():
+            writer.writerow(row)
+            rows += 1
+    buffer.seek(0)
+
+    own_conn = conn is None
+    conn = conn or psycopg2.connect(**DB_CONFIG)
+    try:
+        cur = conn.cursor()
+        cur.execute(SCHEMA_SQL)
+        cur.execute("TRUNCATE raw.image_duplicates")
+        with metrics.timer("loader_copy_seconds", table="image_duplicates"):
+            cur.copy_expert(f"COPY raw.image_duplicates ({COLUMNS}) FROM STDIN WITH (FORMAT csv)", buffer)
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    metrics.inc("loader_rows_copied_total", rows, table="image_duplicates")
+    stats = {"rows_copied": rows, "duration_s": round(time.perf_counter() - start, 3)}
+    print(f"Image duplicate clusters loaded into PostgreSQL: {rows} images.")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load perceptual-hash duplicate clusters into raw.image_duplicates")
+    parser.add_argument("--index", default=IMAGE_INDEX_PATH)
+    args = parser.parse_args()
+    load_image_clusters(args.index)
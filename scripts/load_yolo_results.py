@@ -1,44 +1,163 @@
 # scripts/load_yolo_results.py
 
-import pandas as pd
+import io
+import os
+import csv
+import sys
+import time
+import argparse
+from itertools import islice
+
 import psycopg2
 from dotenv import load_dotenv
-import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from instrumentation import metrics, profile  # noqa: E402
 
 load_dotenv()
 
 DB_CONFIG = {
-    "host": "localhost",
-    "dbname": "medical_warehouse",
-    "user": "postgres",
+    "host": os.getenv("POSTGRES_HOST", "localhost"),
+    "dbname": os.getenv("POSTGRES_DB", "medical_warehouse"),
+    "user": os.getenv("POSTGRES_USER", "postgres"),
     "password": os.getenv("POSTGRES_PASSWORD"),
-    "port": 5432
+    "port": int(os.getenv("POSTGRES_PORT", "5432"))
 }
 
 CSV_PATH = "data/raw/yolo_detections.csv"
+CHUNK_SIZE = int(os.getenv("YOLO_LOAD_CHUNK_SIZE", "100000"))
 
-conn = psycopg2.connect(**DB_CONFIG)
-cur = conn.cursor()
+COLUMNS = "message_id, channel_name, image_category, confidence_score"
+
+SCHEMA_SQL = """
+CREATE SCHEMA IF NOT EXISTS raw;
 
-cur.execute("""
 CREATE TABLE IF NOT EXISTS raw.yolo_detections (
-    message_id TEXT,
-    channel_name TEXT,
+    message_id BIGINT NOT NULL,
+    channel_name TEXT NOT NULL,
     image_category TEXT,
-    confidence_score FLOAT
+    confidence_score FLOAT,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
-""")
 
-df = pd.read_csv(CSV_PATH)
+-- Tables created by the old row-by-row loader have no load timestamp
+ALTER TABLE raw.yolo_detections
+    ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMPTZ NOT NULL DEFAULT now();
+"""
+
+UNIQUE_INDEX = "yolo_detections_channel_message_uidx"
+
+DEDUPLICATE_SQL = """
+DELETE FROM raw.yolo_detections a
+USING raw.yolo_detections b
+WHERE a.channel_name = b.channel_name
+  AND a.message_id = b.message_id
+  AND a.ctid < b.ctid
+"""
+
+MERGE_SQL = f"""
+INSERT INTO raw.yolo_detections AS t ({COLUMNS})
+SELECT DISTINCT ON (channel_name, message_id) {COLUMNS}
+FROM stage_yolo_detections
+ORDER BY channel_name, message_id
+ON CONFLICT (channel_name, message_id) DO UPDATE SET
+    image_category = EXCLUDED.image_category,
+    confidence_score = EXCLUDED.confidence_score,
+    loaded_at = now()
+WHERE (t.image_category, t.confidence_score)
+    IS DISTINCT FROM (EXCLUDED.image_category, EXCLUDED.confidence_score)
+"""
+
+
+def ensure_schema(cur):
+    cur.execute(SCHEMA_SQL)
+    cur.execute("SELECT 1 FROM pg_indexes WHERE schemaname = 'raw' AND indexname = %s", (UNIQUE_INDEX,))
+    if cur.fetchone() is None:
+        # Earlier runs appended duplicates on every load; keep one row per image
+        cur.execute(DEDUPLICATE_SQL)
+        cur.execute(
+            f"CREATE UNIQUE INDEX {UNIQUE_INDEX} ON raw.yolo_detections (channel_name, message_id)"
+        )
+
+
+def create_stage(cur):
+    cur.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS stage_yolo_detections "
+        "(LIKE raw.yolo_detections INCLUDING DEFAULTS) ON COMMIT DROP"
+    )
+
+
+def merge_chunk(cur, buf):
+    """COPY one CSV chunk into the staging table and merge it; returns rows inserted or updated."""
+    with metrics.timer("loader_copy_seconds", table="yolo_detections"):
+        cur.copy_expert(f"COPY stage_yolo_detections ({COLUMNS}) FROM STDIN WITH (FORMAT csv)", buf)
+    with metrics.timer("loader_merge_seconds", table="yolo_detections"):
+        cur.execute(MERGE_SQL)
+    upserted = cur.rowcount
+    cur.execute("TRUNCATE stage_yolo_detections")
+    return upserted
+
+
+def upsert_rows(cur, rows):
+    """Merge ``[message_id, channel_name, image_category, confidence_score]`` rows (as written
+    by yolo_detect.detection_rows) in the caller's transaction."""
+    create_stage(cur)
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    upserted = merge_chunk(cur, buf)
+    metrics.inc("loader_rows_copied_total", len(rows), table="yolo_detections")
+    metrics.inc("loader_rows_upserted_total", upserted, table="yolo_detections")
+    return upserted
+
+
+def load_yolo_results(csv_path=CSV_PATH, chunk_size=CHUNK_SIZE, conn=None):
+    """COPY the detections CSV into a staging table chunk by chunk and merge it.
+
+    Re-running with the same file leaves raw.yolo_detections unchanged, and
+    the whole load commits as one transaction.
+    """
+    start = time.perf_counter()
+    own_conn = conn is None
+    conn = conn or psycopg2.connect(**DB_CONFIG)
+    copied = upserted = 0
+    try:
+        cur = conn.cursor()
+        ensure_schema(cur)
+        create_stage(cur)
+        with open(csv_path, "r", encoding="utf-8") as f:
+            f.readline()  # header
+            while True:
+                lines = list(islice(f, chunk_size))
+                if not lines:
+                    break
+                upserted += merge_chunk(cur, io.StringIO("".join(lines)))
+                copied += len(lines)
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
 
-for _, row in df.iterrows():
-    cur.execute("""
-        INSERT INTO raw.yolo_detections
-        VALUES (%s, %s, %s, %s)
-    """, tuple(row))
+    metrics.inc("loader_rows_copied_total", copied, table="yolo_detections")
+    metrics.inc("loader_rows_upserted_total", upserted, table="yolo_detections")
+    stats = {
+        "rows_copied": copied,
+        "rows_upserted": upserted,
+        "duration_s": round(time.perf_counter() - start, 3),
+    }
+    print(f"YOLO detections loaded into PostgreSQL: {copied} rows read, {upserted} inserted or updated.")
+    return stats
 
-conn.commit()
-cur.close()
-conn.close()
 
-print("YOLO detections loaded into PostgreSQL.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load YOLO detections into raw.yolo_detections")
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    with profile("load_yolo_results"):
+        load_yolo_results(args.csv, args.chunk_size)
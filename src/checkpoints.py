@@ -0,0 +1,42 @@
+# src/checkpoints.py
+
+import os
+import json
+import threading
+
+CHECKPOINT_PATH = os.path.join("data", "raw", "checkpoints.json")
+
+
+class CheckpointStore:
+    """Highest scraped ``message_id`` per channel, persisted as a small JSON file.
+
+    Every update is written to a temp file and swapped in with ``os.replace`` so
+    a crash never leaves a half-written checkpoint behind.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+
+    def get(self, channel_name):
+        return int(self._data.get(channel_name, {}).get("last_message_id", 0))
+
+    def update(self, channel_name, message_id, **extra):
+        with self._lock:
+            if message_id <= self.get(channel_name):
+                return
+            entry = self._data.setdefault(channel_name, {})
+            entry["last_message_id"] = int(message_id)
+            entry.update(extra)
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
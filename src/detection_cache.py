@@ -0,0 +1,147 @@
+# src/detection_cache.py
+
+import os
+import json
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_PATH = os.path.join("data", "raw", "detection_cache.sqlite")
+SQLITE_TIMEOUT = 30  # seconds to wait for another process's write lock
+CACHE_SCHEMA_VERSION = 2  # bump when the stored detection payload changes shape
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS detections (
+    content_hash TEXT NOT NULL,
+    config TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_hash, config)
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size_bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+"""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _package_version(name):
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return None
+
+
+def config_fingerprint(model_name, person_class_id, product_class_ids, **extra):
+    """Hash everything that can change a cached result.
+
+    Covers the model name and weights, the ultralytics version and the class
+    mapping, plus any ``extra`` settings (e.g. image_size), so changing any
+    of them invalidates every entry.
+    """
+    weights_hash = file_sha256(model_name) if os.path.isfile(model_name) else None
+    config = {
+        "schema": CACHE_SCHEMA_VERSION,
+        "model": os.path.basename(str(model_name)),
+        "weights_sha256": weights_hash,
+        "ultralytics": _package_version("ultralytics"),
+        "person_class_id": person_class_id,
+        "product_class_ids": sorted(product_class_ids),
+        **extra,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class DetectionCache:
+    """Persistent detection results keyed by image content hash and model config.
+
+    Images reposted across channels hash to the same key, so each distinct
+    image is run through the model once. File hashes are remembered by
+    path, size and mtime, so unchanged images are not re-read on every run.
+    """
+
+    def __init__(self, fingerprint, path=CACHE_PATH):
+        self.fingerprint = fingerprint
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=SQLITE_TIMEOUT)
+        # Partition runs of a backfill share this file from several processes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA_SQL)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def hash_files(self, paths, workers=4):
+        """Return ``{path: content_hash}``, hashing only new or modified files."""
+        paths = [str(p) for p in paths]
+        known = {}
+        for path, size, mtime_ns, content_hash in self.conn.execute(
+            "SELECT path, size_bytes, mtime_ns, content_hash FROM file_hashes"
+        ):
+            known[path] = (size, mtime_ns, content_hash)
+
+        hashes = {}
+        stale = []
+        for path in paths:
+            stat = os.stat(path)
+            entry = known.get(path)
+            if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                hashes[path] = entry[2]
+            else:
+                stale.append((path, stat))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fresh = list(pool.map(file_sha256, [path for path, _ in stale]))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                [(path, stat.st_size, stat.st_mtime_ns, h) for (path, stat), h in zip(stale, fresh)],
+            )
+        hashes.update({path: h for (path, _), h in zip(stale, fresh)})
+        return hashes
+
+    def get_many(self, content_hashes):
+        found = {}
+        content_hashes = list(content_hashes)
+        for start in range(0, len(content_hashes), 500):
+            chunk = content_hashes[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for content_hash, result in self.conn.execute(
+                f"SELECT content_hash, result FROM detections "
+                f"WHERE config = ? AND content_hash IN ({placeholders})",
+                [self.fingerprint, *chunk],
+            ):
+                found[content_hash] = json.loads(result)
+        return found
+
+    def put_many(self, results):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO detections (content_hash, config, result) VALUES (?, ?, ?)",
+                [(h, self.fingerprint, json.dumps(r)) for h, r in results.items()],
+            )
+
+    def prune(self):
+        """Drop entries produced by any other model/class configuration."""
+        with self.conn:
+            return self.conn.execute(
+                "DELETE FROM detections WHERE config != ?", (self.fingerprint,)
+            ).rowcount
@@ -0,0 +1,339 @@
+# src/detection_service.py
+"""Resident YOLO detection service on a UNIX socket (or localhost TCP port).
+
+Loading ultralytics/torch and warming the model up costs seconds, which
+every batch run and every tool that wants a detection used to pay. The
+service loads the model once and answers requests with millisecond
+overhead.
+
+Requests from all connections go into one queue. Each micro-batch takes
+requests for up to ``--window-ms`` after the first one arrives, or until
+``--batch-size`` images are collected, and runs them through the model
+in one pass.
+
+Protocol: one JSON object per line in each direction.
+
+    -> {"paths": ["/abs/path/1.jpg", ...], "images": ["<base64 bytes>", ...]}
+    <- {"results": [{"image_category": "lifestyle", "confidence_score": 0.91,
+                     "classes": [...], "confidences": [...], "boxes": [[x1, y1, x2, y2], ...],
+                     "width": 1280, "height": 720}, {"error": "unreadable image"}, ...]}
+    -> {"op": "info"}
+    <- {"model": "yolov8n.pt", "image_size": 640, "batch_size": 16, ...}
+
+Results come back in request order, paths first, then images. Paths are read
+by the service, so they must be absolute (or relative to its working directory).
+
+    python src/detection_service.py                       # data/run/yolo.sock
+    YOLO_SERVICE_SOCKET=data/run/yolo.sock python src/yolo_detect.py
+"""
+
+import os
+import json
+import base64
+import signal
+import socket
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+import yolo_detect
+from logger import logger
+from instrumentation import metrics
+
+load_dotenv()
+SOCKET_PATH = os.getenv("YOLO_SERVICE_SOCKET", os.path.join("data", "run", "yolo.sock"))
+WINDOW_MS = float(os.getenv("YOLO_SERVICE_WINDOW_MS", "10"))
+MAX_LINE_BYTES = 64 * 1024 * 1024  # base64 images travel inside one JSON line
+CONNECT_TIMEOUT = 2.0
+
+
+class DetectionService:
+    """Keeps one model warm and runs queued images through it in micro-batches."""
+
+    def __init__(self, model_name=yolo_detect.MODEL_NAME, batch_size=yolo_detect.BATCH_SIZE, window_ms=WINDOW_MS,
+                 image_size=yolo_detect.IMAGE_SIZE, device=yolo_detect.DEVICE, workers=yolo_detect.DECODE_WORKERS):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.window = window_ms / 1000
+        self.image_size = image_size
+        self.device = device
+        self.model = None
+        self.queue = asyncio.Queue()
+        # The model runs on one thread; decoding happens in parallel on the others
+        self.model_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yolo-model")
+        self.decode_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yolo-decode")
+        self.stats = {"requests": 0, "images": 0, "batches": 0}
+        self.connections = set()
+        self._batcher = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.model = await loop.run_in_executor(self.model_thread, yolo_detect.load_model, self.model_name)
+        # The first call initialises the backend; pay that before the first request
+        blank = np.zeros((self.image_size, self.image_size, 3), dtype=np.uint8)
+        await loop.run_in_executor(self.model_thread, self._infer, [(blank, self.image_size, self.image_size)])
+        self._batcher = asyncio.create_task(self._run_batches())
+        logger.info(f"Detection service ready: {self.model_name} on {self.device or 'default device'}")
+
+    async def stop(self):
+        if self._batcher is not None:
+            await self.queue.put(None)
+            await self._batcher
+        self.model_thread.shutdown(wait=True)
+        self.decode_pool.shutdown(wait=True)
+
+    def info(self):
+        return {"model": self.model_name, "image_size": self.image_size, "batch_size": self.batch_size,
+                "window_ms": self.window * 1000, "device": self.device, **self.stats}
+
+    # -----------------------------
+    # Batching
+    # -----------------------------
+    def _infer(self, decoded):
+        """Detections, in order, for a list of ``(frame, width, height)``."""
+        items = [(None, i, None) for i in range(len(decoded))]
+        return [detection for _, detection in yolo_detect.run_batch(
+            self.model, items, decoded, self.image_size, self.device
+        )]
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self.queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            self.stats["batches"] += 1
+            metrics.inc("yolo_service_batches_total")
+            metrics.inc("yolo_service_images_total", len(batch))
+            try:
+                detections = await loop.run_in_executor(self.model_thread, self._infer, [d for d, _ in batch])
+            except Exception as e:
+                logger.error(f"Detection batch of {len(batch)} failed | {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), detection in zip(batch, detections):
+                if not future.done():
+                    future.set_result(detection)
+
+    async def detect_one(self, decode, source):
+        loop = asyncio.get_running_loop()
+        try:
+            decoded = await loop.run_in_executor(self.decode_pool, decode, source, self.image_size)
+        except Exception:
+            decoded = None
+        if decoded is None:
+            return {"error": "unreadable image"}
+        future = loop.create_future()
+        await self.queue.put((decoded, future))
+        detection = await future
+        categories, max_conf = yolo_detect.classify_detections([detection])
+        return {"image_category": categories[0], "confidence_score": max_conf[0], **detection}
+
+    async def detect(self, paths=(), images=()):
+        self.stats["requests"] += 1
+        self.stats["images"] += len(paths) + len(images)
+        metrics.inc("yolo_service_requests_total")
+        tasks = [self.detect_one(yolo_detect.decode_image, path) for path in paths]
+        tasks += [self.detect_one(yolo_detect.decode_bytes, base64.b64decode(data)) for data in images]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return [{"error": str(r)} if isinstance(r, Exception) else r for r in results]
+
+    # -----------------------------
+    # Connections
+    # -----------------------------
+    async def handle(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if request.get("op") == "info":
+                        response = self.info()
+                    else:
+                        with metrics.timer("yolo_service_request_seconds"):
+                            response = {"results": await self.detect(request.get("paths", []),
+                                                                     request.get("images", []))}
+                except Exception as e:
+                    response = {"error": f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+
+async def serve(socket_path=SOCKET_PATH, port=None, **options):
+    """Run the service until SIGINT/SIGTERM; listens on ``port`` (localhost) if given, else ``socket_path``."""
+    service = DetectionService(**options)
+    await service.start()
+    if port:
+        server = await asyncio.start_server(service.handle, "127.0.0.1", port, limit=MAX_LINE_BYTES)
+        where = f"127.0.0.1:{port}"
+    else:
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # left behind by a service that did not shut down cleanly
+        server = await asyncio.start_unix_server(service.handle, socket_path, limit=MAX_LINE_BYTES)
+        where = socket_path
+    logger.info(f"Detection service listening on {where}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        # Idle client connections would otherwise keep wait_closed() waiting
+        for writer in list(service.connections):
+            writer.close()
+        await server.wait_closed()
+        await service.stop()
+        if not port and os.path.exists(socket_path):
+            os.remove(socket_path)
+    logger.info(f"Detection service stopped: {service.stats}")
+    return service.stats
+
+
+# -----------------------------
+# Client
+# -----------------------------
+class DetectionClient:
+    """Blocking client for the service: one connection, one request at a time.
+
+    ``address`` is a socket path or ``host:port``.
+    """
+
+    def __init__(self, address=SOCKET_PATH, timeout=None):
+        if ":" in address and not os.path.exists(address):
+            host, port = address.rsplit(":", 1)
+            self.sock = socket.create_connection((host, int(port)), timeout=CONNECT_TIMEOUT)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(CONNECT_TIMEOUT)
+            self.sock.connect(address)
+        self.sock.settimeout(timeout)
+        self.file = self.sock.makefile("rwb")
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, payload):
+        self.file.write(json.dumps(payload).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("detection service closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"detection service: {response['error']}")
+        return response
+
+    def info(self):
+        return self.request({"op": "info"})
+
+    def detect_paths(self, paths):
+        return self.request({"paths": [os.path.abspath(p) for p in paths]})["results"]
+
+    def detect_bytes(self, images):
+        return self.request({"images": [base64.b64encode(data).decode() for data in images]})["results"]
+
+    def detect_images(self, items, batch_size=yolo_detect.BATCH_SIZE):
+        """Drop-in for ``yolo_detect.detect_images``: one list of ``(item, detection)`` per batch.
+
+        Unreadable images are skipped, as the in-process engine does.
+        """
+        for batch in yolo_detect.batched(items, batch_size):
+            results = self.detect_paths([path for _, _, path in batch])
+            pairs = []
+            for item, result in zip(batch, results):
+                if "error" in result:
+                    logger.warning(f"Skipping {item[2]}: {result['error']}")
+                    continue
+                pairs.append((item, {k: result[k] for k in ("classes", "confidences", "boxes", "width", "height")}))
+            metrics.inc("yolo_images_total", len(pairs), source="service")
+            yield pairs
+
+
+def connect(address, model_name=None, image_size=None):
+    """A client for the service at ``address``, or None when it isn't running or serves another model.
+
+    A service running ``model_name`` at a different ``image_size`` counts as
+    another model: its results would be cached under the caller's config.
+    Callers fall back to loading the model themselves, so the service stays optional.
+    """
+    try:
+        client = DetectionClient(address)
+        info = client.info()
+    except (OSError, ValueError, RuntimeError) as e:
+        logger.info(f"No detection service at {address} ({e}); running the model in-process")
+        return None
+    if model_name and info["model"] != model_name:
+        logger.warning(f"Detection service runs {info['model']}, not {model_name}; running the model in-process")
+        client.close()
+        return None
+    if image_size and info["image_size"] != image_size:
+        logger.warning(f"Detection service runs at image size {info['image_size']}, not {image_size}; "
+                       f"running the model in-process")
+        client.close()
+        return None
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve YOLO detections from a warm model")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--port", type=int, default=None, help="listen on 127.0.0.1:PORT instead of the socket")
+    parser.add_argument("--model", default=yolo_detect.MODEL_NAME)
+    parser.add_argument("--batch-size", type=int, default=yolo_detect.BATCH_SIZE)
+    parser.add_argument("--window-ms", type=float, default=WINDOW_MS,
+                        help="how long a batch waits for more requests after the first")
+    parser.add_argument("--image-size", type=int, default=yolo_detect.IMAGE_SIZE)
+    parser.add_argument("--device", default=yolo_detect.DEVICE)
+    parser.add_argument("--workers", type=int, default=yolo_detect.DECODE_WORKERS)
+    args = parser.parse_args()
+    asyncio.run(serve(
+        args.socket, args.port, model_name=args.model, batch_size=args.batch_size, window_ms=args.window_ms,
+        image_size=args.image_size, device=args.device, workers=args.workers,
+    ))
+
+
+if __name__ == "__main__":
+    main()
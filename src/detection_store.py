@@ -0,0 +1,120 @@
+# src/detection_store.py
+
+import os
+import glob
+
+import numpy as np
+
+# -----------------------------
+# Layout
+# -----------------------------
+# One compressed NPZ per channel: data/raw/detections/<channel>.npz
+#   image_*  one row per processed image (images without boxes included)
+#   box_*    one row per detected box, joined to images on message_id
+DETECTIONS_ROOT = os.path.join("data", "raw", "detections")
+
+IMAGE_DTYPES = {
+    "image_message_id": np.int64,
+    "image_width": np.int32,
+    "image_height": np.int32,
+}
+BOX_DTYPES = {
+    "box_message_id": np.int64,
+    "box_class_id": np.int16,
+    "box_confidence": np.float32,
+    "box_x1": np.float32,
+    "box_y1": np.float32,
+    "box_x2": np.float32,
+    "box_y2": np.float32,
+}
+
+CATEGORIES = np.array(["other", "lifestyle", "product_display", "promotional"])
+
+
+class DetectionTableBuilder:
+    """Accumulates per-image detections into column lists for one channel."""
+
+    def __init__(self):
+        self.columns = {name: [] for name in {**IMAGE_DTYPES, **BOX_DTYPES}}
+
+    def add(self, message_id, detection):
+        message_id = int(message_id)
+        self.columns["image_message_id"].append(message_id)
+        self.columns["image_width"].append(detection.get("width", 0))
+        self.columns["image_height"].append(detection.get("height", 0))
+        boxes = detection.get("boxes") or [[0.0, 0.0, 0.0, 0.0]] * len(detection["classes"])
+        for class_id, confidence, (x1, y1, x2, y2) in zip(detection["classes"], detection["confidences"], boxes):
+            self.columns["box_message_id"].append(message_id)
+            self.columns["box_class_id"].append(class_id)
+            self.columns["box_confidence"].append(confidence)
+            self.columns["box_x1"].append(x1)
+            self.columns["box_y1"].append(y1)
+            self.columns["box_x2"].append(x2)
+            self.columns["box_y2"].append(y2)
+
+    def build(self):
+        dtypes = {**IMAGE_DTYPES, **BOX_DTYPES}
+        return {name: np.asarray(values, dtype=dtypes[name]) for name, values in self.columns.items()}
+
+
+def channel_path(channel_name, root=DETECTIONS_ROOT):
+    return os.path.join(root, f"{channel_name}.npz")
+
+
+def write_channel(channel_name, table, root=DETECTIONS_ROOT):
+    os.makedirs(root, exist_ok=True)
+    path = channel_path(channel_name, root)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez_compressed(tmp_path, **table)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_channel(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def date_root(day, root=DETECTIONS_ROOT):
+    """Store for one date partition (see the yolo_detections asset in pipeline.py)."""
+    return os.path.join(root, "by_date", day)
+
+
+def iter_channels(root=DETECTIONS_ROOT):
+    """Yield ``(channel_name, table)`` for every stored channel, then for every date-partition store.
+
+    Partition stores come in date order after the per-channel ones, so the
+    latest detection of a message is the last one seen.
+    """
+    paths = sorted(glob.glob(os.path.join(root, "*.npz")))
+    paths += sorted(glob.glob(os.path.join(date_root("*", root), "*.npz")))
+    for path in paths:
+        yield os.path.basename(path)[:-len(".npz")], read_channel(path)
+
+
+# -----------------------------
+# Vectorised categorisation
+# -----------------------------
+def classify_table(table, person_class_id, product_class_ids):
+    """Return ``(message_ids, categories, max_confidence)`` with one entry per image.
+
+    A single pass over the box columns: each box is mapped to its image row,
+    and person/product presence and max confidence are reduced per image
+    with bincount / maximum.at.
+    """
+    message_ids = table["image_message_id"]
+    count = len(message_ids)
+    order = np.argsort(message_ids, kind="stable")
+    rows = order[np.searchsorted(message_ids, table["box_message_id"], sorter=order)] \
+        if count else np.empty(0, dtype=np.int64)
+
+    classes = table["box_class_id"]
+    has_person = np.bincount(rows, weights=classes == person_class_id, minlength=count) > 0
+    has_product = np.bincount(rows, weights=np.isin(classes, product_class_ids), minlength=count) > 0
+
+    max_confidence = np.zeros(count, dtype=np.float32)
+    np.maximum.at(max_confidence, rows, table["box_confidence"])
+
+    # other=0, lifestyle=1, product_display=2, promotional=3
+    codes = has_person.astype(np.int8) + 2 * has_product.astype(np.int8)
+    return message_ids, CATEGORIES[codes], max_confidence
@@ -0,0 +1,260 @@
+# src/image_hash.py
+
+import os
+import sys
+import sqlite3
+import argparse
+import threading
+
+import cv2
+import numpy as np
+
+# -----------------------------
+# Settings
+# -----------------------------
+IMAGE_INDEX_PATH = os.path.join("data", "raw", "image_hashes.sqlite")
+SQLITE_TIMEOUT = 30  # seconds to wait for another process's write lock
+# dHash bits that may differ for two images to count as the same photo
+MAX_DISTANCE = int(os.getenv("IMAGE_DEDUP_MAX_DISTANCE", "6"))
+# Delete near-duplicate files after indexing them (only the canonical copy is kept).
+# Off by default: a false match (e.g. templated product shots) would lose the photo for good
+REMOVE_DUPLICATES = os.getenv("IMAGE_DEDUP_REMOVE", "false").lower() in ("1", "true", "yes")
+# Give near-duplicates their canonical image's YOLO result instead of a model pass of their own.
+# Files stay on disk, so turning this off and re-running detection undoes a false match
+REUSE_DETECTIONS = os.getenv("IMAGE_DEDUP_REUSE_DETECTIONS", "true").lower() in ("1", "true", "yes")
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    channel_name TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    dhash INTEGER NOT NULL,          -- signed 64-bit storage of the unsigned hash
+    canonical_path TEXT NOT NULL,    -- equals path for canonical images
+    distance INTEGER NOT NULL,
+    added_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS images_canonical_idx ON images (canonical_path);
+"""
+
+
+# -----------------------------
+# Hashing
+# -----------------------------
+def dhash(path, size=8):
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 grayscale thumbnail.
+
+    Survives re-encoding, resizing and light recompression, which is what
+    reposting a photo to another channel does to it.
+    """
+    image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    small = cv2.resize(image, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def _to_signed(value):
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+# -----------------------------
+# Multi-index hashing
+# -----------------------------
+class MultiIndexHash:
+    """In-memory Hamming-radius search over 64-bit hashes.
+
+    The hash is cut into ``radius + 1`` substrings, each with its own exact
+    lookup table. Two hashes within ``radius`` bits must agree exactly on at
+    least one substring (pigeonhole), so a query only verifies the entries
+    sharing a bucket with it instead of scanning everything. That keeps
+    lookups around a couple of milliseconds at 200k hashes. A BK-tree
+    degrades to near-linear scans on uniformly distributed hashes.
+    """
+
+    def __init__(self, radius=MAX_DISTANCE, bits=64):
+        self.radius = radius
+        parts = radius + 1
+        widths = [bits // parts + (1 if i < bits % parts else 0) for i in range(parts)]
+        self.chunks = []
+        offset = 0
+        for width in widths:
+            self.chunks.append((offset, (1 << width) - 1))
+            offset += width
+        self.tables = [{} for _ in self.chunks]
+        self.values = []
+        self.items = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value, item):
+        index = len(self.values)
+        self.values.append(value)
+        self.items.append(item)
+        for table, (offset, mask) in zip(self.tables, self.chunks):
+            table.setdefault((value >> offset) & mask, []).append(index)
+
+    def search(self, value, radius=None):
+        """Return ``[(distance, item), ...]`` within ``radius``, nearest first."""
+        radius = self.radius if radius is None else radius
+        if radius > self.radius:
+            # Outside the pigeonhole guarantee: verify every entry
+            candidates = range(len(self.values))
+        else:
+            candidates = {
+                index
+                for table, (offset, mask) in zip(self.tables, self.chunks)
+                for index in table.get((value >> offset) & mask, ())
+            }
+        found = []
+        for index in candidates:
+            distance = hamming(value, self.values[index])
+            if distance <= radius:
+                found.append((distance, self.items[index]))
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+# -----------------------------
+# Persistent index
+# -----------------------------
+class ImageHashIndex:
+    """dHash of every downloaded image, with near-duplicates mapped to one canonical file.
+
+    Hashes live in SQLite; canonical hashes are also held in a
+    ``MultiIndexHash`` so each new image is matched against all earlier ones
+    with one radius query.
+    Safe to call from the scraper's download workers (guarded by a lock).
+    """
+
+    def __init__(self, path=IMAGE_INDEX_PATH, max_distance=MAX_DISTANCE, remove_duplicates=REMOVE_DUPLICATES):
+        self.path = path
+        self.max_distance = max_distance
+        self.remove_duplicates = remove_duplicates
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=SQLITE_TIMEOUT, check_same_thread=False)
+        # Partition runs of a backfill share this file from several processes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA_SQL)
+        self._lock = threading.Lock()
+        self.canonical_hashes = MultiIndexHash(max_distance)
+        for image_path, value in self.conn.execute("SELECT path, dhash FROM images WHERE path = canonical_path"):
+            self.canonical_hashes.add(_to_unsigned(value), image_path)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def canonical(self, path):
+        """Canonical path for an already indexed image, or None if unknown."""
+        with self._lock:
+            row = self.conn.execute("SELECT canonical_path FROM images WHERE path = ?", (str(path),)).fetchone()
+        return row[0] if row else None
+
+    def find(self, value, max_distance=None):
+        """Canonical images within ``max_distance`` bits of hash ``value``: ``[(distance, path)]``."""
+        with self._lock:
+            return self.canonical_hashes.search(value, self.max_distance if max_distance is None else max_distance)
+
+    def add(self, path, channel_name, message_id):
+        """Index a downloaded image and return the path whose content should be used for it."""
+        path = str(path)
+        known = self.canonical(path)
+        if known is not None:
+            return known
+        value = dhash(path)  # decode outside the lock so workers hash in parallel
+        if value is None:
+            return path
+        with self._lock:
+            matches = self.canonical_hashes.search(value, self.max_distance)
+            canonical, distance = (matches[0][1], matches[0][0]) if matches else (path, 0)
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO images (path, channel_name, message_id, dhash, canonical_path, distance) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, channel_name, int(message_id), _to_signed(value), canonical, distance),
+                )
+            if canonical == path:
+                self.canonical_hashes.add(value, path)
+            elif self.remove_duplicates and os.path.exists(path):
+                os.remove(path)
+        return canonical
+
+    def duplicates(self):
+        """Yield ``(channel_name, message_id, canonical_path, distance)`` for every non-canonical image."""
+        yield from self.conn.execute(
+            "SELECT channel_name, message_id, canonical_path, distance FROM images WHERE path != canonical_path"
+        )
+
+    def clusters(self):
+        """Yield ``(channel_name, message_id, canonical_channel, canonical_message_id, distance)`` rows."""
+        yield from self.conn.execute("""
+            SELECT i.channel_name, i.message_id, c.channel_name, c.message_id, i.distance
+            FROM images i
+            JOIN images c ON c.path = i.canonical_path
+            ORDER BY c.channel_name, c.message_id, i.channel_name, i.message_id
+        """)
+
+    def stats(self):
+        total, canonical = self.conn.execute(
+            "SELECT count(*), sum(path = canonical_path) FROM images"
+        ).fetchone()
+        return {"images": total, "canonical": canonical or 0, "duplicates": total - (canonical or 0)}
+
+
+def build_index(image_root, index_path=IMAGE_INDEX_PATH, max_distance=MAX_DISTANCE, remove_duplicates=False):
+    """Index images already on disk (e.g. downloaded before the index existed)."""
+    from yolo_detect import iter_images
+
+    with ImageHashIndex(index_path, max_distance, remove_duplicates) as index:
+        for channel_name, message_id, path in iter_images(image_root):
+            index.add(path, channel_name, message_id)
+        return index.stats()
+
+
+# -----------------------------
+# Lookup CLI
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Perceptual-hash index of downloaded images")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="index every image under --image-root")
+    build.add_argument("--image-root", default=os.path.join("data", "raw", "images"))
+    build.add_argument("--remove-duplicates", action="store_true")
+    lookup = sub.add_parser("lookup", help="list indexed images that look like IMAGE")
+    lookup.add_argument("image")
+    sub.add_parser("stats")
+    parser.add_argument("--index", default=IMAGE_INDEX_PATH)
+    parser.add_argument("--max-distance", type=int, default=MAX_DISTANCE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(build_index(args.image_root, args.index, args.max_distance, args.remove_duplicates))
+        return
+    with ImageHashIndex(args.index, args.max_distance, remove_duplicates=False) as index:
+        if args.command == "stats":
+            print(index.stats())
+            return
+        value = dhash(args.image)
+        if value is None:
+            sys.exit(f"Cannot read image {args.image}")
+        for distance, path in index.find(value):
+            print(f"{distance}\t{path}")
+
+
+if __name__ == "__main__":
+    main()
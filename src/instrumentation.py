@@ -0,0 +1,279 @@
+# src/instrumentation.py
+
+import os
+import sys
+import json
+import time
+import atexit
+import inspect
+import cProfile
+import functools
+import threading
+import contextlib
+from datetime import datetime, timezone
+
+# -----------------------------
+# Settings
+# -----------------------------
+# Append a JSON snapshot of every metric to this file when the process exits
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH")
+# Write Prometheus text format here on exit (e.g. for node_exporter's textfile collector)
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH")
+# "cprofile" or "pyinstrument" (sampling, optional dependency); unset disables profiling
+PROFILE = os.getenv("PROFILE", "").lower()
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("data", "profiles"))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram, rendered in Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum_s": round(self.total, 6),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    """Process-wide counters, gauges and latency histograms shared by every component."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.descriptions = {}
+
+    def describe(self, name, text):
+        """Set the ``# HELP`` text rendered for metric family ``name``."""
+        self.descriptions[name] = text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def timer(self, name, **labels):
+        """Context manager and decorator (sync or async) recording elapsed seconds into ``name``."""
+        return _Timer(self, name, labels)
+
+    def scope(self):
+        return MetricsScope(self)
+
+    def as_dict(self, gauges=None):
+        with self._lock:
+            return {
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self.counters.items())],
+                "histograms": [{"name": n, "labels": dict(l), **h.as_dict()} for (n, l), h in sorted(self.histograms.items())],
+                "gauges": {**{_key(n, l): v for (n, l), v in sorted(self.gauges.items())}, **(gauges or {})},
+            }
+
+    def render_prometheus(self, gauges=None):
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            # One HELP/TYPE pair per family, ahead of its first sample
+            if name in seen:
+                return
+            seen.add(name)
+            lines.append(f"# HELP {name} {self.descriptions.get(name, name.replace('_', ' '))}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                header(name, "counter")
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                header(name, "gauge")
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                header(name, "histogram")
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {h.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {h.total:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {h.count}")
+        for name, value in sorted((gauges or {}).items()):
+            header(name, "gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _snapshot(self):
+        with self._lock:
+            return (
+                dict(self.counters),
+                {key: (h.count, h.total) for key, h in self.histograms.items()},
+                dict(self.gauges),
+            )
+
+
+class MetricsScope:
+    """Metrics recorded between creation and ``metadata()``, e.g. during one Dagster op."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self._counters, self._histograms, _ = metrics._snapshot()
+
+    def metadata(self):
+        """Flat ``{metric{labels}: value}`` of counter deltas, timer counts/totals and current gauges."""
+        counters, histograms, gauges = self.metrics._snapshot()
+        result = {}
+        for key, value in counters.items():
+            delta = value - self._counters.get(key, 0)
+            if delta:
+                result[_key(*key)] = delta
+        for key, (count, total) in histograms.items():
+            before_count, before_total = self._histograms.get(key, (0, 0.0))
+            if count > before_count:
+                result[_key(*key) + "_count"] = count - before_count
+                result[_key(*key) + "_sum_s"] = round(total - before_total, 3)
+        for key, value in gauges.items():
+            result[_key(*key)] = value
+        return result
+
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, self.elapsed, **self.labels)
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _Timer(self.metrics, self.name, self.labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.metrics, self.name, self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def _key(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+metrics = Metrics()
+
+# -----------------------------
+# Profiling hook
+# -----------------------------
+@contextlib.contextmanager
+def profile(name):
+    """Profile the enclosed block when PROFILE is set; a no-op otherwise.
+
+    PROFILE=cprofile writes ``<PROFILE_DIR>/<name>-<timestamp>.prof`` (open it
+    with snakeviz or pstats). PROFILE=pyinstrument writes a sampling profile
+    as HTML, with far lower overhead on tight loops.
+    """
+    if PROFILE not in ("cprofile", "pyinstrument"):
+        yield
+        return
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(PROFILE_DIR, f"{name}-{stamp}-{os.getpid()}")
+
+    if PROFILE == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("PROFILE=pyinstrument needs the 'pyinstrument' package; profiling disabled", file=sys.stderr)
+            yield
+            return
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path + ".html", "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path + ".prof")
+
+
+# -----------------------------
+# Exporters
+# -----------------------------
+def write_metrics(json_path=METRICS_JSON_PATH, prom_path=METRICS_PROM_PATH):
+    """Append a JSON snapshot and/or rewrite a Prometheus text file."""
+    if json_path:
+        os.makedirs(os.path.dirname(json_path) or ".", exist_ok=True)
+        snapshot = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "pid": os.getpid(),
+            "argv": sys.argv,
+            **metrics.as_dict(),
+        }
+        with open(json_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot) + "\n")
+    if prom_path:
+        os.makedirs(os.path.dirname(prom_path) or ".", exist_ok=True)
+        tmp_path = f"{prom_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(metrics.render_prometheus())
+        os.replace(tmp_path, prom_path)
+
+
+if METRICS_JSON_PATH or METRICS_PROM_PATH:
+    atexit.register(write_metrics)
@@ -1,9 +1,16 @@
 import os
-import json
-import glob
+import io
+import csv
+import time
+import hashlib
+import argparse
+from itertools import islice
 import pandas as pd
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
+from raw_store import RAW_DATA_PATH, iter_raw_files, iter_records, read_records
+from instrumentation import metrics, profile
+import partitions
 
 # Load environment variables
 load_dotenv()
@@ -15,31 +22,333 @@ DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 DB_NAME = os.getenv("POSTGRES_DB")
 
 engine = create_engine(
-    f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 )
 
-RAW_DATA_PATH = "data/raw/telegram_messages"
+CHUNK_SIZE = int(os.getenv("RAW_LOAD_CHUNK_SIZE", "10000"))
 
-def load_json_to_postgres():
-    all_files = glob.glob(f"{RAW_DATA_PATH}/**/*.json", recursive=True)
-    records = []
+RAW_COLUMNS = [
+    "message_id",
+    "channel_name",
+    "message_date",
+    "message_text",
+    "has_media",
+    "image_path",
+    "views",
+    "forwards",
+]
 
-    for file in all_files:
-        with open(file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            records.extend(data)
+# -----------------------------
+# Schema for the incremental loader
+# -----------------------------
+SCHEMA_SQL = """
+CREATE SCHEMA IF NOT EXISTS raw;
 
-    df = pd.DataFrame(records)
+CREATE TABLE IF NOT EXISTS raw.ingested_files (
+    path TEXT PRIMARY KEY,
+    size_bytes BIGINT NOT NULL,
+    mtime_ns BIGINT NOT NULL,
+    sha256 TEXT NOT NULL,
+    row_count BIGINT NOT NULL,
+    ingested_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
 
-    df.to_sql(
-        "telegram_messages",
-        engine,
-        schema="raw",
-        if_exists="replace",
-        index=False
+RAW_TABLE = "raw.telegram_messages"
+PARTITION_COLUMN = "message_date"
+
+# Range-partitioned by message month (see partitions.py). Unique keys on a
+# partitioned table must include the partition key; a message's date never
+# changes, so (channel_name, message_id, message_date) is still one row per message.
+TABLE_SQL = """
+CREATE TABLE raw.telegram_messages (
+    message_id BIGINT NOT NULL,
+    channel_name TEXT NOT NULL,
+    message_date TIMESTAMPTZ NOT NULL,
+    message_text TEXT,
+    has_media BOOLEAN,
+    image_path TEXT,
+    views BIGINT,
+    forwards BIGINT,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+) PARTITION BY RANGE (message_date);
+
+CREATE UNIQUE INDEX telegram_messages_key_uidx
+    ON raw.telegram_messages (channel_name, message_id, message_date);
+-- stg_telegram_messages reads new and changed rows by load time
+CREATE INDEX telegram_messages_loaded_at_idx ON raw.telegram_messages (loaded_at);
+"""
+
+# Rows from a table written by an earlier loader (pandas to_sql types, possible repeats)
+MIGRATE_SQL = """
+INSERT INTO raw.telegram_messages ({columns}, loaded_at)
+SELECT DISTINCT ON (channel_name, message_id)
+    message_id::bigint, channel_name, message_date::timestamptz, message_text,
+    has_media::boolean, image_path, views::bigint, forwards::bigint, loaded_at
+FROM {{old}}
+WHERE message_date IS NOT NULL
+ORDER BY channel_name, message_id, ctid DESC
+""".format(columns=", ".join(RAW_COLUMNS))
+
+COLUMN_LIST = ", ".join(RAW_COLUMNS)
+COPY_NULL = "\\N"
+
+MERGE_SQL = f"""
+INSERT INTO raw.telegram_messages AS t ({COLUMN_LIST})
+SELECT DISTINCT ON (channel_name, message_id, message_date) {COLUMN_LIST}
+FROM stage_telegram_messages
+ORDER BY channel_name, message_id, message_date
+ON CONFLICT (channel_name, message_id, message_date) DO UPDATE SET
+    message_text = EXCLUDED.message_text,
+    has_media = EXCLUDED.has_media,
+    image_path = COALESCE(EXCLUDED.image_path, t.image_path),
+    views = EXCLUDED.views,
+    forwards = EXCLUDED.forwards,
+    loaded_at = now()
+WHERE (t.message_text, t.views, t.forwards, t.image_path)
+    IS DISTINCT FROM (EXCLUDED.message_text, EXCLUDED.views, EXCLUDED.forwards,
+                      COALESCE(EXCLUDED.image_path, t.image_path))
+"""
+
+
+def iter_chunks(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# -----------------------------
+# Legacy loader: pandas to_sql, full replace
+# -----------------------------
+def load_json_to_postgres(root=RAW_DATA_PATH, chunk_size=CHUNK_SIZE):
+    # Raw files (.json, .jsonl, .jsonl.gz, .jsonl.zst) are read lazily,
+    # so only one chunk of records is held in memory at a time
+    total = 0
+    for i, chunk in enumerate(iter_chunks(iter_records(root), chunk_size)):
+        df = pd.DataFrame(chunk)
+        df.to_sql(
+            "telegram_messages",
+            engine,
+            schema="raw",
+            if_exists="replace" if i == 0 else "append",
+            index=False
+        )
+        total += len(df)
+
+    if total:
+        # The dbt models pick up changes by this timestamp
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "ALTER TABLE raw.telegram_messages "
+                "ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()"
+            )
+
+    print(f"Loaded {total} records into raw.telegram_messages")
+    return total
+
+
+# -----------------------------
+# Incremental loader: COPY + upsert
+# -----------------------------
+def ensure_schema(cur):
+    cur.execute(SCHEMA_SQL)
+    kind = partitions.relkind(cur, RAW_TABLE)
+    if kind == "p":
+        require_message_date(cur)
+        return
+    if kind is None:
+        cur.execute(TABLE_SQL)
+        partitions.ensure_default_partition(cur, RAW_TABLE)
+        return
+    # A plain table from the replace loader or an earlier version of this one
+    cur.execute(
+        "ALTER TABLE raw.telegram_messages "
+        "ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()"
     )
+    cur.execute("DROP INDEX IF EXISTS raw.telegram_messages_channel_message_uidx")
+    partitions.convert_to_partitioned(cur, RAW_TABLE, PARTITION_COLUMN, "timestamptz", TABLE_SQL, MIGRATE_SQL)
+
+
+def require_message_date(cur):
+    """Make message_date NOT NULL on a table partitioned before it was.
+
+    message_date is part of the conflict key and a NULL never conflicts, so
+    undated rows were inserted again on every reload. They cannot be keyed
+    or placed in a month, so they are dropped; the raw files still hold them.
+    """
+    cur.execute("""
+        SELECT is_nullable FROM information_schema.columns
+        WHERE table_schema = 'raw' AND table_name = 'telegram_messages' AND column_name = 'message_date'
+    """)
+    row = cur.fetchone()
+    if not row or row[0] != "YES":
+        return
+    cur.execute("DELETE FROM raw.telegram_messages WHERE message_date IS NULL")
+    if cur.rowcount:
+        print(f"Dropped {cur.rowcount} raw.telegram_messages rows without a message_date")
+    cur.execute("ALTER TABLE raw.telegram_messages ALTER COLUMN message_date SET NOT NULL")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def needs_ingest(cur, path, stat):
+    """Return the file hash if ``path`` is new or changed, else None."""
+    cur.execute("SELECT size_bytes, mtime_ns, sha256 FROM raw.ingested_files WHERE path = %s", (path,))
+    row = cur.fetchone()
+    if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+        return None
+    sha256 = file_sha256(path)
+    if row and row[2] == sha256:
+        # Touched but identical: remember the new mtime and skip
+        cur.execute(
+            "UPDATE raw.ingested_files SET mtime_ns = %s WHERE path = %s",
+            (stat.st_mtime_ns, path),
+        )
+        return None
+    return sha256
+
+
+def records_to_csv(records):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in records:
+        text = r.get("message_text")
+        row = [
+            r.get("message_id"),
+            r.get("channel_name"),
+            r.get("message_date"),
+            text.replace("\x00", "") if text else text,
+            r.get("has_media"),
+            r.get("image_path"),
+            r.get("views"),
+            r.get("forwards"),
+        ]
+        # \N marks NULL so that empty message text stays an empty string
+        writer.writerow([COPY_NULL if v is None else v for v in row])
+    buf.seek(0)
+    return buf
+
+
+def create_stage(cur):
+    cur.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS stage_telegram_messages "
+        "(LIKE raw.telegram_messages INCLUDING DEFAULTS)"
+    )
+
+
+def upsert_records(cur, records, chunk_size=CHUNK_SIZE):
+    """COPY records into the staging table chunk by chunk and merge each chunk."""
+    copied = upserted = rejected = 0
+    for chunk in iter_chunks(records, chunk_size):
+        # message_date is part of the key (and NOT NULL): an undated record cannot be merged
+        dated = [r for r in chunk if r.get("message_date")]
+        rejected += len(chunk) - len(dated)
+        chunk = dated
+        if not chunk:
+            continue
+        with metrics.timer("loader_csv_seconds", table="telegram_messages"):
+            buf = records_to_csv(chunk)
+        with metrics.timer("loader_copy_seconds", table="telegram_messages"):
+            cur.copy_expert(
+                f"COPY stage_telegram_messages ({COLUMN_LIST}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buf,
+            )
+        with metrics.timer("loader_merge_seconds", table="telegram_messages"):
+            # New months get their partition before the rows arrive, so nothing lands in the default
+            partitions.ensure_months(cur, RAW_TABLE, PARTITION_COLUMN, "timestamptz", "stage_telegram_messages")
+            cur.execute(MERGE_SQL)
+        upserted += cur.rowcount
+        cur.execute("TRUNCATE stage_telegram_messages")
+        copied += len(chunk)
+    metrics.inc("loader_rows_copied_total", copied, table="telegram_messages")
+    metrics.inc("loader_rows_upserted_total", upserted, table="telegram_messages")
+    if rejected:
+        metrics.inc("loader_rows_rejected_total", rejected, table="telegram_messages")
+        print(f"Skipped {rejected} raw messages without a message_date")
+    return copied, upserted
+
+
+def load_incremental(root=RAW_DATA_PATH, chunk_size=CHUNK_SIZE, force=False, day=None, channel_name=None):
+    """Stream new or changed raw files into raw.telegram_messages with COPY.
+
+    Each file is loaded in its own transaction and recorded in
+    raw.ingested_files, so re-running only touches files that changed.
+    ``day`` and ``channel_name`` restrict the load to one date directory
+    and/or channel.
+    """
+    start = time.perf_counter()
+    stats = {"files_seen": 0, "files_loaded": 0, "rows_copied": 0, "rows_upserted": 0}
+
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        ensure_schema(cur)
+        create_stage(cur)
+        conn.commit()
+
+        for path in iter_raw_files(root, day, channel_name):
+            stats["files_seen"] += 1
+            stat = os.stat(path)
+            sha256 = file_sha256(path) if force else needs_ingest(cur, path, stat)
+            if sha256 is None:
+                conn.commit()
+                metrics.inc("loader_files_total", status="unchanged")
+                continue
+
+            copied, upserted = upsert_records(cur, read_records(path), chunk_size)
+            cur.execute("""
+                INSERT INTO raw.ingested_files (path, size_bytes, mtime_ns, sha256, row_count)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (path) DO UPDATE SET
+                    size_bytes = EXCLUDED.size_bytes,
+                    mtime_ns = EXCLUDED.mtime_ns,
+                    sha256 = EXCLUDED.sha256,
+                    row_count = EXCLUDED.row_count,
+                    ingested_at = now()
+            """, (path, stat.st_size, stat.st_mtime_ns, sha256, copied))
+            conn.commit()
+
+            metrics.inc("loader_files_total", status="loaded")
+            metrics.inc("loader_bytes_total", stat.st_size, table="telegram_messages")
+            stats["files_loaded"] += 1
+            stats["rows_copied"] += copied
+            stats["rows_upserted"] += upserted
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    stats["duration_s"] = round(time.perf_counter() - start, 3)
+    print(
+        f"Loaded {stats['files_loaded']}/{stats['files_seen']} files | "
+        f"{stats['rows_copied']} rows copied, {stats['rows_upserted']} inserted or updated "
+        f"in raw.telegram_messages"
+    )
+    return stats
 
-    print(f"Loaded {len(df)} records into raw.telegram_messages")
 
 if __name__ == "__main__":
-    load_json_to_postgres()
+    parser = argparse.ArgumentParser(description="Load raw Telegram messages into Postgres")
+    parser.add_argument("--mode", choices=["copy", "replace"], default="copy",
+                        help="copy: incremental COPY + upsert (default); replace: rebuild with pandas to_sql")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--force", action="store_true", help="reload files already recorded as ingested")
+    parser.add_argument("--root", default=RAW_DATA_PATH)
+    args = parser.parse_args()
+
+    with profile("load_raw_to_postgres"):
+        if args.mode == "copy":
+            load_incremental(args.root, args.chunk_size, args.force)
+        else:
+            load_json_to_postgres(args.root, args.chunk_size)
@@ -0,0 +1,246 @@
+# src/partitions.py
+
+import os
+import re
+import gzip
+import argparse
+
+# -----------------------------
+# Partitioned tables
+# -----------------------------
+# Each table is range-partitioned by message month on ``column``:
+#   "timestamptz" columns get bounds like '2024-01-01 00:00:00+00' (UTC months),
+#   "date_key" columns (YYYYMMDD ints, see macros/keys.sql) get 20240101.
+# Monthly partitions are named <table>_pYYYYMM; <table>_default catches rows
+# for months that have no partition yet. raw.telegram_messages is maintained
+# by the raw loader, the facts by the partition_by_month dbt post-hook.
+PARTITIONED_TABLES = {
+    "raw.telegram_messages": ("message_date", "timestamptz"),
+    "analytics.fct_messages": ("date_key", "date_key"),
+    "analytics.fct_image_detections": ("date_key", "date_key"),
+}
+
+ARCHIVE_SCHEMA = "archive"
+ARCHIVE_DIR = os.path.join("data", "archive")
+
+PARTITION_NAME = re.compile(r"_p(\d{6})$")
+
+
+def split_name(table):
+    schema, _, name = table.rpartition(".")
+    return schema or "public", name
+
+
+def month_bounds(month, kind):
+    """SQL literals bounding month ``YYYYMM`` (an int): ``(from, to)``."""
+    year, mon = divmod(month, 100)
+    next_year, next_mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    if kind == "date_key":
+        return str(year * 10000 + mon * 100 + 1), str(next_year * 10000 + next_mon * 100 + 1)
+    return f"'{year:04d}-{mon:02d}-01 00:00:00+00'", f"'{next_year:04d}-{next_mon:02d}-01 00:00:00+00'"
+
+
+def month_expr(column, kind):
+    """SQL expression giving the YYYYMM month of ``column``."""
+    if kind == "date_key":
+        return f"({column} / 100)"
+    return f"to_char({column} AT TIME ZONE 'UTC', 'YYYYMM')::int"
+
+
+def relkind(cur, table):
+    """'p' for a partitioned table, 'r' for a plain one, None if it doesn't exist."""
+    schema, name = split_name(table)
+    cur.execute(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = %s AND c.relname = %s",
+        (schema, name),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def list_partitions(cur, table):
+    """``[(partition_name, bound_expression, estimated_rows, total_bytes)]`` attached to ``table``."""
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint, pg_total_relation_size(c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+    """, (table,))
+    return cur.fetchall()
+
+
+def attached_months(cur, table):
+    months = set()
+    for name, *_ in list_partitions(cur, table):
+        match = PARTITION_NAME.search(name)
+        if match:
+            months.add(int(match.group(1)))
+    return months
+
+
+def ensure_default_partition(cur, table):
+    schema, name = split_name(table)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {schema}.{name}_default PARTITION OF {table} DEFAULT")
+
+
+def create_month_partition(cur, table, column, kind, month):
+    """Attach a partition for ``month``, moving any of its rows out of the default partition.
+
+    The partition is built as a plain table and attached afterwards, which
+    works even when the default partition already holds rows for the month.
+    """
+    schema, name = split_name(table)
+    partition = f"{schema}.{name}_p{month}"
+    low, high = month_bounds(month, kind)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {partition} (LIKE {table} INCLUDING DEFAULTS)")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {schema}.{name}_default
+            WHERE {column} >= {low} AND {column} < {high}
+            RETURNING *
+        )
+        INSERT INTO {partition} SELECT * FROM moved
+    """)
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES FROM ({low}) TO ({high})")
+    return partition
+
+
+def ensure_months(cur, table, column, kind, source):
+    """Create partitions for every month present in ``source`` (e.g. a staging table)."""
+    cur.execute(
+        f"SELECT DISTINCT {month_expr(column, kind)} FROM {source} WHERE {column} IS NOT NULL"
+    )
+    wanted = {row[0] for row in cur.fetchall()}
+    if not wanted - attached_months(cur, table):
+        return []
+    # Concurrent loaders (a backfill, the stream loader) may want the same new month.
+    # The lock is held until the caller commits; whoever waited re-checks and finds it attached.
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (table,))
+    created = []
+    for month in sorted(wanted - attached_months(cur, table)):
+        created.append(create_month_partition(cur, table, column, kind, month))
+    return created
+
+
+def drain_default(cur, table, column, kind):
+    """Move rows parked in the default partition into monthly partitions."""
+    schema, name = split_name(table)
+    return ensure_months(cur, table, column, kind, f"{schema}.{name}_default")
+
+
+def convert_to_partitioned(cur, table, column, kind, create_sql, insert_sql):
+    """Rebuild a plain ``table`` as a month-partitioned one, copying its rows across.
+
+    ``create_sql`` creates the partitioned parent (with its indexes);
+    ``insert_sql`` copies rows from ``{old}``, the renamed plain table.
+    """
+    schema, name = split_name(table)
+    old = f"{schema}.{name}_unpartitioned"
+    cur.execute(f"ALTER TABLE {table} RENAME TO {name}_unpartitioned")
+    cur.execute(create_sql)
+    ensure_default_partition(cur, table)
+    ensure_months(cur, table, column, kind, old)
+    cur.execute(insert_sql.format(old=old))
+    cur.execute(f"DROP TABLE {old}")
+
+# -----------------------------
+# Detach / archive
+# -----------------------------
+def partitions_before(cur, table, before):
+    """Attached monthly partitions of ``table`` for months earlier than ``before`` (YYYYMM)."""
+    schema, name = split_name(table)
+    return [(f"{schema}.{name}_p{month}", month) for month in sorted(attached_months(cur, table)) if month < before]
+
+
+def detach_partition(cur, table, partition):
+    """Detach ``partition`` and park it in the archive schema; queries on ``table`` stop seeing it."""
+    cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {partition}")
+    cur.execute(f"ALTER TABLE {partition} SET SCHEMA {ARCHIVE_SCHEMA}")
+    return f"{ARCHIVE_SCHEMA}.{split_name(partition)[1]}"
+
+
+def export_partition(cur, archived, archive_dir=ARCHIVE_DIR):
+    """COPY a detached partition to ``<archive_dir>/<schema.table>.csv.gz`` (with header)."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{archived}.csv.gz")
+    with gzip.open(path, "wb") as f:
+        cur.copy_expert(f"COPY {archived} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+    return path
+
+
+def attach_archived(cur, table, month):
+    """Move an archived partition back under ``table``."""
+    column, kind = PARTITIONED_TABLES[table]
+    schema, name = split_name(table)
+    low, high = month_bounds(month, kind)
+    cur.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.{name}_p{month} SET SCHEMA {schema}")
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {schema}.{name}_p{month} FOR VALUES FROM ({low}) TO ({high})")
+
+
+def archive(conn, table, before, export=False, drop=False, archive_dir=ARCHIVE_DIR):
+    """Detach every partition of ``table`` older than ``before``; optionally export and drop them.
+
+    Each partition is handled in its own transaction, so an interrupted run
+    leaves every month either attached or fully archived.
+    """
+    done = []
+    with conn.cursor() as cur:
+        for partition, month in partitions_before(cur, table, before):
+            archived = detach_partition(cur, table, partition)
+            entry = {"partition": archived, "month": month}
+            if export:
+                entry["file"] = export_partition(cur, archived, archive_dir)
+            if drop:
+                cur.execute(f"DROP TABLE {archived}")
+                entry["dropped"] = True
+            conn.commit()
+            done.append(entry)
+    return done
+
+
+def main():
+    from load_raw_to_postgres import engine
+
+    parser = argparse.ArgumentParser(description="Manage month partitions of the raw and fact tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for command in ("list", "split-default"):
+        p = sub.add_parser(command)
+        p.add_argument("table", choices=list(PARTITIONED_TABLES))
+    p = sub.add_parser("archive", help="detach partitions older than --before into the archive schema")
+    p.add_argument("table", choices=list(PARTITIONED_TABLES))
+    p.add_argument("--before", type=int, required=True, help="first month to keep, as YYYYMM")
+    p.add_argument("--export", action="store_true", help=f"also write each partition to {ARCHIVE_DIR}/*.csv.gz")
+    p.add_argument("--drop", action="store_true", help="drop archived partitions (use with --export)")
+    p.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    p = sub.add_parser("attach", help="re-attach an archived month")
+    p.add_argument("table", choices=list(PARTITIONED_TABLES))
+    p.add_argument("month", type=int, help="YYYYMM")
+    args = parser.parse_args()
+    if args.command == "archive" and args.drop and not args.export:
+        parser.error("--drop deletes the archived rows; pass --export to keep a copy")
+
+    conn = engine.raw_connection()
+    try:
+        if args.command == "archive":
+            for entry in archive(conn, args.table, args.before, args.export, args.drop, args.archive_dir):
+                print(entry)
+            return
+        with conn.cursor() as cur:
+            if args.command == "list":
+                for name, bound, rows, size in list_partitions(cur, args.table):
+                    print(f"{name}\t{bound}\t~{rows} rows\t{size / 1e6:.1f} MB")
+            elif args.command == "split-default":
+                column, kind = PARTITIONED_TABLES[args.table]
+                print(drain_default(cur, args.table, column, kind))
+            else:
+                attach_archived(cur, args.table, args.month)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+# src/product_extraction.py
+"""Product and price mentions extracted from raw.telegram_messages.
+
+Every alias in the curated dictionary (medical_warehouse/seeds/
+product_dictionary.csv, also loaded by ``dbt seed``) is compiled into one
+Aho-Corasick automaton over word tokens. Each message is tokenised once and
+walked through the automaton, so a scan costs the same for ten aliases or
+ten thousand, with no per-term ILIKE. Matches are whole words, and the
+longest alias wins ("vitamin b complex" over "vitamin"). A price in birr
+("350 birr", "ETB 1,200", "ብር 90") right after a mention is attached to it.
+
+Mentions go to raw.product_mentions; dbt builds fct_product_mentions from
+there. Runs are incremental: only messages loaded since the last scan
+(minus a lookback) are read. Changing the dictionary triggers a full rescan.
+
+    python src/product_extraction.py
+    python src/product_extraction.py --text "Panadol 500mg 120 birr, vitamin c 250 br"
+"""
+
+import io
+import os
+import re
+import csv
+import time
+import hashlib
+import argparse
+from collections import deque
+
+from dotenv import load_dotenv
+
+from instrumentation import metrics, profile
+
+load_dotenv()
+DICTIONARY_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "medical_warehouse", "seeds", "product_dictionary.csv"
+)
+BATCH_SIZE = int(os.getenv("PRODUCT_EXTRACT_BATCH_SIZE", "20000"))
+WATERMARK_LOOKBACK = "1 hour"  # same as the dbt var: covers loader transactions still open at scan time
+MAX_PRICE_GAP = 40  # characters between the end of a mention and its price
+EXTRACTOR = "product_mentions"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+PRICE_PATTERN = re.compile(
+    rf"\b(?:birr|br|etb)\.?\s*(?P<before>{NUMBER})"
+    rf"|(?P<after>{NUMBER})\s*(?:birr\b|br\b|etb\b|ብር)"
+    rf"|ብር\s*(?P<amharic>{NUMBER})",
+    re.IGNORECASE,
+)
+
+# -----------------------------
+# Matcher
+# -----------------------------
+class ProductMatcher:
+    """Aho-Corasick automaton whose alphabet is lower-cased word tokens."""
+
+    def __init__(self, entries):
+        """``entries``: ``(alias, product_name, category)`` tuples."""
+        self.entries = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for alias, product_name, category in entries:
+            tokens = TOKEN_PATTERN.findall(alias.lower())
+            if not tokens:
+                continue
+            state = 0
+            for token in tokens:
+                if token not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][token] = len(self.goto) - 1
+                state = self.goto[state][token]
+            self.output[state].append(len(self.entries))
+            self.entries.append((len(tokens), alias.lower(), product_name, category))
+        self._link()
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(token, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def find(self, text):
+        """Leftmost-longest, non-overlapping ``(start, end, alias, product_name, category)`` in ``text``."""
+        tokens = list(TOKEN_PATTERN.finditer(text.lower()))
+        found = []
+        state = 0
+        for i, token in enumerate(tokens):
+            word = token.group()
+            while state and word not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(word, 0)
+            for index in self.output[state]:
+                length = self.entries[index][0]
+                found.append((i - length + 1, i, index))
+        found.sort(key=lambda m: (m[0], m[0] - m[1]))
+        matches = []
+        next_free = 0
+        for first, last, index in found:
+            if first < next_free:
+                continue
+            _, alias, product_name, category = self.entries[index]
+            matches.append((tokens[first].start(), tokens[last].end(), alias, product_name, category))
+            next_free = last + 1
+        return matches
+
+
+def find_prices(text):
+    """``(start, amount)`` for every birr amount in ``text``."""
+    prices = []
+    for match in PRICE_PATTERN.finditer(text):
+        amount = match.group("before") or match.group("after") or match.group("amharic")
+        prices.append((match.start(), float(amount.replace(",", ""))))
+    return prices
+
+
+def extract(matcher, text):
+    """``[(mention_index, char_offset, alias, product_name, category, price_birr)]`` for one message.
+
+    A mention takes the first price that starts within ``MAX_PRICE_GAP``
+    characters after it and before the next mention.
+    """
+    if not text:
+        return []
+    mentions = matcher.find(text)
+    if not mentions:
+        return []
+    prices = find_prices(text)
+    rows = []
+    for i, (start, end, alias, product_name, category) in enumerate(mentions):
+        limit = mentions[i + 1][0] if i + 1 < len(mentions) else len(text)
+        price = next((amount for at, amount in prices if end <= at < limit and at - end <= MAX_PRICE_GAP), None)
+        rows.append((i, start, alias, product_name, category, price))
+    return rows
+
+
+def read_dictionary(path=DICTIONARY_PATH):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["alias"], row["product_name"], row["category"]) for row in csv.DictReader(f)]
+
+
+def load_matcher(path=DICTIONARY_PATH):
+    """The matcher for ``path`` and the file's SHA-256 (a changed dictionary means a full rescan)."""
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return ProductMatcher(read_dictionary(path)), digest
+
+# -----------------------------
+# Incremental extraction
+# -----------------------------
+COLUMNS = [
+    "channel_name", "message_id", "mention_index", "message_date",
+    "product_name", "category", "matched_alias", "char_offset", "price_birr",
+]
+COLUMN_LIST = ", ".join(COLUMNS)
+
+SCHEMA_SQL = """
+CREATE SCHEMA IF NOT EXISTS raw;
+
+CREATE TABLE IF NOT EXISTS raw.product_mentions (
+    channel_name TEXT NOT NULL,
+    message_id BIGINT NOT NULL,
+    mention_index SMALLINT NOT NULL,
+    message_date TIMESTAMPTZ,
+    product_name TEXT NOT NULL,
+    category TEXT,
+    matched_alias TEXT NOT NULL,
+    char_offset INT NOT NULL,
+    price_birr NUMERIC(12, 2),
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (channel_name, message_id, mention_index)
+);
+
+CREATE INDEX IF NOT EXISTS product_mentions_loaded_at_idx ON raw.product_mentions (loaded_at);
+
+-- Scan watermark per extractor; a new dictionary hash forces a rescan
+CREATE TABLE IF NOT EXISTS raw.extraction_state (
+    extractor TEXT PRIMARY KEY,
+    dictionary_sha256 TEXT NOT NULL,
+    scanned_through TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+STAGE_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS stage_product_mentions
+    (LIKE raw.product_mentions INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS stage_scanned_messages
+    (channel_name TEXT, message_id BIGINT) ON COMMIT DELETE ROWS;
+"""
+
+# Mentions a rescanned message no longer has
+DELETE_STALE_SQL = """
+DELETE FROM raw.product_mentions p
+USING stage_scanned_messages s
+WHERE p.channel_name = s.channel_name
+  AND p.message_id = s.message_id
+  AND NOT EXISTS (
+      SELECT 1 FROM stage_product_mentions m
+      WHERE m.channel_name = p.channel_name
+        AND m.message_id = p.message_id
+        AND m.mention_index = p.mention_index
+  )
+"""
+
+MERGE_SQL = f"""
+INSERT INTO raw.product_mentions AS t ({COLUMN_LIST})
+SELECT {COLUMN_LIST} FROM stage_product_mentions
+ON CONFLICT (channel_name, message_id, mention_index) DO UPDATE SET
+    message_date = EXCLUDED.message_date,
+    product_name = EXCLUDED.product_name,
+    category = EXCLUDED.category,
+    matched_alias = EXCLUDED.matched_alias,
+    char_offset = EXCLUDED.char_offset,
+    price_birr = EXCLUDED.price_birr,
+    loaded_at = now()
+WHERE (t.product_name, t.matched_alias, t.char_offset, t.price_birr, t.message_date)
+    IS DISTINCT FROM (EXCLUDED.product_name, EXCLUDED.matched_alias, EXCLUDED.char_offset,
+                      EXCLUDED.price_birr, EXCLUDED.message_date)
+"""
+
+
+def write_batch(cur, matcher, messages):
+    """Extract mentions from ``(channel_name, message_id, message_date, message_text)`` rows and merge them."""
+    scanned = io.StringIO()
+    staged = io.StringIO()
+    scanned_writer = csv.writer(scanned)
+    staged_writer = csv.writer(staged)
+    mentions = priced = 0
+    with metrics.timer("extraction_match_seconds", extractor=EXTRACTOR):
+        for channel_name, message_id, message_date, text in messages:
+            scanned_writer.writerow((channel_name, message_id))
+            for index, offset, alias, product_name, category, price in extract(matcher, text):
+                staged_writer.writerow((channel_name, message_id, index, message_date,
+                                        product_name, category, alias, offset, price))
+                mentions += 1
+                priced += price is not None
+    scanned.seek(0)
+    staged.seek(0)
+    with metrics.timer("loader_copy_seconds", table="product_mentions"):
+        cur.copy_expert("COPY stage_scanned_messages (channel_name, message_id) FROM STDIN WITH (FORMAT csv)", scanned)
+        cur.copy_expert(f"COPY stage_product_mentions ({COLUMN_LIST}) FROM STDIN WITH (FORMAT csv)", staged)
+    with metrics.timer("loader_merge_seconds", table="product_mentions"):
+        cur.execute(DELETE_STALE_SQL)
+        cur.execute(MERGE_SQL)
+        upserted = cur.rowcount
+    metrics.inc("extraction_messages_total", len(messages), extractor=EXTRACTOR)
+    metrics.inc("extraction_mentions_total", mentions, extractor=EXTRACTOR)
+    return mentions, priced, upserted
+
+
+def extract_incremental(dictionary_path=DICTIONARY_PATH, batch_size=BATCH_SIZE, full=False, conn=None):
+    """Scan messages loaded since the last run and merge their mentions into raw.product_mentions.
+
+    Each batch commits together with the new watermark, so an interrupted
+    run resumes where it stopped. Returns counts, and ``full_rescan`` when
+    every message was read (first run, ``full`` or a changed dictionary).
+    """
+    from load_raw_to_postgres import engine
+
+    start = time.perf_counter()
+    matcher, digest = load_matcher(dictionary_path)
+    stats = {"dictionary_aliases": len(matcher), "messages_scanned": 0, "mentions": 0,
+             "priced_mentions": 0, "rows_upserted": 0, "full_rescan": False}
+
+    own_conn = conn is None
+    conn = conn or engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(SCHEMA_SQL)
+        cur.execute(STAGE_SQL)
+        cur.execute(
+            "SELECT dictionary_sha256, scanned_through FROM raw.extraction_state WHERE extractor = %s",
+            (EXTRACTOR,),
+        )
+        state = cur.fetchone()
+        since = None
+        if full or state is None or state[0] != digest:
+            # Mentions and watermark go together: a rescan interrupted before
+            # its first batch commits starts over, a later one resumes
+            stats["full_rescan"] = True
+            cur.execute("TRUNCATE raw.product_mentions")
+            cur.execute("DELETE FROM raw.extraction_state WHERE extractor = %s", (EXTRACTOR,))
+        else:
+            since = state[1]
+        conn.commit()
+
+        # WITH HOLD keeps the server-side cursor open across the per-batch commits
+        source = conn.cursor(name="product_mention_scan", withhold=True)
+        source.itersize = batch_size
+        query = "SELECT channel_name, message_id, message_date, message_text, loaded_at FROM raw.telegram_messages"
+        if since is None:
+            source.execute(f"{query} ORDER BY loaded_at")
+        else:
+            source.execute(f"{query} WHERE loaded_at > %s - interval '{WATERMARK_LOOKBACK}' ORDER BY loaded_at",
+                           (since,))
+        while True:
+            rows = source.fetchmany(batch_size)
+            if not rows:
+                break
+            mentions, priced, upserted = write_batch(cur, matcher, [row[:4] for row in rows])
+            cur.execute("""
+                INSERT INTO raw.extraction_state (extractor, dictionary_sha256, scanned_through)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (extractor) DO UPDATE SET
+                    dictionary_sha256 = EXCLUDED.dictionary_sha256,
+                    scanned_through = EXCLUDED.scanned_through,
+                    updated_at = now()
+            """, (EXTRACTOR, digest, rows[-1][4]))
+            conn.commit()
+            stats["messages_scanned"] += len(rows)
+            stats["mentions"] += mentions
+            stats["priced_mentions"] += priced
+            stats["rows_upserted"] += upserted
+        source.close()
+        conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    elapsed = time.perf_counter() - start
+    stats["duration_s"] = round(elapsed, 3)
+    stats["messages_per_sec"] = round(stats["messages_scanned"] / elapsed, 1) if elapsed else None
+    print(f"Product extraction: {stats['messages_scanned']} messages scanned, {stats['mentions']} mentions "
+          f"({stats['priced_mentions']} with a price), {stats['rows_upserted']} inserted or updated.")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract product and price mentions into raw.product_mentions")
+    parser.add_argument("--dictionary", default=DICTIONARY_PATH)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--full", action="store_true", help="rescan every message")
+    parser.add_argument("--text", help="print the mentions found in TEXT and exit (no database)")
+    args = parser.parse_args()
+
+    if args.text is not None:
+        matcher, _ = load_matcher(args.dictionary)
+        for row in extract(matcher, args.text):
+            print(row)
+        return
+    with profile("product_extraction"):
+        extract_incremental(args.dictionary, args.batch_size, args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# src/rate_limiter.py
+
+import time
+import asyncio
+
+
+class TokenBucket:
+    """Async token bucket shared by every scraping task.
+
+    ``acquire`` waits until a token is available. ``backoff`` pauses all
+    callers (e.g. for the duration of a Telegram FloodWait) and halves the
+    refill rate, which then climbs back to the configured rate as calls succeed.
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=0.5, clock=time.monotonic):
+        self.base_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.base_rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while True:
+                now = self._clock()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    # Additive recovery after a backoff
+                    self.rate = min(self.base_rate, self.rate + self.base_rate * 0.01)
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def backoff(self, seconds):
+        """Block every caller for ``seconds`` and halve the refill rate."""
+        now = self._clock()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = max(self._updated, self._blocked_until)
+        self.rate = max(self.min_rate, self.rate / 2)
@@ -0,0 +1,291 @@
+# src/raw_store.py
+
+import os
+import io
+import sys
+import glob
+import gzip
+import json
+import fcntl
+import hashlib
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for RAW_COMPRESSION=zstd
+    zstandard = None
+
+# -----------------------------
+# Settings
+# -----------------------------
+RAW_DATA_PATH = os.path.join("data", "raw", "telegram_messages")
+# One file per (message date, channel), written by the partitioned Dagster assets
+DAILY_DATA_PATH = os.path.join("data", "raw", "messages_by_date")
+RAW_COMPRESSION = os.getenv("RAW_COMPRESSION", "gzip")  # none | gzip | zstd
+MANIFEST_NAME = "_manifest.json"
+
+EXTENSIONS = {
+    "none": ".jsonl",
+    "gzip": ".jsonl.gz",
+    "zstd": ".jsonl.zst",
+}
+RAW_PATTERNS = ["*.json", "*.jsonl", "*.jsonl.gz", "*.jsonl.zst"]
+
+_manifest_lock = threading.Lock()
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("RAW_COMPRESSION=zstd needs the 'zstandard' package (pip install zstandard)")
+
+
+def compression_of(path):
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+
+def raw_file_path(channel_name, day=None, compression=RAW_COMPRESSION, root=RAW_DATA_PATH):
+    day = day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return os.path.join(root, day, f"{channel_name}{EXTENSIONS[compression]}")
+
+
+# -----------------------------
+# Writer
+# -----------------------------
+class RawMessageWriter:
+    """Append-only NDJSON writer for one ``<date>/<channel>`` partition.
+
+    ``write`` buffers a single message; ``flush`` appends the buffer to the
+    file as one self-contained block (a gzip member or zstd frame when
+    compressed) and records its byte offset and row count in the date
+    directory's manifest. Memory use is bounded by the flush size, not by
+    the size of the channel.
+    """
+
+    def __init__(self, channel_name, day=None, compression=RAW_COMPRESSION, root=RAW_DATA_PATH):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unknown raw compression '{compression}' (expected one of {sorted(EXTENSIONS)})")
+        if compression == "zstd":
+            _require_zstd()
+        self.channel_name = channel_name
+        self.compression = compression
+        self.path = raw_file_path(channel_name, day, compression, root)
+        self.rows_written = 0
+        self._buffer = []
+        self._first_id = None
+        self._last_id = None
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def write(self, record):
+        self._buffer.append(json.dumps(record, ensure_ascii=False) + "\n")
+        message_id = record.get("message_id")
+        if self._first_id is None:
+            self._first_id = message_id
+        self._last_id = message_id
+
+    def _encode(self, payload):
+        if self.compression == "gzip":
+            return gzip.compress(payload)
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().compress(payload)
+        return payload
+
+    def flush(self):
+        if not self._buffer:
+            return self.path
+        block = self._encode("".join(self._buffer).encode("utf-8"))
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+        rows = len(self._buffer)
+        update_manifest(self.path, {
+            "offset": offset,
+            "length": len(block),
+            "rows": rows,
+            "first_message_id": self._first_id,
+            "last_message_id": self._last_id,
+        }, self.compression, self.channel_name)
+
+        self.rows_written += rows
+        self._buffer = []
+        self._first_id = self._last_id = None
+        return self.path
+
+
+def manifest_path(day_dir):
+    return os.path.join(day_dir, MANIFEST_NAME)
+
+
+def read_manifest(day_dir):
+    path = manifest_path(day_dir)
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@contextmanager
+def locked_manifest(day_dir):
+    """Read-modify-write access to a day's manifest; yields it and saves it on exit.
+
+    Writers of one day directory may be threads of one scraper or separate
+    processes (partition runs of a backfill), so the thread lock is paired
+    with an ``flock`` on a lock file next to the manifest.
+    """
+    os.makedirs(day_dir, exist_ok=True)
+    with _manifest_lock, open(manifest_path(day_dir) + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            manifest = read_manifest(day_dir)
+            yield manifest
+            fd, tmp_path = tempfile.mkstemp(dir=day_dir, prefix=MANIFEST_NAME + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, indent=2)
+                os.replace(tmp_path, manifest_path(day_dir))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def update_manifest(file_path, block, compression, channel_name):
+    with locked_manifest(os.path.dirname(file_path)) as manifest:
+        entry = manifest["files"].setdefault(os.path.basename(file_path), {
+            "channel_name": channel_name,
+            "compression": compression,
+            "rows": 0,
+            "bytes": 0,
+            "blocks": [],
+        })
+        entry["rows"] += block["rows"]
+        entry["bytes"] = block["offset"] + block["length"]
+        entry["blocks"].append(block)
+
+
+def drop_partition(channel_name, day, root=RAW_DATA_PATH):
+    """Delete ``channel_name``'s file(s) for ``day`` and their manifest entries."""
+    with locked_manifest(os.path.join(root, day)) as manifest:
+        for path in iter_raw_files(root, day, channel_name):
+            os.remove(path)
+            manifest["files"].pop(os.path.basename(path), None)
+
+
+# -----------------------------
+# Readers
+# -----------------------------
+def iter_raw_files(root=RAW_DATA_PATH, day=None, channel_name=None):
+    """Yield raw message files (legacy ``.json`` included) in date order."""
+    day_glob = day or "*"
+    name_glob = channel_name or "*"
+    files = []
+    for pattern in RAW_PATTERNS:
+        files.extend(glob.glob(os.path.join(root, day_glob, name_glob + pattern[1:])))
+    return iter(sorted(f for f in set(files) if os.path.basename(f) != MANIFEST_NAME))
+
+
+def _open_text(path):
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8")  # reads every member
+    if compression == "zstd":
+        _require_zstd()
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_records(path):
+    """Lazily yield the message dicts stored in one raw file."""
+    if path.endswith(".json"):
+        # Legacy pretty-printed array written by the old save_json
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+    with _open_text(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_block(path, offset, length):
+    """Yield the records of a single manifest block without reading the rest of the file."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        payload = f.read(length)
+    compression = compression_of(path)
+    if compression == "gzip":
+        payload = gzip.decompress(payload)
+    elif compression == "zstd":
+        _require_zstd()
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    for line in payload.decode("utf-8").splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_records(root=RAW_DATA_PATH, day=None, channel_name=None):
+    for path in iter_raw_files(root, day, channel_name):
+        yield from read_records(path)
+
+
+def partition_fingerprint(day, channel_name, root=RAW_DATA_PATH):
+    """``(sha256, rows)`` of the messages in one ``<day>/<channel>`` partition.
+
+    Hashes the records, not the file bytes, so re-scraping identical
+    messages (in any order, and with a fresh gzip header) gives the same
+    fingerprint. An empty or missing partition hashes like an empty file.
+    """
+    records = sorted(iter_records(root, day, channel_name), key=lambda r: r.get("message_id") or 0)
+    digest = hashlib.sha256()
+    for record in records:
+        digest.update(json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest(), len(records)
+
+
+# -----------------------------
+# Replay CLI
+# -----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay raw Telegram message files")
+    parser.add_argument("command", choices=["cat", "manifest"])
+    parser.add_argument("--date", help="YYYY-MM-DD partition (default: all)")
+    parser.add_argument("--channel", help="channel name (default: all)")
+    parser.add_argument("--root", default=RAW_DATA_PATH)
+    args = parser.parse_args()
+
+    if args.command == "cat":
+        for record in iter_records(args.root, args.date, args.channel):
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        days = [args.date] if args.date else sorted(os.listdir(args.root))
+        for day in days:
+            manifest = read_manifest(os.path.join(args.root, day))
+            for name, entry in sorted(manifest["files"].items()):
+                if args.channel and entry["channel_name"] != args.channel:
+                    continue
+                print(f"{day}/{name}\trows={entry['rows']}\tbytes={entry['bytes']}\tblocks={len(entry['blocks'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,23 @@
 import os
-import json
+import argparse
 import asyncio
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from telethon import TelegramClient
+from telethon.sessions import SQLiteSession, StringSession
 from telethon.errors import FloodWaitError
 from dotenv import load_dotenv
 from logger import logger  # use your loguru logger
 from channels import CHANNELS  # use your 4-channel dictionary
+from rate_limiter import TokenBucket
+from checkpoints import CheckpointStore
+from raw_store import RawMessageWriter, DAILY_DATA_PATH, drop_partition
+from instrumentation import metrics, profile
 
 # -----------------------------
 # Load API credentials
 # -----------------------------
 load_dotenv()
-API_ID = int(os.getenv("TELEGRAM_API_ID"))
+API_ID = int(os.getenv("TELEGRAM_API_ID", "0"))
 API_HASH = os.getenv("TELEGRAM_API_HASH")
 SESSION_NAME = "medical_telegram"  # session file
 
@@ -23,87 +28,383 @@ TOTAL_MESSAGES = 1200
 NUM_CHANNELS = len(CHANNELS)
 MESSAGES_PER_CHANNEL = TOTAL_MESSAGES // NUM_CHANNELS  # 1200 / 4 = 300
 
+# Concurrency settings (override through .env)
+CHANNEL_CONCURRENCY = int(os.getenv("SCRAPER_CHANNEL_CONCURRENCY", "4"))
+DOWNLOAD_WORKERS = int(os.getenv("SCRAPER_DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_QUEUE_SIZE = int(os.getenv("SCRAPER_DOWNLOAD_QUEUE_SIZE", "64"))
+REQUESTS_PER_SECOND = float(os.getenv("SCRAPER_REQUESTS_PER_SECOND", "10"))
+RATE_BURST = int(os.getenv("SCRAPER_RATE_BURST", "20"))
+MAX_DOWNLOAD_RETRIES = 3
+MESSAGES_PER_REQUEST = 100  # Telethon fetches history in pages of 100
+FLUSH_EVERY = int(os.getenv("SCRAPER_FLUSH_EVERY", "50"))  # messages per persisted batch
+
 # -----------------------------
 # Helpers
 # -----------------------------
-def save_json(channel_name, messages):
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    path = os.path.join("data", "raw", "telegram_messages", today)
-    os.makedirs(path, exist_ok=True)
-    file_path = os.path.join(path, f"{channel_name}.json")
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(messages, f, ensure_ascii=False, indent=2)
-    logger.info(f"Saved {len(messages)} messages for {channel_name} at {file_path}")
-    return file_path
-
-
-async def download_media(client, message, channel_name):
+def build_record(message, channel_name, image_path=None):
+    return {
+        "message_id": message.id,
+        "channel_name": channel_name,
+        "message_date": message.date.isoformat(),
+        "message_text": message.message,
+        "has_media": bool(message.media),
+        "image_path": image_path,
+        "views": message.views or 0,
+        "forwards": message.forwards or 0
+    }
+
+
+def image_file_path(channel_name, message_id):
+    return os.path.join("data", "raw", "images", channel_name, f"{message_id}.jpg")
+
+
+async def download_media(client, message, channel_name, limiter=None):
     """Download media asynchronously if the message has a photo"""
     if message.photo:
-        image_dir = os.path.join("data", "raw", "images", channel_name)
-        os.makedirs(image_dir, exist_ok=True)
-        file_path = os.path.join(image_dir, f"{message.id}.jpg")
+        file_path = image_file_path(channel_name, message.id)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
         if os.path.exists(file_path):
             return file_path  # skip if already downloaded
-        try:
-            await client.download_media(message, file_path)
-            return file_path
-        except Exception as e:
-            logger.error(f"Failed to download media {message.id} | {e}")
+        for attempt in range(MAX_DOWNLOAD_RETRIES):
+            try:
+                if limiter is not None:
+                    await limiter.acquire()
+                with metrics.timer("scraper_download_seconds"):
+                    await client.download_media(message, file_path)
+                metrics.inc("scraper_media_downloads_total", channel=channel_name)
+                if os.path.exists(file_path):
+                    metrics.inc("scraper_media_bytes_total", os.path.getsize(file_path), channel=channel_name)
+                return file_path
+            except FloodWaitError as e:
+                logger.warning(f"FloodWait {e.seconds} seconds downloading {message.id} ({channel_name})")
+                metrics.inc("scraper_flood_waits_total", source="download")
+                metrics.inc("scraper_flood_wait_seconds_total", e.seconds, source="download")
+                if limiter is None:
+                    await asyncio.sleep(e.seconds)
+                else:
+                    limiter.backoff(e.seconds)
+            except Exception as e:
+                logger.error(f"Failed to download media {message.id} | {e}")
+                metrics.inc("scraper_media_failures_total", channel=channel_name)
+                break
     return None
 
 
+class MediaDownloadPool:
+    """Bounded pool of workers that download photos off the message loop.
+
+    ``submit`` blocks once ``queue_size`` downloads are pending, so a slow
+    media server applies backpressure to message iteration instead of
+    growing memory without bound.
+
+    With an ``image_index`` every photo is perceptually hashed after download;
+    a near-duplicate of an earlier photo is recorded against that photo (see
+    image_hash.py). Its message only points at the earlier photo's path when
+    IMAGE_DEDUP_REMOVE deleted its own file.
+    """
+
+    def __init__(self, client, limiter, workers=DOWNLOAD_WORKERS, queue_size=DOWNLOAD_QUEUE_SIZE,
+                 image_index=None):
+        self.client = client
+        self.limiter = limiter
+        self.image_index = image_index
+        self.num_workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._workers = []
+
+    async def __aenter__(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def submit(self, message, channel_name):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((message, channel_name, future))
+        return future
+
+    async def _fetch(self, message, channel_name):
+        if self.image_index is None:
+            return await download_media(self.client, message, channel_name, self.limiter)
+        own_path = image_file_path(channel_name, message.id)
+        known = self.image_index.canonical(own_path)
+        if known is not None:
+            return own_path if os.path.exists(own_path) else known
+        path = await download_media(self.client, message, channel_name, self.limiter)
+        if path is None:
+            return None
+        # Hashing decodes the image: keep it off the event loop
+        with metrics.timer("scraper_image_hash_seconds"):
+            canonical = await asyncio.to_thread(self.image_index.add, path, channel_name, message.id)
+        if canonical != path:
+            metrics.inc("scraper_images_deduplicated_total", channel=channel_name)
+        # The index only records the mapping; the message keeps its own photo unless it was removed
+        return path if os.path.exists(path) else canonical
+
+    async def _worker(self):
+        while True:
+            message, channel_name, future = await self.queue.get()
+            try:
+                path = await self._fetch(message, channel_name)
+                if not future.done():
+                    future.set_result(path)
+            except Exception as e:
+                logger.error(f"Download worker failed on {message.id} | {e}")
+                if not future.done():
+                    future.set_result(None)
+            finally:
+                self.queue.task_done()
+
+
 # -----------------------------
 # Scrape a single channel
 # -----------------------------
-async def scrape_channel(client, channel_name, channel_link, limit):
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    json_path = os.path.join("data", "raw", "telegram_messages", today, f"{channel_name}.json")
-    if os.path.exists(json_path):
-        logger.info(f"{channel_name} already scraped today. Skipping.")
+async def resolve_start_id(client, channel_name, channel_link, limit, checkpoints):
+    """Return the message_id to resume after.
+
+    Channels with a checkpoint resume right after it. New channels start
+    ``limit`` ids below the newest message so the first run still backfills
+    about ``limit`` messages.
+    """
+    last_id = checkpoints.get(channel_name)
+    if last_id:
+        return last_id
+    latest = await client.get_messages(channel_link, limit=1)
+    if not latest:
+        return 0
+    return max(0, latest[0].id - limit)
+
+
+async def flush_batch(writer, batch, checkpoints, sink=None):
+    """Append a batch once its downloads finish, then advance the checkpoint (if any).
+
+    With a ``sink`` (see stream_ingest.py) the saved records are also handed
+    to the streaming consumers; a full sink blocks here, which pauses the
+    channel until the consumers catch up.
+    """
+    if not batch:
         return
+    records = []
+    for record, future in batch:
+        if future is not None:
+            record["image_path"] = await future
+        writer.write(record)
+        records.append(record)
+    with metrics.timer("raw_write_seconds"):
+        writer.flush()
+    logger.info(f"Saved {len(batch)} messages for {writer.channel_name} at {writer.path}")
+    if sink is not None:
+        await sink.publish(records)
+    if checkpoints is None:
+        return
+    checkpoints.update(
+        writer.channel_name, batch[-1][0]["message_id"],
+        updated_at=datetime.now(timezone.utc).isoformat()
+    )
+
+
+async def iter_history(client, channel_link, limiter, limit=None, reverse=False, **kwargs):
+    """Yield ``channel_link``'s history one page per request, taking a rate token first.
+
+    ``iter_messages`` fetches its pages internally, so a token taken inside its
+    loop would only pay for a request that has already been sent.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = MESSAGES_PER_REQUEST if remaining is None else min(remaining, MESSAGES_PER_REQUEST)
+        await limiter.acquire()
+        page = await client.get_messages(channel_link, limit=page_size, reverse=reverse, **kwargs)
+        for message in page:
+            yield message
+        if len(page) < page_size:
+            return
+        if remaining is not None:
+            remaining -= len(page)
+        # Continue after the last message of this page
+        if reverse:
+            kwargs["min_id"] = page[-1].id
+        else:
+            kwargs.pop("offset_date", None)
+            kwargs["offset_id"] = page[-1].id
 
+
+async def scrape_channel(client, channel_name, channel_link, limit, limiter, pool, checkpoints, sink=None):
     logger.info(f"Starting scrape for channel: {channel_name} | Limit: {limit} messages")
-    messages_data = []
-
-    try:
-        async for message in client.iter_messages(channel_link, limit=limit):
-            await asyncio.sleep(1)  # Safe delay to avoid hitting rate limits
-            image_path = await download_media(client, message, channel_name)
-
-            messages_data.append({
-                "message_id": message.id,
-                "channel_name": channel_name,
-                "message_date": message.date.isoformat(),
-                "message_text": message.message,
-                "has_media": bool(message.media),
-                "image_path": image_path,
-                "views": message.views or 0,
-                "forwards": message.forwards or 0
-            })
-
-    except FloodWaitError as e:
-        logger.warning(f"FloodWait {e.seconds} seconds on {channel_name}")
-        await asyncio.sleep(e.seconds)
-    except Exception as e:
-        logger.error(f"Error scraping {channel_name}: {e}")
-
-    save_json(channel_name, messages_data)
-    logger.info(f"Finished channel {channel_name} | Messages scraped: {len(messages_data)}")
+    writer = RawMessageWriter(channel_name)
+    last_id = None
+    scraped = 0
+    batch = []
+
+    while scraped < limit:
+        try:
+            if last_id is None:
+                await limiter.acquire()
+                last_id = await resolve_start_id(client, channel_name, channel_link, limit, checkpoints)
+                logger.info(f"{channel_name}: fetching messages newer than {last_id}")
+            # Oldest first above ``min_id`` so the checkpoint only ever moves forward
+            async for message in iter_history(
+                client, channel_link, limiter, limit=limit - scraped, min_id=last_id, reverse=True
+            ):
+                metrics.inc("scraper_messages_total", channel=channel_name)
+                record = build_record(message, channel_name)
+                future = await pool.submit(message, channel_name) if message.photo else None
+                batch.append((record, future))
+                scraped += 1
+                last_id = message.id
+                if len(batch) >= FLUSH_EVERY:
+                    await flush_batch(writer, batch, checkpoints, sink)
+                    batch = []
+            break
+        except FloodWaitError as e:
+            logger.warning(f"FloodWait {e.seconds} seconds on {channel_name}")
+            metrics.inc("scraper_flood_waits_total", source="history")
+            metrics.inc("scraper_flood_wait_seconds_total", e.seconds, source="history")
+            limiter.backoff(e.seconds)
+        except Exception as e:
+            logger.error(f"Error scraping {channel_name}: {e}")
+            break
+
+    await flush_batch(writer, batch, checkpoints, sink)
+    logger.info(f"Finished channel {channel_name} | Messages scraped: {scraped}")
+    return scraped
+
+
+async def scrape_channels(client, channels, limit, concurrency=CHANNEL_CONCURRENCY,
+                          download_workers=DOWNLOAD_WORKERS, rate=REQUESTS_PER_SECOND,
+                          checkpoints=None, image_index=None, sink=None):
+    """Scrape ``channels`` as parallel tasks sharing one rate limiter and download pool."""
+    limiter = TokenBucket(rate, RATE_BURST)
+    checkpoints = checkpoints or CheckpointStore()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with MediaDownloadPool(client, limiter, download_workers, image_index=image_index) as pool:
+        async def run(name, link):
+            async with semaphore:
+                return await scrape_channel(client, name, link, limit, limiter, pool, checkpoints, sink)
+
+        counts = await asyncio.gather(*(run(name, link) for name, link in channels.items()))
+
+    return dict(zip(channels, counts))
 
 
 # -----------------------------
-# Main scraper loop
+# Scrape one channel for one day (Dagster partitions)
 # -----------------------------
-async def main():
+def day_bounds(day):
+    """UTC ``[start, end)`` datetimes of ``day`` (a date or YYYY-MM-DD string)."""
+    if isinstance(day, str):
+        day = datetime.strptime(day, "%Y-%m-%d").date()
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+async def scrape_channel_day(client, channel_name, channel_link, day, limiter, pool, root=DAILY_DATA_PATH):
+    """Replace the ``<day>/<channel>`` file under ``root`` with the messages posted that day.
+
+    Unlike ``scrape_channel`` this is keyed by message date rather than by
+    checkpoint, so any past day can be scraped again; checkpoints are left
+    alone.
+    """
+    start, end = day_bounds(day)
+    day = start.strftime("%Y-%m-%d")
+    drop_partition(channel_name, day, root)
+    writer = RawMessageWriter(channel_name, day=day, root=root)
+    scraped = 0
+    batch = []
+
+    while True:
+        try:
+            # Newest first, starting just before the end of the day
+            async for message in iter_history(client, channel_link, limiter, offset_date=end):
+                if message.date < start:
+                    break
+                metrics.inc("scraper_messages_total", channel=channel_name)
+                future = await pool.submit(message, channel_name) if message.photo else None
+                batch.append((build_record(message, channel_name), future))
+                scraped += 1
+                if len(batch) >= FLUSH_EVERY:
+                    await flush_batch(writer, batch, None)
+                    batch = []
+            break
+        except FloodWaitError as e:
+            logger.warning(f"FloodWait {e.seconds} seconds on {channel_name} ({day})")
+            metrics.inc("scraper_flood_waits_total", source="history")
+            metrics.inc("scraper_flood_wait_seconds_total", e.seconds, source="history")
+            limiter.backoff(e.seconds)
+            # Start the day over: the partially written file would otherwise repeat messages
+            batch = []
+            drop_partition(channel_name, day, root)
+            writer = RawMessageWriter(channel_name, day=day, root=root)
+            scraped = 0
+
+    await flush_batch(writer, batch, None)
+    logger.info(f"Finished {channel_name} for {day} | Messages scraped: {scraped}")
+    return scraped
+
+
+def shared_session(session_name=SESSION_NAME):
+    """The saved login as an in-memory session.
+
+    Several partition runs can then use it at once; the SQLite session file
+    only allows one client at a time.
+    """
+    return StringSession(StringSession.save(SQLiteSession(session_name)))
+
+
+async def scrape_partition(channel_name, day, rate=REQUESTS_PER_SECOND, download_workers=DOWNLOAD_WORKERS,
+                           root=DAILY_DATA_PATH):
+    """Scrape one ``(day, channel)`` partition; returns the number of messages."""
+    from image_hash import ImageHashIndex  # needs opencv and numpy; only loaded when scraping
+
     os.makedirs(os.path.join("data", "raw", "images"), exist_ok=True)
+    limiter = TokenBucket(rate, RATE_BURST)
+    with ImageHashIndex() as image_index:
+        async with TelegramClient(shared_session(), API_ID, API_HASH) as client:
+            async with MediaDownloadPool(client, limiter, download_workers, image_index=image_index) as pool:
+                return await scrape_channel_day(
+                    client, channel_name, CHANNELS[channel_name], day, limiter, pool, root
+                )
 
-    async with TelegramClient(SESSION_NAME, API_ID, API_HASH) as client:
-        for name, link in CHANNELS.items():
-            await scrape_channel(client, name, link, MESSAGES_PER_CHANNEL)
+
+# -----------------------------
+# Main scraper loop
+# -----------------------------
+async def main(concurrency=CHANNEL_CONCURRENCY, download_workers=DOWNLOAD_WORKERS, rate=REQUESTS_PER_SECOND):
+    from image_hash import ImageHashIndex  # needs opencv and numpy; only loaded when scraping
+
+    os.makedirs(os.path.join("data", "raw", "images"), exist_ok=True)
+    with ImageHashIndex() as image_index:
+        async with TelegramClient(SESSION_NAME, API_ID, API_HASH) as client:
+            return await scrape_channels(
+                client, CHANNELS, MESSAGES_PER_CHANNEL,
+                concurrency=concurrency, download_workers=download_workers, rate=rate,
+                image_index=image_index
+            )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape Telegram channels")
+    parser.add_argument("--concurrency", type=int, default=CHANNEL_CONCURRENCY,
+                        help="channels scraped in parallel (1 = one channel at a time)")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND,
+                        help="shared request budget per second")
+    parser.add_argument("--date", help="scrape the messages posted on this YYYY-MM-DD day instead of "
+                                       "resuming from the checkpoints (one channel per day file)")
+    parser.add_argument("--channel", action="append", choices=sorted(CHANNELS),
+                        help="with --date: channel to scrape (repeatable; default: all)")
+    args = parser.parse_args()
+
     logger.info("Starting Telegram scraping...")
-    asyncio.run(main())
+    with profile("scraper"):
+        if args.date:
+            for channel_name in args.channel or sorted(CHANNELS):
+                asyncio.run(scrape_partition(channel_name, args.date, args.rate, args.download_workers))
+        else:
+            asyncio.run(main(args.concurrency, args.download_workers, args.rate))
     logger.info("Scraping completed!")
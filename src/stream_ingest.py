@@ -0,0 +1,488 @@
+# src/stream_ingest.py
+"""Streaming ingestion: load and enrich messages while the scraper is still running.
+
+The batch pipeline runs scrape -> load -> detect one stage after the other,
+so a message reaches the warehouse only after every stage has finished. In
+streaming mode the scraper hands every saved batch to a ``StreamSink``
+(see ``scraper.flush_batch``) and two consumers work off its queues:
+
+- ``MessageLoader`` COPY-merges messages into raw.telegram_messages in
+  small batches (``load_raw_to_postgres.upsert_records``);
+- ``ImageDetector`` keeps the YOLO model loaded and merges detections for
+  new photos into raw.yolo_detections (``load_yolo_results.upsert_rows``).
+
+Both queues are bounded: a slow database or model blocks ``publish``, which
+pauses the scraper instead of buffering without limit. A batch that still
+fails after retries is dropped and logged. The raw JSONL files stay the
+durable record, so the next ``load_raw_to_postgres.py`` / ``yolo_detect.py``
+run catches up (both are idempotent). SIGINT/SIGTERM stop scraping, let the
+consumers drain what is queued and exit; a second signal aborts.
+
+    python src/stream_ingest.py --poll-interval 60 --dbt-interval 300
+"""
+
+import os
+import sys
+import signal
+import asyncio
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from telethon import TelegramClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import scraper  # noqa: E402
+import load_raw_to_postgres as raw_loader  # noqa: E402
+import load_yolo_results as yolo_loader  # noqa: E402
+from logger import logger  # noqa: E402
+from channels import CHANNELS  # noqa: E402
+from checkpoints import CheckpointStore  # noqa: E402
+from image_hash import ImageHashIndex  # noqa: E402
+from detection_cache import CACHE_PATH  # noqa: E402
+from instrumentation import metrics, profile  # noqa: E402
+
+# -----------------------------
+# Streaming settings (override through .env)
+# -----------------------------
+load_dotenv()
+MESSAGE_QUEUE_SIZE = int(os.getenv("STREAM_MESSAGE_QUEUE_SIZE", "5000"))  # records
+IMAGE_QUEUE_SIZE = int(os.getenv("STREAM_IMAGE_QUEUE_SIZE", "256"))  # photos
+LOAD_BATCH_ROWS = int(os.getenv("STREAM_LOAD_BATCH_ROWS", "500"))
+DETECT_BATCH_SIZE = int(os.getenv("STREAM_DETECT_BATCH_SIZE", os.getenv("YOLO_BATCH_SIZE", "16")))
+MAX_LATENCY = float(os.getenv("STREAM_MAX_LATENCY", "5"))  # seconds an item waits for its batch to fill
+POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "60"))  # seconds between scrape passes
+DBT_INTERVAL = float(os.getenv("STREAM_DBT_INTERVAL", "0"))  # seconds between mart refreshes; 0 = off
+MAX_RETRIES = 3
+RETRY_BACKOFF = 2.0  # seconds, doubled after every failed attempt
+
+DBT_PROJECT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "medical_warehouse")
+
+STOP = object()  # queue sentinel: everything before it has been published
+
+
+async def next_batch(queue, max_items, max_latency):
+    """Wait for one item, then keep taking items until ``max_items`` or ``max_latency`` seconds.
+
+    Returns ``(items, stopped)``; ``stopped`` means the sentinel was reached.
+    """
+    first = await queue.get()
+    if first is STOP:
+        return [], True
+    items = [first]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_latency
+    while len(items) < max_items:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            break
+        if item is STOP:
+            return items, True
+        items.append(item)
+    return items, False
+
+
+async def with_retries(label, func, *args):
+    """Run blocking ``func`` until it succeeds or ``MAX_RETRIES`` attempts fail (then re-raise)."""
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            return await func(*args)
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = RETRY_BACKOFF * 2 ** (attempt - 1)
+            logger.warning(f"{label} failed (attempt {attempt}/{MAX_RETRIES}), retrying in {delay}s | {e}")
+            metrics.inc("stream_retries_total", stage=label)
+            await asyncio.sleep(delay)
+
+
+class StreamSink:
+    """Bounded queues between the scraper and the consumers.
+
+    ``publish`` is awaited by the scraper for every saved batch and blocks
+    while a queue is full; ``close`` queues the sentinel after the last item.
+    """
+
+    def __init__(self, message_queue_size=MESSAGE_QUEUE_SIZE, image_queue_size=IMAGE_QUEUE_SIZE, detect=True):
+        self.messages = asyncio.Queue(maxsize=message_queue_size)
+        self.images = asyncio.Queue(maxsize=image_queue_size) if detect else None
+
+    async def publish(self, records):
+        for record in records:
+            await self.messages.put(record)
+            if self.images is not None and record.get("image_path"):
+                await self.images.put((record["channel_name"], record["message_id"], record["image_path"]))
+        metrics.set("stream_message_queue_depth", self.messages.qsize())
+        if self.images is not None:
+            metrics.set("stream_image_queue_depth", self.images.qsize())
+
+    async def close(self, consumers):
+        """Queue the sentinel for every consumer that is still running."""
+        for queue, task in consumers:
+            if queue is not None and not task.done():
+                await queue.put(STOP)
+
+
+class _Consumer:
+    """Drains one queue in batches; blocking work runs on a dedicated thread.
+
+    A single worker thread keeps the database connection (and the sqlite
+    detection cache, which is bound to the thread that opened it) on one
+    thread for the consumer's whole life.
+    """
+
+    label = "consumer"
+
+    def __init__(self, queue, batch_size, max_latency):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"stream-{self.label}")
+        self.conn = None
+        self.stats = {"batches": 0, "items": 0, "items_dropped": 0}
+
+    async def call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def connect(self):
+        if self.conn is None:
+            self.conn = raw_loader.engine.raw_connection()
+        return self.conn
+
+    def discard_connection(self):
+        """Drop a connection after an error so the next attempt starts on a fresh one."""
+        if self.conn is not None:
+            try:
+                self.conn.rollback()
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def process(self, items):
+        raise NotImplementedError
+
+    def close(self):
+        self.discard_connection()
+
+    async def run(self):
+        try:
+            while True:
+                items, stopped = await next_batch(self.queue, self.batch_size, self.max_latency)
+                if items:
+                    try:
+                        with metrics.timer("stream_batch_seconds", stage=self.label):
+                            await with_retries(self.label, self.call, self.process, items)
+                        self.stats["batches"] += 1
+                        self.stats["items"] += len(items)
+                    except Exception as e:
+                        logger.error(f"{self.label}: dropped a batch of {len(items)} after {MAX_RETRIES} "
+                                     f"attempts; the next batch run will pick it up | {e}")
+                        metrics.inc("stream_items_dropped_total", len(items), stage=self.label)
+                        self.stats["items_dropped"] += len(items)
+                if stopped:
+                    break
+        finally:
+            await self.call(self.close)
+            self.executor.shutdown(wait=False)
+        logger.info(f"{self.label} consumer finished: {self.stats}")
+        return self.stats
+
+
+class MessageLoader(_Consumer):
+    """Batch-insert streamed records into raw.telegram_messages."""
+
+    label = "loader"
+
+    def __init__(self, queue, batch_rows=LOAD_BATCH_ROWS, max_latency=MAX_LATENCY):
+        super().__init__(queue, batch_rows, max_latency)
+        self.rows_since_refresh = 0
+
+    def connect(self):
+        if self.conn is None:
+            conn = super().connect()
+            with conn.cursor() as cur:
+                raw_loader.ensure_schema(cur)
+                raw_loader.create_stage(cur)
+            conn.commit()
+        return self.conn
+
+    def process(self, records):
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                _, upserted = raw_loader.upsert_records(cur, records)
+            conn.commit()
+        except Exception:
+            self.discard_connection()
+            raise
+        self.rows_since_refresh += upserted
+        # Freshness: how long the newest message in the batch took to reach the warehouse
+        newest = max(datetime.fromisoformat(r["message_date"]) for r in records)
+        metrics.observe("stream_freshness_seconds", (datetime.now(timezone.utc) - newest).total_seconds(),
+                        table="telegram_messages")
+        return upserted
+
+
+class ImageDetector(_Consumer):
+    """Run YOLO on streamed photos and merge the results into raw.yolo_detections.
+
+    The model is loaded once, or not at all when a detection_service.py is
+    running at ``yolo_detect.SERVICE_SOCKET``. Results go through the same
+    content-hash cache as ``yolo_detect.run_detection``, so reposts and
+    retried batches skip the model. Boxes for the detection store are written by the next
+    ``yolo_detect.py`` run, which finds them all in the cache.
+    """
+
+    label = "detector"
+
+    def __init__(self, queue, batch_size=DETECT_BATCH_SIZE, max_latency=MAX_LATENCY,
+                 model_name=None, cache_path=CACHE_PATH):
+        super().__init__(queue, batch_size, max_latency)
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.model = None
+        self.client = None
+        self.cache = None
+
+    def connect(self):
+        if self.conn is None:
+            conn = super().connect()
+            with conn.cursor() as cur:
+                yolo_loader.ensure_schema(cur)
+            conn.commit()
+        return self.conn
+
+    def load(self):
+        import yolo_detect
+        from detection_cache import DetectionCache, config_fingerprint
+
+        model_name = self.model_name or yolo_detect.MODEL_NAME
+        if self.model is None and self.client is None:
+            if yolo_detect.SERVICE_SOCKET:
+                from detection_service import connect
+                self.client = connect(yolo_detect.SERVICE_SOCKET, model_name, yolo_detect.IMAGE_SIZE)
+            if self.client is None:
+                self.model = yolo_detect.load_model(model_name)
+        if self.cache is None and self.cache_path:
+            fingerprint = config_fingerprint(model_name, yolo_detect.PERSON_CLASS_ID, yolo_detect.PRODUCT_CLASS_IDS,
+                                             image_size=yolo_detect.IMAGE_SIZE)
+            self.cache = DetectionCache(fingerprint, self.cache_path)
+        return yolo_detect
+
+    def detect(self, items):
+        """``[(item, detection)]`` for ``(channel_name, message_id, path)`` items, cache first."""
+        yolo_detect = self.load()
+        hashes = self.cache.hash_files([path for _, _, path in items]) if self.cache else {}
+        cached = self.cache.get_many(set(hashes.values())) if self.cache else {}
+        pairs = []
+        to_detect = []
+        for item in items:
+            content_hash = hashes.get(str(item[2]))
+            if content_hash in cached:
+                pairs.append((item, cached[content_hash]))
+            else:
+                to_detect.append(item)
+        metrics.inc("yolo_images_total", len(pairs), source="cache")
+        fresh = {}
+        if self.client is not None:
+            batches = self.client.detect_images(to_detect, self.batch_size)
+        else:
+            batches = yolo_detect.detect_images(self.model, to_detect, self.batch_size)
+        for batch in batches:
+            for item, detection in batch:
+                pairs.append((item, detection))
+                content_hash = hashes.get(str(item[2]))
+                if content_hash is not None:
+                    fresh[content_hash] = detection
+        if self.cache is not None and fresh:
+            self.cache.put_many(fresh)
+        return yolo_detect.detection_rows([item for item, _ in pairs], [d for _, d in pairs])
+
+    def process(self, items):
+        items = [item for item in items if os.path.exists(item[2])]
+        if not items:
+            return 0
+        try:
+            rows = self.detect(items)
+        except OSError:
+            # The detection service went away: reconnect, or load the model, on the retry
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+            raise
+        conn = self.connect()
+        try:
+            with conn.cursor() as cur:
+                upserted = yolo_loader.upsert_rows(cur, rows)
+            conn.commit()
+        except Exception:
+            self.discard_connection()
+            raise
+        return upserted
+
+    def close(self):
+        super().close()
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+
+# -----------------------------
+# Mart refresh
+# -----------------------------
+async def run_dbt(*args):
+    """``dbt <args>`` in a subprocess, so a long model build never blocks the event loop."""
+    with metrics.timer("dbt_invocation_seconds", command=args[0]):
+        proc = await asyncio.create_subprocess_exec(
+            "dbt", *args, "--project-dir", DBT_PROJECT, "--profiles-dir", DBT_PROJECT,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        logger.error(f"dbt {' '.join(args)} failed ({proc.returncode}) | {stderr.decode()[-500:]}")
+        return False
+    return True
+
+
+async def refresh_marts(loader, stop, interval, args=("run",)):
+    """Run the incremental models every ``interval`` seconds while new rows keep arriving."""
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        if loader.rows_since_refresh:
+            rows, loader.rows_since_refresh = loader.rows_since_refresh, 0
+            if await run_dbt(*args):
+                logger.info(f"Refreshed marts after {rows} new or changed raw rows")
+
+
+# -----------------------------
+# Producer loop
+# -----------------------------
+async def stream(client, channels=CHANNELS, limit=scraper.MESSAGES_PER_CHANNEL, poll_interval=POLL_INTERVAL,
+                 once=False, detect=True, model_name=None, dbt_interval=DBT_INTERVAL, dbt_select=None,
+                 concurrency=scraper.CHANNEL_CONCURRENCY, download_workers=scraper.DOWNLOAD_WORKERS,
+                 rate=scraper.REQUESTS_PER_SECOND, checkpoints=None, image_index=None):
+    """Scrape ``channels`` every ``poll_interval`` seconds, loading and detecting as messages arrive.
+
+    Returns the consumers' stats once stopped by a signal (or after one pass with ``once``).
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+
+    def on_signal():
+        if stop.is_set():
+            logger.warning("Second signal: aborting without draining the queues")
+            main_task.cancel()
+            return
+        logger.info("Stopping: finishing queued messages and images (signal again to abort)")
+        stop.set()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, on_signal)
+        except (NotImplementedError, RuntimeError):
+            pass  # not on the main thread, or Windows
+
+    sink = StreamSink(detect=detect)
+    loader = MessageLoader(sink.messages)
+    detector = ImageDetector(sink.images, model_name=model_name) if detect else None
+    consumers = [(sink.messages, asyncio.create_task(loader.run()))]
+    if detector is not None:
+        consumers.append((sink.images, asyncio.create_task(detector.run())))
+    for _, task in consumers:
+        # A consumer that dies would leave the scraper blocked on a full queue
+        task.add_done_callback(lambda _: stop.set())
+    dbt_args = ("run", "--select", dbt_select) if dbt_select else ("run",)
+    refresher = asyncio.create_task(refresh_marts(loader, stop, dbt_interval, dbt_args)) if dbt_interval else None
+
+    checkpoints = checkpoints or CheckpointStore()
+    passes = 0
+    try:
+        while not stop.is_set():
+            producer = asyncio.create_task(scraper.scrape_channels(
+                client, channels, limit, concurrency, download_workers, rate,
+                checkpoints=checkpoints, image_index=image_index, sink=sink,
+            ))
+            stopping = asyncio.create_task(stop.wait())
+            await asyncio.wait({producer, stopping}, return_when=asyncio.FIRST_COMPLETED)
+            stopping.cancel()
+            if not producer.done():
+                # Messages not yet checkpointed are scraped again on the next start
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+                break
+            passes += 1
+            logger.info(f"Scrape pass {passes}: {producer.result()}")
+            if once:
+                break
+            try:
+                await asyncio.wait_for(stop.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await sink.close(consumers)
+        results = await asyncio.gather(*(task for _, task in consumers), return_exceptions=True)
+        if refresher is not None:
+            stop.set()
+            await asyncio.gather(refresher, return_exceptions=True)
+            if loader.rows_since_refresh:
+                await run_dbt(*dbt_args)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    stats = {"passes": passes}
+    for name, result in zip(("loader", "detector"), results):
+        stats[name] = result if isinstance(result, dict) else {"error": repr(result)}
+    return stats
+
+
+async def main(args):
+    os.makedirs(os.path.join("data", "raw", "images"), exist_ok=True)
+    with ImageHashIndex() as image_index:
+        async with TelegramClient(scraper.SESSION_NAME, scraper.API_ID, scraper.API_HASH) as client:
+            return await stream(
+                client, CHANNELS, args.limit, args.poll_interval, args.once,
+                detect=not args.no_detect, model_name=args.model,
+                dbt_interval=args.dbt_interval, dbt_select=args.dbt_select,
+                concurrency=args.concurrency, download_workers=args.download_workers, rate=args.rate,
+                image_index=image_index,
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape, load and detect continuously")
+    parser.add_argument("--limit", type=int, default=scraper.MESSAGES_PER_CHANNEL,
+                        help="messages per channel per pass (new channels backfill this many)")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="seconds between scrape passes")
+    parser.add_argument("--once", action="store_true", help="run a single pass, drain and exit")
+    parser.add_argument("--no-detect", action="store_true", help="load messages only; leave YOLO to the batch run")
+    parser.add_argument("--model", default=None, help="YOLO weights (default: yolo_detect.MODEL_NAME)")
+    parser.add_argument("--dbt-interval", type=float, default=DBT_INTERVAL,
+                        help="seconds between incremental dbt runs (0 = never)")
+    parser.add_argument("--dbt-select", default=None, help="dbt selector for the refresh (default: every model)")
+    parser.add_argument("--concurrency", type=int, default=scraper.CHANNEL_CONCURRENCY)
+    parser.add_argument("--download-workers", type=int, default=scraper.DOWNLOAD_WORKERS)
+    parser.add_argument("--rate", type=float, default=scraper.REQUESTS_PER_SECOND)
+    args = parser.parse_args()
+
+    logger.info("Starting streaming ingestion...")
+    with profile("stream_ingest"):
+        stats = asyncio.run(main(args))
+    logger.info(f"Streaming ingestion stopped: {stats}")
@@ -2,93 +2,415 @@
 
 import os
 import csv
-from ultralytics import YOLO
+import time
+import argparse
+from itertools import islice
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
 from tqdm import tqdm
 
+from detection_cache import CACHE_PATH, DetectionCache, config_fingerprint
+from image_hash import IMAGE_INDEX_PATH, REUSE_DETECTIONS, ImageHashIndex
+from instrumentation import metrics, profile
+from detection_store import (
+    DETECTIONS_ROOT, DetectionTableBuilder, classify_table, iter_channels, write_channel
+)
+
 # -----------------------------
 # Configuration
 # -----------------------------
 IMAGE_ROOT = "data/raw/images"
 OUTPUT_CSV = "data/raw/yolo_detections.csv"
 MODEL_NAME = "yolov8n.pt"
+IMAGE_SUFFIXES = {".jpg", ".png", ".jpeg"}
+
+# Engine settings (override through .env)
+BATCH_SIZE = int(os.getenv("YOLO_BATCH_SIZE", "16"))
+DECODE_WORKERS = int(os.getenv("YOLO_DECODE_WORKERS", str(os.cpu_count() or 4)))
+IMAGE_SIZE = int(os.getenv("YOLO_IMAGE_SIZE", "640"))
+DEVICE = os.getenv("YOLO_DEVICE")  # e.g. "cpu" or "0"; None lets ultralytics pick
+# Socket of a running detection_service.py; unset runs the model in-process
+SERVICE_SOCKET = os.getenv("YOLO_SERVICE_SOCKET")
 
 # YOLO classes we care about
 PERSON_CLASS_ID = 0       # person
 PRODUCT_CLASS_IDS = [39, 41, 44]  # bottle, cup, box
 
+CSV_HEADER = [
+    "message_id",
+    "channel_name",
+    "image_category",
+    "confidence_score"
+]
+
 # -----------------------------
 # Load YOLO model
 # -----------------------------
-model = YOLO(MODEL_NAME)
+def load_model(model_name=MODEL_NAME):
+    # ultralytics pulls in torch, so import it only when a model is needed
+    from ultralytics import YOLO
+    return YOLO(model_name)
 
 # -----------------------------
-# Helper: classify image
+# Helper: classify images
 # -----------------------------
-def classify_image(detected_classes):
-    has_person = PERSON_CLASS_ID in detected_classes
-    has_product = any(c in PRODUCT_CLASS_IDS for c in detected_classes)
-
-    if has_person and has_product:
-        return "promotional"
-    elif has_product and not has_person:
-        return "product_display"
-    elif has_person and not has_product:
-        return "lifestyle"
-    else:
-        return "other"
+def classify_detections(detections):
+    """Vectorised categories and max confidences for a list of per-image detections."""
+    builder = DetectionTableBuilder()
+    for i, detection in enumerate(detections):
+        builder.add(i, detection)
+    _, categories, max_conf = classify_table(builder.build(), PERSON_CLASS_ID, PRODUCT_CLASS_IDS)
+    return categories.tolist(), max_conf.tolist()
 
 # -----------------------------
-# Main detection logic
+# Image discovery and decoding
 # -----------------------------
-rows = []
+def iter_images(image_root=IMAGE_ROOT):
+    """Yield ``(channel_name, message_id, path)`` for every image under ``image_root``."""
+    root = Path(image_root)
+    if not root.is_dir():
+        return
+    for channel_dir in sorted(root.iterdir()):
+        if not channel_dir.is_dir():
+            continue
+        for image_path in sorted(channel_dir.iterdir()):
+            # Images are saved as <message_id>.jpg by the scraper
+            if image_path.suffix.lower() in IMAGE_SUFFIXES and image_path.stem.isdigit():
+                yield channel_dir.name, image_path.stem, image_path
 
-for channel_dir in Path(IMAGE_ROOT).iterdir():
-    if not channel_dir.is_dir():
-        continue
 
-    channel_name = channel_dir.name
+@metrics.timer("yolo_decode_seconds")
+def decode_image(path, image_size=IMAGE_SIZE):
+    """Read an image and shrink it so its longest side is at most ``image_size``.
 
-    for image_path in tqdm(channel_dir.iterdir(), desc=f"Processing {channel_name}"):
-        if image_path.suffix.lower() not in [".jpg", ".png", ".jpeg"]:
-            continue
+    Returns ``(frame, original_width, original_height)`` or None if unreadable.
+    """
+    return resize_frame(cv2.imread(str(path)), image_size)
 
-        message_id = image_path.stem
 
-        results = model(image_path, verbose=False)[0]
+@metrics.timer("yolo_decode_seconds")
+def decode_bytes(data, image_size=IMAGE_SIZE):
+    """``decode_image`` for an encoded image (JPEG, PNG, ...) held in memory."""
+    return resize_frame(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), image_size)
 
-        detected_classes = []
-        confidences = []
 
-        for box in results.boxes:
-            cls = int(box.cls[0])
-            conf = float(box.conf[0])
-            detected_classes.append(cls)
-            confidences.append(conf)
+def resize_frame(image, image_size=IMAGE_SIZE):
+    if image is None:
+        return None
+    height, width = image.shape[:2]
+    scale = image_size / max(height, width)
+    if scale < 1:
+        image = cv2.resize(
+            image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA
+        )
+    return image, width, height
 
-        image_category = classify_image(detected_classes)
-        max_conf = max(confidences) if confidences else 0.0
 
-        rows.append([
-            message_id,
-            channel_name,
-            image_category,
-            max_conf
-        ])
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
 # -----------------------------
-# Write CSV
+# Detection engine
 # -----------------------------
-os.makedirs("data/raw", exist_ok=True)
-
-with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-    writer.writerow([
-        "message_id",
-        "channel_name",
-        "image_category",
-        "confidence_score"
-    ])
-    writer.writerows(rows)
-
-print(f"YOLO detection completed. Results saved to {OUTPUT_CSV}")
+def run_batch(model, batch, frames, image_size=IMAGE_SIZE, device=DEVICE):
+    """One model pass over decoded ``frames``; returns ``(item, detection)`` for each readable one."""
+    detections = []
+    ready = []
+    for item, frame in zip(batch, frames):
+        if frame is None:
+            tqdm.write(f"Skipping unreadable image {item[2]}")
+        else:
+            ready.append((item, frame))
+    if not ready:
+        return detections
+
+    with metrics.timer("yolo_batch_seconds"):
+        results = model(
+            [decoded[0] for _, decoded in ready], imgsz=image_size, device=device, verbose=False
+        )
+    metrics.inc("yolo_images_total", len(ready), source="model")
+    for (item, (frame, width, height)), result in zip(ready, results):
+        # Boxes come back in the resized frame; store them in original pixels
+        scale = width / frame.shape[1]
+        detections.append((item, {
+            "classes": [int(c) for c in result.boxes.cls.tolist()],
+            "confidences": [float(c) for c in result.boxes.conf.tolist()],
+            "boxes": [[round(v * scale, 1) for v in box] for box in result.boxes.xyxy.tolist()],
+            "width": width,
+            "height": height,
+        }))
+    return detections
+
+
+def detect_images(model, items, batch_size=BATCH_SIZE, workers=DECODE_WORKERS,
+                  image_size=IMAGE_SIZE, device=DEVICE):
+    """Run ``model`` over ``(channel_name, message_id, path)`` items in batches.
+
+    Images are decoded and resized in a thread pool (OpenCV releases the GIL)
+    while the previous batch is in the model. Yields one list of
+    ``(item, detection)`` pairs per batch, in input order.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = None
+        for batch in batched(items, batch_size):
+            futures = [pool.submit(decode_image, path, image_size) for _, _, path in batch]
+            if pending is not None:
+                prev_batch, prev_futures = pending
+                yield run_batch(model, prev_batch, [f.result() for f in prev_futures], image_size, device)
+            pending = (batch, futures)
+        if pending is not None:
+            prev_batch, prev_futures = pending
+            yield run_batch(model, prev_batch, [f.result() for f in prev_futures], image_size, device)
+
+
+def detection_rows(items, detections):
+    categories, max_conf = classify_detections(detections)
+    return [
+        [message_id, channel_name, category, conf]
+        for (channel_name, message_id, _), category, conf in zip(items, categories, max_conf)
+    ]
+
+
+def run_detection(image_root=IMAGE_ROOT, output_csv=OUTPUT_CSV, model=None,
+                  batch_size=BATCH_SIZE, workers=DECODE_WORKERS, image_size=IMAGE_SIZE,
+                  device=DEVICE, model_name=MODEL_NAME, cache_path=CACHE_PATH,
+                  detections_root=DETECTIONS_ROOT, image_index_path=IMAGE_INDEX_PATH,
+                  service=SERVICE_SOCKET, items=None, reuse_near_duplicates=REUSE_DETECTIONS):
+    """Detect objects in every image under ``image_root`` and stream rows to ``output_csv``.
+
+    Every box is also kept, per channel, in ``detections_root`` (see
+    detection_store.py).
+
+    Results are cached by image content hash (see detection_cache.py), so
+    only new or changed images, and each distinct image only once, reach
+    the model. Pass ``cache_path=None`` to disable the cache.
+
+    Near-duplicate photos in ``image_index_path`` (see image_hash.py) get the
+    detection of their canonical image rather than a model pass of their own
+    (``reuse_near_duplicates=False`` turns this off for images still on disk;
+    those whose file the scraper dropped always get it).
+
+    With ``service`` (the address of a running detection_service.py serving
+    ``model_name``) images are sent there instead of loading the model here.
+
+    ``items`` (``(channel_name, message_id, path)`` tuples) limits the run to
+    those images instead of everything under ``image_root``.
+    """
+    items = list(iter_images(image_root)) if items is None else list(items)
+    start = time.perf_counter()
+    written = 0
+
+    index_map = {}
+    if image_index_path and os.path.exists(image_index_path):
+        with ImageHashIndex(image_index_path, remove_duplicates=False) as index:
+            index_map = {(channel_name, str(message_id)): canonical_path
+                         for channel_name, message_id, canonical_path, _ in index.duplicates()}
+    item_paths = {str(path) for _, _, path in items}
+    canonical_of = {}
+    if reuse_near_duplicates:
+        for channel_name, message_id, path in items:
+            canonical = index_map.get((channel_name, str(message_id)))
+            if canonical is not None and canonical != str(path):
+                canonical_of[str(path)] = canonical
+
+    cache = None
+    hashes = {}
+    cached = {}
+    if cache_path:
+        # The pre-resize to image_size changes results, so it is part of the cache key
+        fingerprint = config_fingerprint(model_name, PERSON_CLASS_ID, PRODUCT_CLASS_IDS, image_size=image_size)
+        cache = DetectionCache(fingerprint, cache_path)
+        # Canonical images from earlier runs are looked up too, not only this run's
+        outside = {c for c in canonical_of.values() if c not in item_paths and os.path.exists(c)}
+        hashes = cache.hash_files([path for _, _, path in items] + sorted(outside), workers)
+        cached = cache.get_many(set(hashes.values()))
+
+    # One model pass per distinct uncached image; reposts share its result, and
+    # near-duplicates wait for their canonical image's
+    to_detect = []
+    duplicates = {}
+    waiting = {}
+    hits = []
+    near = []
+    near_reused = 0  # near-duplicates given their canonical image's detection
+    for item in items:
+        content_hash = hashes.get(str(item[2]))
+        canonical = canonical_of.get(str(item[2]))
+        if content_hash in cached:
+            hits.append((item, cached[content_hash]))
+        elif canonical is not None and hashes.get(canonical) in cached:
+            near.append((item, cached[hashes[canonical]]))
+        elif canonical in item_paths:
+            waiting.setdefault(canonical, []).append(item)
+        elif content_hash is not None and content_hash in duplicates:
+            duplicates[content_hash].append(item)
+        else:
+            to_detect.append(item)
+            if content_hash is not None:
+                duplicates[content_hash] = []
+
+    builders = {}
+    by_path = {}
+
+    def emit(pairs):
+        for (channel_name, message_id, path), detection in pairs:
+            builders.setdefault(channel_name, DetectionTableBuilder()).add(message_id, detection)
+            by_path[str(path)] = detection
+        return detection_rows([item for item, _ in pairs], [d for _, d in pairs])
+
+    def with_waiting(pairs):
+        """``pairs`` plus the near-duplicates that were waiting on any image in them."""
+        nonlocal near_reused
+        extra = [(dup, detection) for (_, _, path), detection in pairs for dup in waiting.pop(str(path), ())]
+        near_reused += len(extra)
+        return pairs + extra
+
+    os.makedirs(os.path.dirname(output_csv) or ".", exist_ok=True)
+    with open(output_csv, "w", newline="", encoding="utf-8") as f, \
+            tqdm(total=len(items), desc="YOLO detection") as progress:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+
+        writer.writerows(emit(hits + near))
+        written += len(hits) + len(near)
+        near_reused += len(near)
+        progress.update(len(hits) + len(near))
+
+        client = None
+        # A canonical image the model could not read leaves its near-duplicates
+        # waiting; they get a pass of their own in a second round
+        rounds = [to_detect]
+        while rounds:
+            pending = rounds.pop()
+            if pending:
+                if client is None and model is None and service:
+                    from detection_service import connect
+                    client = connect(service, model_name, image_size)
+                if client is not None:
+                    batches = client.detect_images(pending, batch_size)
+                else:
+                    model = model or load_model(model_name)
+                    batches = detect_images(model, pending, batch_size, workers, image_size, device)
+                for batch in batches:
+                    pairs = []
+                    fresh = {}
+                    for item, detection in batch:
+                        pairs.append((item, detection))
+                        content_hash = hashes.get(str(item[2]))
+                        if content_hash is not None:
+                            fresh[content_hash] = detection
+                            pairs.extend((dup, detection) for dup in duplicates.get(content_hash, ()))
+                    if cache is not None:
+                        cache.put_many(fresh)
+                    rows = emit(with_waiting(pairs))
+                    writer.writerows(rows)
+                    f.flush()
+                    written += len(rows)
+                    progress.update(len(rows))
+            if waiting:
+                rounds.append([item for group in waiting.values() for item in group])
+                waiting.clear()
+        if client is not None:
+            client.close()
+
+        # Near-duplicates without a file of their own share their canonical image's result
+        near_duplicates = []
+        on_disk = {(channel_name, str(message_id)) for channel_name, message_id, _ in items}
+        for (channel_name, message_id), canonical_path in index_map.items():
+            detection = by_path.get(canonical_path)
+            if detection is not None and (channel_name, message_id) not in on_disk:
+                near_duplicates.append(((channel_name, message_id, canonical_path), detection))
+        writer.writerows(emit(near_duplicates))
+        written += len(near_duplicates)
+        near_reused += len(near_duplicates)
+
+    if cache is not None:
+        cache.close()
+
+    # Every box, not just the per-image summary, so categories can be re-derived later
+    for channel_name, builder in builders.items():
+        write_channel(channel_name, builder.build(), detections_root)
+
+    elapsed = time.perf_counter() - start
+    metrics.inc("yolo_images_total", len(hits), source="cache")
+    metrics.inc("yolo_images_total", sum(len(v) for v in duplicates.values()), source="repost")
+    metrics.inc("yolo_images_total", near_reused, source="near_duplicate")
+    if elapsed:
+        metrics.set("yolo_images_per_second", round(len(items) / elapsed, 2))
+    return {
+        "images": len(items),
+        "rows_written": written,
+        "cache_hits": len(hits),
+        "cache_misses": len(to_detect),
+        "reposts_reused": sum(len(v) for v in duplicates.values()),
+        "near_duplicates_reused": near_reused,
+        "duration_s": round(elapsed, 3),
+        "images_per_sec": round(len(items) / elapsed, 2) if elapsed else None,
+    }
+
+
+def reclassify(detections_root=DETECTIONS_ROOT, output_csv=OUTPUT_CSV):
+    """Rebuild ``output_csv`` from the stored boxes with the current class mapping (no model)."""
+    start = time.perf_counter()
+    written = 0
+    with open(output_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for channel_name, table in iter_channels(detections_root):
+            message_ids, categories, max_conf = classify_table(table, PERSON_CLASS_ID, PRODUCT_CLASS_IDS)
+            writer.writerows(zip(message_ids.tolist(), [channel_name] * len(message_ids),
+                                 categories.tolist(), max_conf.tolist()))
+            written += len(message_ids)
+    return {"rows_written": written, "duration_s": round(time.perf_counter() - start, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run YOLO object detection over scraped images")
+    parser.add_argument("--image-root", default=IMAGE_ROOT)
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DECODE_WORKERS)
+    parser.add_argument("--image-size", type=int, default=IMAGE_SIZE)
+    parser.add_argument("--device", default=DEVICE)
+    parser.add_argument("--cache", default=CACHE_PATH, help="detection cache file")
+    parser.add_argument("--no-cache", action="store_true", help="run inference on every image")
+    parser.add_argument("--detections-root", default=DETECTIONS_ROOT)
+    parser.add_argument("--image-index", default=IMAGE_INDEX_PATH,
+                        help="perceptual-hash index used to fill in near-duplicate images")
+    parser.add_argument("--no-near-duplicate-reuse", action="store_true",
+                        help="run the model on near-duplicates that still have their own file")
+    parser.add_argument("--reclassify", action="store_true",
+                        help="re-derive categories from stored boxes without running the model")
+    args = parser.parse_args()
+
+    if args.reclassify:
+        stats = reclassify(args.detections_root, args.output)
+        print(f"Reclassified {stats['rows_written']} images in {stats['duration_s']}s. "
+              f"Results saved to {args.output}")
+        return
+
+    with profile("yolo_detect"):
+        stats = run_detection(
+            args.image_root, args.output, None,
+            args.batch_size, args.workers, args.image_size, args.device,
+            model_name=args.model, cache_path=None if args.no_cache else args.cache,
+            detections_root=args.detections_root, image_index_path=args.image_index,
+            reuse_near_duplicates=REUSE_DETECTIONS and not args.no_near_duplicate_reuse
+        )
+    print(f"YOLO detection completed. {stats['images']} images "
+          f"(cache hits: {stats['cache_hits']}, misses: {stats['cache_misses']}, "
+          f"reposts reused: {stats['reposts_reused']}, near-duplicates: {stats['near_duplicates_reused']}) at {stats['images_per_sec']} images/sec. "
+          f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
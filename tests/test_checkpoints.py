@@ -0,0 +1,35 @@
+# tests/test_checkpoints.py
+
+import os
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from checkpoints import CheckpointStore  # noqa: E402
+
+
+def test_checkpoint_only_moves_forward_and_persists(tmp_path):
+    path = str(tmp_path / "state" / "checkpoints.json")
+    store = CheckpointStore(path)
+    assert store.get("chan") == 0
+    store.update("chan", 50, updated_at="t1")
+    store.update("chan", 40, updated_at="t2")  # older batch: ignored
+    assert store.get("chan") == 50
+
+    reloaded = CheckpointStore(path)
+    assert reloaded.get("chan") == 50
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"chan": {"last_message_id": 50, "updated_at": "t1"}}
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_concurrent_updates_keep_the_highest_id(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.json"))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: store.update(f"chan_{i % 4}", i), range(400)))
+    reloaded = CheckpointStore(str(tmp_path / "checkpoints.json"))
+    assert {name: reloaded.get(name) for name in ("chan_0", "chan_1", "chan_2", "chan_3")} == {
+        "chan_0": 396, "chan_1": 397, "chan_2": 398, "chan_3": 399,
+    }
@@ -0,0 +1,81 @@
+# tests/test_detection_store.py
+
+import os
+import sys
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from detection_store import (  # noqa: E402
+    DetectionTableBuilder, classify_table, date_root, iter_channels, write_channel,
+)
+from yolo_detect import PERSON_CLASS_ID, PRODUCT_CLASS_IDS, classify_detections  # noqa: E402
+
+
+def classify_one(detection):
+    """The per-image rule, box by box."""
+    has_person = PERSON_CLASS_ID in detection["classes"]
+    has_product = any(c in PRODUCT_CLASS_IDS for c in detection["classes"])
+    if has_person and has_product:
+        category = "promotional"
+    elif has_product:
+        category = "product_display"
+    elif has_person:
+        category = "lifestyle"
+    else:
+        category = "other"
+    return category, max(detection["confidences"], default=0.0)
+
+
+def random_detections(rng, count):
+    detections = []
+    for _ in range(count):
+        boxes = rng.randint(0, 5)
+        detections.append({
+            "classes": [rng.choice([0, 2, 39, 41, 44, 56]) for _ in range(boxes)],
+            "confidences": [rng.random() for _ in range(boxes)],
+            "boxes": [[1.0, 2.0, 3.0, 4.0]] * boxes,
+            "width": 640,
+            "height": 480,
+        })
+    return detections
+
+
+def test_vectorised_categories_match_the_per_image_rule():
+    rng = random.Random(11)
+    for _ in range(50):
+        detections = random_detections(rng, rng.randint(0, 40))
+        categories, max_conf = classify_detections(detections)
+        expected = [classify_one(d) for d in detections]
+        assert categories == [c for c, _ in expected]
+        assert np.allclose(max_conf, [conf for _, conf in expected])
+
+
+def test_classify_table_with_unsorted_message_ids():
+    builder = DetectionTableBuilder()
+    detections = random_detections(random.Random(5), 30)
+    ids = random.Random(6).sample(range(1, 10_000), len(detections))
+    for message_id, detection in zip(ids, detections):
+        builder.add(message_id, detection)
+    message_ids, categories, _ = classify_table(builder.build(), PERSON_CLASS_ID, PRODUCT_CLASS_IDS)
+    assert message_ids.tolist() == ids
+    assert categories.tolist() == [classify_one(d)[0] for d in detections]
+
+
+def test_stores_are_read_back_channels_first_then_by_date(tmp_path):
+    root = str(tmp_path)
+
+    def table(message_id):
+        builder = DetectionTableBuilder()
+        builder.add(message_id, {"classes": [39], "confidences": [0.5], "width": 10, "height": 10})
+        return builder.build()
+
+    write_channel("chan", table(2), date_root("2024-05-02", root))
+    write_channel("chan", table(1), date_root("2024-05-01", root))
+    write_channel("chan", table(0), root)
+    stored = list(iter_channels(root))
+    assert [name for name, _ in stored] == ["chan"] * 3
+    assert [t["image_message_id"].tolist() for _, t in stored] == [[0], [1], [2]]
+    assert stored[0][1]["box_class_id"].tolist() == [39]
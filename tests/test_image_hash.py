@@ -0,0 +1,73 @@
+# tests/test_image_hash.py
+
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from image_hash import ImageHashIndex, MultiIndexHash, dhash, hamming  # noqa: E402
+
+
+def flip_bits(rng, value, count):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def test_radius_search_matches_brute_force():
+    rng = random.Random(3)
+    index = MultiIndexHash(radius=6)
+    values = []
+    for i in range(2000):
+        # Half random, half near copies of earlier hashes, so there is something to find
+        value = flip_bits(rng, rng.choice(values), rng.randint(0, 10)) if values and i % 2 else rng.getrandbits(64)
+        values.append(value)
+        index.add(value, i)
+    for _ in range(300):
+        query = flip_bits(rng, rng.choice(values), rng.randint(0, 8))
+        for radius in (0, 3, 6, 9):  # 9 is past the pigeonhole guarantee and falls back to a scan
+            expected = sorted((hamming(query, v), i) for i, v in enumerate(values) if hamming(query, v) <= radius)
+            found = index.search(query, radius)
+            assert sorted(found) == expected
+            assert [d for d, _ in found] == sorted(d for d, _ in found)
+
+
+def test_chunks_cover_all_bits():
+    for radius in range(0, 12):
+        chunks = MultiIndexHash(radius).chunks
+        assert len(chunks) == radius + 1
+        assert sum(mask.bit_length() for _, mask in chunks) == 64
+
+
+def write_image(path, image):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, image)
+    return path
+
+
+def test_index_maps_near_duplicates_and_keeps_files(tmp_path):
+    rng = np.random.default_rng(0)
+    photo = cv2.resize((rng.random((32, 32, 3)) * 255).astype(np.uint8), (256, 256))
+    first = write_image(str(tmp_path / "images" / "a" / "1.jpg"), photo)
+    repost = write_image(str(tmp_path / "images" / "b" / "7.jpg"), np.clip(photo.astype(int) + 4, 0, 255).astype(np.uint8))
+    other = write_image(str(tmp_path / "images" / "a" / "2.jpg"), (rng.random((256, 256, 3)) * 255).astype(np.uint8))
+    assert hamming(dhash(first), dhash(repost)) <= 6
+
+    with ImageHashIndex(str(tmp_path / "index.sqlite"), remove_duplicates=False) as index:
+        assert index.add(first, "a", 1) == first
+        assert index.add(repost, "b", 7) == first
+        assert index.add(other, "a", 2) == other
+        assert index.add(repost, "b", 7) == first  # already indexed
+        assert [row[:3] for row in index.duplicates()] == [("b", 7, first)]
+        assert index.stats() == {"images": 3, "canonical": 2, "duplicates": 1}
+    assert os.path.exists(repost)
+
+    # Canonical hashes are reloaded from SQLite
+    with ImageHashIndex(str(tmp_path / "index.sqlite"), remove_duplicates=True) as index:
+        third = write_image(str(tmp_path / "images" / "c" / "9.jpg"), photo)
+        assert index.add(third, "c", 9) == first
+    assert not os.path.exists(third)
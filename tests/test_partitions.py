@@ -0,0 +1,64 @@
+# tests/test_partitions.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from partitions import ensure_months, month_bounds, month_expr, split_name  # noqa: E402
+
+
+@pytest.mark.parametrize("month, kind, expected", [
+    (202401, "date_key", ("20240101", "20240201")),
+    (202412, "date_key", ("20241201", "20250101")),
+    (202412, "timestamptz", ("'2024-12-01 00:00:00+00'", "'2025-01-01 00:00:00+00'")),
+    (202402, "timestamptz", ("'2024-02-01 00:00:00+00'", "'2024-03-01 00:00:00+00'")),
+])
+def test_month_bounds(month, kind, expected):
+    assert month_bounds(month, kind) == expected
+
+
+def test_month_expr_and_names():
+    assert month_expr("date_key", "date_key") == "(date_key / 100)"
+    assert "AT TIME ZONE 'UTC'" in month_expr("message_date", "timestamptz")
+    assert split_name("raw.telegram_messages") == ("raw", "telegram_messages")
+    assert split_name("fct") == ("public", "fct")
+
+
+class FakeCursor:
+    """Answers the month and partition-list queries; records everything executed."""
+
+    def __init__(self, wanted, attached, attached_after_lock=()):
+        self.wanted = wanted
+        self.attached = [f"fct_p{m}" for m in attached]
+        self.attached_after_lock = [f"fct_p{m}" for m in attached_after_lock]
+        self.executed = []
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(" ".join(sql.split()))
+        if sql.startswith("SELECT DISTINCT"):
+            self._rows = [(m,) for m in self.wanted]
+        elif "pg_inherits" in sql:
+            self._rows = [(name, "", 0, 0) for name in self.attached]
+        elif "pg_advisory_xact_lock" in sql:
+            self.attached += self.attached_after_lock  # another loader created these meanwhile
+
+    def fetchall(self):
+        return self._rows
+
+
+def test_ensure_months_skips_the_lock_when_nothing_is_missing():
+    cur = FakeCursor(wanted=[202401, 202402], attached=[202401, 202402])
+    assert ensure_months(cur, "analytics.fct", "date_key", "date_key", "staging") == []
+    assert not any("pg_advisory_xact_lock" in sql for sql in cur.executed)
+
+
+def test_ensure_months_rechecks_after_taking_the_lock():
+    cur = FakeCursor(wanted=[202312, 202401, 202402], attached=[202312], attached_after_lock=[202401])
+    created = ensure_months(cur, "analytics.fct", "date_key", "date_key", "staging")
+    assert created == ["analytics.fct_p202402"]
+    attach = [sql for sql in cur.executed if "ATTACH PARTITION" in sql]
+    assert attach == ["ALTER TABLE analytics.fct ATTACH PARTITION analytics.fct_p202402 FOR VALUES FROM (20240201) TO (20240301)"]
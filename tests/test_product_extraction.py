@@ -0,0 +1,76 @@
+# tests/test_product_extraction.py
+
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from product_extraction import (  # noqa: E402
+    TOKEN_PATTERN, ProductMatcher, extract, find_prices, load_matcher, read_dictionary,
+)
+
+
+def brute_force(entries, text):
+    """Leftmost-longest whole-word matching by trying every alias at every token."""
+    aliases = []
+    for alias, product_name, category in entries:
+        tokens = TOKEN_PATTERN.findall(alias.lower())
+        if tokens:
+            aliases.append((tokens, alias.lower(), product_name, category))
+    words = list(TOKEN_PATTERN.finditer(text.lower()))
+    matches = []
+    i = 0
+    while i < len(words):
+        best = None
+        for tokens, alias, product_name, category in aliases:
+            if [w.group() for w in words[i:i + len(tokens)]] == tokens:
+                if best is None or len(tokens) > len(best[0]):
+                    best = (tokens, alias, product_name, category)
+        if best is None:
+            i += 1
+            continue
+        last = i + len(best[0]) - 1
+        matches.append((words[i].start(), words[last].end(), best[1], best[2], best[3]))
+        i = last + 1
+    return matches
+
+
+def test_matches_brute_force_on_random_text():
+    rng = random.Random(7)
+    vocabulary = ["vitamin", "c", "b", "complex", "panadol", "extra", "cream", "500mg", "ዋጋ", "oil", "fish"]
+    for _ in range(3000):
+        entries = []
+        for n in range(rng.randint(1, 8)):
+            alias = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 3)))
+            entries.append((alias, f"product_{n}", "medicine"))
+        text = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 25)))
+        # First entry wins for a repeated alias, as in the automaton
+        assert [m[:3] for m in ProductMatcher(entries).find(text)] == [m[:3] for m in brute_force(entries, text)]
+
+
+def test_longest_alias_wins_and_matches_whole_words():
+    matcher = ProductMatcher([
+        ("vitamin", "Vitamin", "supplement"),
+        ("vitamin b complex", "Vitamin B Complex", "supplement"),
+        ("c", "Vitamin C", "supplement"),
+    ])
+    assert [m[3] for m in matcher.find("Vitamin B Complex and vitamins")] == ["Vitamin B Complex"]
+    assert [m[3] for m in matcher.find("vitamin b")] == ["Vitamin"]
+
+
+def test_prices():
+    assert [amount for _, amount in find_prices("350 birr, ETB 1,200 or ብር 90 and 45br")] == [350, 1200, 90, 45]
+
+
+def test_extract_attaches_the_nearest_following_price():
+    matcher = ProductMatcher([("panadol", "Paracetamol", "medicine"), ("vitamin c", "Vitamin C", "supplement")])
+    rows = extract(matcher, "Panadol 500mg 120 birr, vitamin c")
+    assert [(r[3], r[5]) for r in rows] == [("Paracetamol", 120.0), ("Vitamin C", None)]
+    assert extract(matcher, None) == []
+
+
+def test_seed_dictionary_loads():
+    matcher, digest = load_matcher()
+    assert len(matcher) == len(read_dictionary())
+    assert len(digest) == 64
@@ -0,0 +1,113 @@
+# tests/test_rate_limiter.py
+
+import os
+import sys
+import asyncio
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import rate_limiter  # noqa: E402
+import scraper  # noqa: E402
+from rate_limiter import TokenBucket  # noqa: E402
+
+
+class FakeTime:
+    """Clock for TokenBucket whose ``sleep`` advances it instead of waiting."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+def fake_time(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(rate_limiter, "asyncio", SimpleNamespace(sleep=clock.sleep, Lock=asyncio.Lock))
+    return clock
+
+
+def test_burst_then_steady_rate(monkeypatch):
+    clock = fake_time(monkeypatch)
+    # Power-of-two rates keep the fake clock's arithmetic exact
+    bucket = TokenBucket(rate=8, capacity=4, clock=clock)
+
+    async def scenario():
+        for _ in range(4):
+            await bucket.acquire()
+        assert clock.now == 0  # the burst is free
+        for _ in range(8):
+            await bucket.acquire()
+
+    asyncio.run(scenario())
+    assert clock.now == 1.0
+
+
+def test_backoff_blocks_and_halves_the_rate(monkeypatch):
+    clock = fake_time(monkeypatch)
+    bucket = TokenBucket(rate=8, capacity=1, min_rate=1, clock=clock)
+    bucket.backoff(5)
+    assert bucket.rate == 4
+
+    async def scenario():
+        await bucket.acquire()
+
+    asyncio.run(scenario())
+    assert clock.now >= 5
+    for _ in range(10):
+        bucket.backoff(0)
+    assert bucket.rate == 1  # never below min_rate
+
+
+class PagedClient:
+    """Telegram stand-in: history of message ids 1..count, one request per get_messages."""
+
+    def __init__(self, count):
+        self.ids = list(range(1, count + 1))
+        self.requests = []
+
+    async def get_messages(self, entity, limit, reverse=False, min_id=0, offset_id=0, offset_date=None):
+        self.requests.append(limit)
+        if reverse:
+            page = [i for i in self.ids if i > min_id]
+        else:
+            page = [i for i in reversed(self.ids) if not offset_id or i < offset_id]
+        return [SimpleNamespace(id=i) for i in page[:limit]]
+
+
+class CountingLimiter:
+    def __init__(self, client):
+        self.client = client
+        self.before_request = []
+
+    async def acquire(self):
+        # Requests made so far when the token is taken: the next one must not have gone out yet
+        self.before_request.append(len(self.client.requests))
+
+
+def collect(client, **kwargs):
+    limiter = CountingLimiter(client)
+
+    async def scenario():
+        return [m.id async for m in scraper.iter_history(client, "chan", limiter, **kwargs)]
+
+    return asyncio.run(scenario()), limiter
+
+
+def test_iter_history_takes_a_token_before_every_page():
+    client = PagedClient(250)
+    ids, limiter = collect(client, reverse=True, min_id=20)
+    assert ids == list(range(21, 251))
+    assert client.requests == [100, 100, 100]
+    assert limiter.before_request == [0, 1, 2]
+
+
+def test_iter_history_respects_limit_and_pages_backwards():
+    client = PagedClient(250)
+    ids, _ = collect(client, limit=150)
+    assert ids == list(range(250, 100, -1))
+    assert client.requests == [100, 50]
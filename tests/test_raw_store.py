@@ -0,0 +1,71 @@
+# tests/test_raw_store.py
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import raw_store  # noqa: E402
+from raw_store import (  # noqa: E402
+    RawMessageWriter, drop_partition, iter_raw_files, partition_fingerprint, read_block, read_manifest,
+    read_records,
+)
+
+COMPRESSIONS = ["none", "gzip"] + (["zstd"] if raw_store.zstandard is not None else [])
+
+
+def records(start, count):
+    return [{"message_id": i, "channel_name": "chan", "message_text": f"ዋጋ {i} birr"} for i in range(start, start + count)]
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_blocks_round_trip(tmp_path, compression):
+    root = str(tmp_path)
+    writer = RawMessageWriter("chan", day="2024-05-01", compression=compression, root=root)
+    for batch in (records(1, 3), records(4, 2)):
+        for record in batch:
+            writer.write(record)
+        writer.flush()
+    writer.flush()  # nothing buffered: no empty block
+
+    entry = read_manifest(os.path.dirname(writer.path))["files"][os.path.basename(writer.path)]
+    assert entry["rows"] == 5
+    assert entry["bytes"] == os.path.getsize(writer.path)
+    assert [(b["rows"], b["first_message_id"], b["last_message_id"]) for b in entry["blocks"]] == [(3, 1, 3), (2, 4, 5)]
+
+    second = entry["blocks"][1]
+    assert list(read_block(writer.path, second["offset"], second["length"])) == records(4, 2)
+    assert list(read_records(writer.path)) == records(1, 5)
+
+
+def test_legacy_json_files_are_read(tmp_path):
+    day_dir = tmp_path / "2024-05-01"
+    day_dir.mkdir()
+    (day_dir / "old.json").write_text(json.dumps(records(1, 2)), encoding="utf-8")
+    assert [list(read_records(path)) for path in iter_raw_files(str(tmp_path))] == [records(1, 2)]
+
+
+def test_fingerprint_ignores_order_and_compression(tmp_path):
+    with RawMessageWriter("chan", day="2024-05-01", compression="gzip", root=str(tmp_path / "a")) as writer:
+        for record in records(1, 4):
+            writer.write(record)
+    with RawMessageWriter("chan", day="2024-05-01", compression="none", root=str(tmp_path / "b")) as writer:
+        for record in reversed(records(1, 4)):
+            writer.write(record)
+    first = partition_fingerprint("2024-05-01", "chan", str(tmp_path / "a"))
+    assert first == partition_fingerprint("2024-05-01", "chan", str(tmp_path / "b"))
+    assert first[1] == 4
+
+
+def test_drop_partition_removes_file_and_manifest_entry(tmp_path):
+    root = str(tmp_path)
+    for channel in ("chan", "other"):
+        with RawMessageWriter(channel, day="2024-05-01", compression="gzip", root=root) as writer:
+            writer.write(records(1, 1)[0])
+    drop_partition("chan", "2024-05-01", root)
+    assert [os.path.basename(p) for p in iter_raw_files(root)] == ["other.jsonl.gz"]
+    assert list(read_manifest(os.path.join(root, "2024-05-01"))["files"]) == ["other.jsonl.gz"]
+    assert partition_fingerprint("2024-05-01", "chan", root)[1] == 0
@@ -0,0 +1,97 @@
+# tests/test_yolo_detect.py
+
+import os
+import sys
+import csv
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+import yolo_detect  # noqa: E402
+from image_hash import ImageHashIndex  # noqa: E402
+
+
+class Tensor(list):
+    def tolist(self):
+        return list(self)
+
+
+class FakeModel:
+    """Finds one bottle in every frame and counts the frames it was given."""
+
+    def __init__(self):
+        self.frames = 0
+
+    def __call__(self, frames, **kwargs):
+        self.frames += len(frames)
+        boxes = SimpleNamespace(cls=Tensor([39]), conf=Tensor([0.9]), xyxy=Tensor([[0, 0, 10, 10]]))
+        return [SimpleNamespace(boxes=boxes) for _ in frames]
+
+
+def setup_images(root):
+    rng = np.random.default_rng(1)
+    photo = cv2.resize((rng.random((32, 32, 3)) * 255).astype(np.uint8), (256, 256))
+    images = {
+        "1": photo,
+        "2": np.clip(photo.astype(int) + 4, 0, 255).astype(np.uint8),  # near-duplicate of 1
+        "3": (rng.random((256, 256, 3)) * 255).astype(np.uint8),
+    }
+    paths = {}
+    for message_id, image in images.items():
+        paths[message_id] = str(root / "images" / "chan" / f"{message_id}.jpg")
+        os.makedirs(os.path.dirname(paths[message_id]), exist_ok=True)
+        cv2.imwrite(paths[message_id], image)
+    index_path = str(root / "index.sqlite")
+    with ImageHashIndex(index_path, remove_duplicates=False) as index:
+        for message_id in ("1", "2", "3"):
+            index.add(paths[message_id], "chan", message_id)
+    return paths, index_path
+
+
+def run(root, model, **kwargs):
+    output = str(root / "out.csv")
+    stats = yolo_detect.run_detection(
+        str(root / "images"), output, model, workers=1, detections_root=str(root / "detections"), **kwargs
+    )
+    with open(output, newline="", encoding="utf-8") as f:
+        return stats, sorted(row["message_id"] for row in csv.DictReader(f))
+
+
+def test_near_duplicates_reuse_the_canonical_detection(tmp_path):
+    _, index_path = setup_images(tmp_path)
+    model = FakeModel()
+    stats, rows = run(tmp_path, model, cache_path=None, image_index_path=index_path)
+    assert rows == ["1", "2", "3"]
+    assert model.frames == 2
+    assert stats["near_duplicates_reused"] == 1
+
+    model = FakeModel()
+    _, rows = run(tmp_path, model, cache_path=None, image_index_path=index_path, reuse_near_duplicates=False)
+    assert rows == ["1", "2", "3"]
+    assert model.frames == 3
+
+
+def test_canonical_from_an_earlier_run_comes_from_the_cache(tmp_path):
+    paths, index_path = setup_images(tmp_path)
+    cache_path = str(tmp_path / "cache.sqlite")
+    run(tmp_path, FakeModel(), cache_path=cache_path, image_index_path=index_path,
+        items=[("chan", "1", paths["1"])])
+    model = FakeModel()
+    stats, rows = run(tmp_path, model, cache_path=cache_path, image_index_path=index_path,
+                      items=[("chan", "2", paths["2"])])
+    assert rows == ["2"]
+    assert model.frames == 0
+    assert stats["near_duplicates_reused"] == 1
+
+
+def test_unreadable_canonical_leaves_the_near_duplicate_its_own_pass(tmp_path):
+    paths, index_path = setup_images(tmp_path)
+    with open(paths["1"], "wb") as f:
+        f.write(b"not an image")
+    model = FakeModel()
+    _, rows = run(tmp_path, model, cache_path=None, image_index_path=index_path)
+    assert rows == ["2", "3"]
+    assert model.frames == 2